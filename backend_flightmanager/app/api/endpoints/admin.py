@@ -0,0 +1,140 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Optional
+import secrets
+
+from app.database.database import get_db, engine, async_engine
+from app.database.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool
+from app.core.config import settings
+from app.core.password_hasher import password_hasher
+from app.services.reference_cache import reference_cache
+from app.services.route_graph import route_graph
+from app.services.hold_sweeper import hold_sweeper
+from app.services.disponibilidad_folder import disponibilidad_folder
+
+def require_admin_key(x_admin_key: Optional[str] = Header(None, description="Clave de administración")):
+    """
+    Dependencia para endpoints de administración.
+    Compara el header X-Admin-Key con settings.ADMIN_API_KEY.
+    """
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Endpoints de administración deshabilitados"
+        )
+    
+    if not x_admin_key or not secrets.compare_digest(x_admin_key, settings.ADMIN_API_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Clave de administración inválida"
+        )
+
+router = APIRouter(dependencies=[Depends(require_admin_key)])
+
+# --- CACHÉ DE DATOS DE REFERENCIA ---
+
+def _reference_cache_info() -> dict:
+    snapshot = reference_cache.snapshot
+    if snapshot is None:
+        return {"cargado": False}
+    
+    return {
+        "cargado": True,
+        "version": snapshot.version,
+        "cargado_en": snapshot.cargado_en,
+        "aeropuertos": len(snapshot.aeropuertos),
+        "aerolineas": len(snapshot.aerolineas)
+    }
+
+@router.get("/reference-cache", response_model=dict)
+def get_reference_cache_info():
+    """
+    Muestra la versión y el tamaño de la caché de aeropuertos y aerolíneas.
+    
+    **Requiere header X-Admin-Key.**
+    """
+    return _reference_cache_info()
+
+@router.post("/reference-cache/reload", response_model=dict)
+def reload_reference_cache(db: Session = Depends(get_db)):
+    """
+    Recarga la caché de aeropuertos y aerolíneas (nueva versión).
+    Usar después de modificar las tablas Aeropuertos o Aerolineas.
+    También fuerza la recarga del grafo de rutas.
+    
+    **Requiere header X-Admin-Key.**
+    """
+    reference_cache.reload(db)
+    route_graph.invalidate()
+    return _reference_cache_info()
+
+# --- POOL DE CONEXIONES ---
+
+@router.get("/pool-stats", response_model=dict)
+def get_pool_stats():
+    """
+    Estado y métricas de los pools de conexiones (motor sync y async):
+    conexiones en uso y libres, overflow, saturación, checkouts, tiempo de
+    espera por checkout (promedio, máximo, p50/p95/p99) y timeouts.
+    Incluye el estado del pool de procesos de bcrypt.
+    
+    **Requiere header X-Admin-Key.**
+    """
+    return {
+        "sync": InstrumentedQueuePool.stats.as_dict(engine.pool),
+        "async": InstrumentedAsyncQueuePool.stats.as_dict(async_engine.sync_engine.pool),
+        "configuracion": {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING
+        },
+        "bcrypt": password_hasher.stats()
+    }
+
+# --- RETENCIONES DE RESERVAS ---
+
+@router.get("/hold-sweeper", response_model=dict)
+def get_hold_sweeper_stats():
+    """
+    Métricas del barrido de reservas pendientes con la retención vencida:
+    barridos y lotes ejecutados, tamaño del último lote, reservas y
+    asientos liberados, duración y retraso (cuánto llevaba vencida la
+    retención más antigua al barrer). También las claves de idempotencia
+    purgadas.
+    
+    **Requiere header X-Admin-Key.**
+    """
+    return hold_sweeper.stats()
+
+@router.post("/hold-sweeper/run", response_model=dict)
+def run_hold_sweeper():
+    """
+    Ejecuta un barrido inmediato y devuelve lo liberado.
+    
+    **Requiere header X-Admin-Key.**
+    """
+    return hold_sweeper.sweep_once()
+
+# --- CONSOLIDACIÓN DE DISPONIBILIDAD ---
+
+@router.get("/disponibilidad-fold", response_model=dict)
+def get_disponibilidad_fold_stats():
+    """
+    Métricas de la consolidación de variaciones de disponibilidad:
+    ejecuciones, variaciones sumadas a los contadores, vuelos consolidados
+    por superar el umbral de variaciones pendientes y duración.
+    
+    **Requiere header X-Admin-Key.**
+    """
+    return disponibilidad_folder.stats()
+
+@router.post("/disponibilidad-fold/run", response_model=dict)
+def run_disponibilidad_fold():
+    """
+    Consolida inmediatamente todas las variaciones pendientes.
+    
+    **Requiere header X-Admin-Key.**
+    """
+    return disponibilidad_folder.fold_once()
@@ -1,57 +1,71 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
-from app.database.database import get_db
-from app.database import Usuario
+from app.database.database import get_async_db
+from app.services.principal_cache import Principal
 from app.schemas import user as user_schema, token as token_schema
 from app.crud import crud_user
 from app.core import security
+from app.core.password_hasher import PasswordHasherBusy
 from app.core.config import settings
 
 router = APIRouter()
 
+# Registro y login son async: esperan a bcrypt (pool de procesos de
+# password_hasher) sin ocupar un hilo del threadpool durante la espera.
+# Las funciones sincrónicas de crud_user se ejecutan con db.run_sync.
+
 @router.post("/register", response_model=user_schema.User)
-def register_user(user: user_schema.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: user_schema.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Endpoint para registrar un nuevo usuario.
     """
-    db_user = crud_user.get_user_by_email(db, email=user.email)
+    db_user = await db.run_sync(crud_user.get_user_by_email, user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El email ya está registrado."
         )
-    return crud_user.create_user(db=db, user=user)
+    hashed_password = await security.get_password_hash_async(user.password)
+    return await db.run_sync(crud_user.create_user, user, hashed_password)
 
 @router.post("/token", response_model=token_schema.Token)
-def login_for_access_token(
-    db: Session = Depends(get_db), 
+async def login_for_access_token(
+    db: AsyncSession = Depends(get_async_db), 
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
     """
     Endpoint de Login. Valida usuario y contraseña.
     """
-    user = crud_user.get_user_by_email(db, email=form_data.username)
+    user = await db.run_sync(crud_user.get_user_by_email, form_data.username)
     
-    if not user or not security.verify_password(form_data.password, user.password_hash):
+    if not user or not await security.verify_password_async(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o contraseña incorrectos",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Rehacer el hash si se generó con otro costo de bcrypt (PASSWORD_BCRYPT_ROUNDS)
+    if security.password_needs_rehash(user.password_hash):
+        try:
+            nuevo_hash = await security.get_password_hash_async(form_data.password)
+            await db.run_sync(crud_user.update_password_hash, user, nuevo_hash)
+        except PasswordHasherBusy:
+            pass  # Se reintenta en el próximo login
+    
     # Creamos el token JWT
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user.id}, expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=user_schema.User)
-def get_current_user_info(current_user: Usuario = Depends(security.get_current_user)):
+def get_current_user_info(current_user: Principal = Depends(security.get_current_user)):
     """
     Endpoint para obtener la información del usuario autenticado.
     Requiere token JWT válido.
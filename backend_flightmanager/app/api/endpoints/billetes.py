@@ -1,22 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Path, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Body, Header
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.database.database import get_db
-from app.database import Usuario, EstadoReservaEnum
+from app.database import EstadoReservaEnum
 from app.schemas import billete as billete_schema
-from app.crud import crud_billete, crud_reserva, crud_tarjeta
+from app.crud import crud_billete, crud_reserva, crud_user
 from app.core.security import get_current_user
+from app.services.principal_cache import Principal
+from app.services.idempotency import ClavePendiente, IdempotencyKeyTaken, idempotency_store
+from app.core import fast_json
 
 router = APIRouter()
 
+# Serializador precompilado para el historial de billetes
+_BILLETES = fast_json.ListSerializer(billete_schema.BilleteResponse)
+
 # --- COMPRAR BILLETE ---
 
 @router.post("/purchase", response_model=billete_schema.BilleteResponse, status_code=status.HTTP_201_CREATED)
 def purchase_ticket(
     compra_data: billete_schema.BilleteCreate,
-    current_user: Usuario = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     """
     Compra un billete para una reserva existente usando una tarjeta de crédito.
@@ -30,61 +37,99 @@ def purchase_ticket(
     6. Cambia reserva a estado 'Confirmada'
     7. Marca asientos como 'Ocupado'
     
+    Con el header **Idempotency-Key**, un reintento devuelve el billete ya
+    comprado sin repetir el proceso.
+    
     **Requiere autenticación JWT.**
     """
-    # Validar reserva
-    reserva = crud_reserva.get_reserva_by_id(db, compra_data.id_reserva)
-    
-    if not reserva:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Reserva con ID {compra_data.id_reserva} no encontrada"
-        )
-    
-    # Verificar que la reserva pertenece al usuario
-    if reserva.id_usuario != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="No tienes permiso para comprar esta reserva"
-        )
-    
-    # Verificar estado de la reserva
-    if reserva.estado != EstadoReservaEnum.Pendiente:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"La reserva debe estar en estado Pendiente. Estado actual: {reserva.estado.value}"
-        )
-    
-    # Validar que no tenga ya un billete
-    billete_existente = crud_billete.get_billete_by_reserva(db, compra_data.id_reserva)
-    if billete_existente:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Esta reserva ya tiene un billete asociado"
-        )
-    
-    # Validar tarjeta
-    tarjeta = crud_tarjeta.get_tarjeta_by_id(db, compra_data.id_tarjeta)
-    
-    if not tarjeta:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Tarjeta con ID {compra_data.id_tarjeta} no encontrada"
-        )
-    
-    # Verificar que la tarjeta pertenece al usuario
-    if not crud_tarjeta.user_has_tarjeta(db, current_user.id, compra_data.id_tarjeta):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Esta tarjeta no te pertenece"
-        )
+    payload = compra_data.model_dump(mode="json")
+    id_billete, pendiente = idempotency_store.begin(db, current_user.id, "POST /billetes/purchase", idempotency_key, payload)
+    
+    if id_billete is None:
+        try:
+            return _purchase_ticket(compra_data, current_user, db, pendiente)
+        except (IdempotencyKeyTaken, HTTPException) as e:
+            # ¿Otra petición con la misma clave compró el billete primero?
+            id_billete = idempotency_store.after_failure(db, pendiente, payload, e)
+    
+    billete = crud_billete.get_billete_by_id(db, id_billete)
+    return idempotency_store.replay(
+        status.HTTP_201_CREATED,
+        billete_schema.BilleteResponse.model_validate(billete).model_dump(mode="json")
+    )
+
+def _purchase_ticket(compra_data: billete_schema.BilleteCreate, current_user: Principal, db: Session, idempotencia: Optional[ClavePendiente] = None):
+    """
+    Valida la reserva y la tarjeta y crea el billete (registrando la clave
+    de idempotencia, si la hay, en la misma transacción).
+    Todo en una transacción: una consulta bloquea la reserva y trae su
+    billete y el dueño de la tarjeta; después create_billete inserta el
+    billete y confirma la reserva y sus asientos.
+    """
+    fila = crud_billete.lock_reserva_for_purchase(db, compra_data.id_reserva, compra_data.id_tarjeta)
     
-    # Crear billete (esto automáticamente confirma la reserva y ocupa los asientos)
     try:
-        billete = crud_billete.create_billete(db, compra_data.id_reserva, compra_data.id_tarjeta)
+        # Validar reserva
+        if not fila:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Reserva con ID {compra_data.id_reserva} no encontrada"
+            )
+        
+        # Verificar que la reserva pertenece al usuario
+        if fila.id_usuario != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permiso para comprar esta reserva"
+            )
+        
+        # Verificar estado de la reserva
+        if fila.estado != EstadoReservaEnum.Pendiente:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"La reserva debe estar en estado Pendiente. Estado actual: {fila.estado.value}"
+            )
+        
+        # Verificar que la retención de asientos no haya vencido
+        if crud_reserva.is_hold_expired(fila):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="La retención de asientos de esta reserva venció. Crea una nueva reserva"
+            )
+        
+        # Validar que no tenga ya un billete
+        if fila.id_billete is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Esta reserva ya tiene un billete asociado"
+            )
+        
+        # Validar tarjeta
+        if fila.id_tarjeta is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Tarjeta con ID {compra_data.id_tarjeta} no encontrada"
+            )
+        
+        # Verificar que la tarjeta pertenece al usuario
+        if fila.id_usuario_tarjeta != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Esta tarjeta no te pertenece"
+            )
+    except HTTPException:
+        # Liberar el bloqueo de la reserva
+        db.rollback()
+        raise
+    
+    # Crear billete (esto confirma la reserva y ocupa los asientos en la misma transacción)
+    try:
+        billete = crud_billete.create_billete(db, compra_data.id_reserva, compra_data.id_tarjeta, idempotencia)
         
         return billete
     
+    except IdempotencyKeyTaken:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -95,7 +140,7 @@ def purchase_ticket(
 
 @router.get("/me", response_model=List[billete_schema.BilleteResponse])
 def get_my_tickets(
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -105,14 +150,14 @@ def get_my_tickets(
     
     **Requiere autenticación JWT.**
     """
-    billetes = crud_billete.get_billetes_by_user(db, current_user.id)
+    billetes = crud_billete.get_billete_rows_by_user(db, current_user.id)
     
-    return billetes
+    return _BILLETES.response(billetes)
 
 @router.get("/confirmation/{codigo}", response_model=billete_schema.BilleteConfirmacion)
 def get_ticket_by_confirmation_code(
     codigo: str = Path(..., description="Código de confirmación del billete (ej. ABCD1234)"),
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -145,7 +190,7 @@ def get_ticket_by_confirmation_code(
 @router.get("/{billete_id}", response_model=billete_schema.BilleteDetail)
 def get_ticket_details(
     billete_id: int = Path(..., description="ID del billete"),
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -183,7 +228,7 @@ def get_ticket_details(
 @router.post("/{billete_id}/send-email", response_model=dict)
 def send_ticket_by_email(
     billete_id: int = Path(..., description="ID del billete"),
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -224,7 +269,7 @@ def send_ticket_by_email(
 @router.get("/{billete_id}/pickup-info", response_model=dict)
 def get_pickup_information(
     billete_id: int = Path(..., description="ID del billete"),
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -270,7 +315,7 @@ def get_pickup_information(
 
 @router.get("/me/count", response_model=dict)
 def count_my_tickets(
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -278,14 +323,10 @@ def count_my_tickets(
     
     **Requiere autenticación JWT.**
     """
-    total = crud_billete.count_billetes_by_user(db, current_user.id)
-    billetes = crud_billete.get_billetes_by_user(db, current_user.id)
-    
-    # Calcular monto total gastado
-    monto_total = sum([b.reserva.monto_total for b in billetes])
+    stats = crud_user.get_user_stats(db, current_user.id)
     
     return {
         "user_id": current_user.id,
-        "total_billetes": total,
-        "monto_total_gastado": float(monto_total)
+        "total_billetes": stats["total_billetes"],
+        "monto_total_gastado": float(stats["monto_total_gastado"])
     }
@@ -1,18 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Path
-from sqlalchemy.orm import Session
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status, Path
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import date
+from datetime import date, timedelta
 
-from app.database.database import get_db
+from app.database.database import get_async_db
+from app.database import CategoriaAsientosEnum
 from app.schemas import flight as flight_schema, asiento as asiento_schema
-from app.crud import crud_flight, crud_asiento
+from app.crud import crud_flight, crud_asiento, crud_disponibilidad
+from app.services.route_graph import route_graph
+from app.services.reference_cache import reference_cache
+from app.services.seat_map import build_seat_grid
+from app.core.config import settings
+from app.core import fast_json
+from app.core.http_cache import (
+    NO_CACHE, cache_control, make_etag, etag_matches, set_cache_headers, not_modified
+)
 
 router = APIRouter()
 
+# Serializadores precompilados para las listas de vuelos y de asientos
+_VUELOS = fast_json.ListSerializer(flight_schema.FlightResult)
+_ASIENTOS = fast_json.ListSerializer(asiento_schema.AsientoResponse)
+
+async def _reference_huella(db: AsyncSession) -> str:
+    """Huella de los datos de referencia (parte de los ETag)."""
+    return (await db.run_sync(reference_cache.get)).huella
+
+def _parse_categoria(categoria: Optional[str]) -> Optional[CategoriaAsientosEnum]:
+    """Valida una categoría de asiento recibida como query param."""
+    if not categoria:
+        return None
+    try:
+        return CategoriaAsientosEnum(categoria)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Categoría inválida. Usar: Economica, Business, PrimeraClase"
+        )
+
 # --- LISTAR TODOS LOS VUELOS (PAGINADO) ---
 
 @router.get("/", response_model=List[flight_schema.FlightResult])
-def list_all_flights(
+async def list_all_flights(
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros a saltar (paginación)"),
     limit: int = Query(50, ge=1, le=100, description="Cantidad máxima de vuelos a devolver"),
     origen: Optional[str] = Query(None, description="Filtrar por código IATA de origen"),
@@ -21,7 +52,9 @@ def list_all_flights(
     fecha_hasta: Optional[date] = Query(None, description="Filtrar vuelos hasta esta fecha"),
     aerolinea: Optional[str] = Query(None, description="Filtrar por código o nombre de aerolínea"),
     ordenar_por: str = Query("fecha", description="Ordenar por: 'fecha', 'precio', 'aerolinea'"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (header X-Next-Cursor). Reemplaza a skip"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     **NUEVO:** Lista TODOS los vuelos disponibles con paginación y filtros opcionales.
@@ -38,37 +71,68 @@ def list_all_flights(
     **Paginación:**
     - skip: Saltar N registros (para páginas)
     - limit: Máximo de resultados (1-100)
+    - cursor: Alternativa a skip. Si la página está llena, la respuesta incluye
+      el header `X-Next-Cursor` con el cursor de la página siguiente
+      (el costo es el mismo para cualquier página)
+    
+    Incluye `ETag`: con `If-None-Match` responde 304 si la página no cambió.
     """
-    # Obtener todos los vuelos con filtros
-    vuelos = crud_flight.get_all_flights_filtered(
-        db,
-        skip=skip,
-        limit=limit,
-        origen_iata=origen.upper() if origen else None,
-        destino_iata=destino.upper() if destino else None,
-        fecha_desde=fecha_desde,
-        fecha_hasta=fecha_hasta,
-        aerolinea=aerolinea
+    if ordenar_por not in crud_flight.ORDEN_VUELOS:
+        ordenar_por = "fecha"
+    
+    # Obtener los vuelos con filtros y orden aplicados en la BD
+    try:
+        vuelos = await crud_flight.get_all_flights_filtered_async(
+            db,
+            skip=skip,
+            limit=limit,
+            origen_iata=origen.upper() if origen else None,
+            destino_iata=destino.upper() if destino else None,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+            aerolinea=aerolinea,
+            ordenar_por=ordenar_por,
+            cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
+    
+    # Cursor para la página siguiente
+    next_cursor = None
+    if len(vuelos) == limit:
+        next_cursor = await db.run_sync(crud_flight.encode_flight_cursor, vuelos[-1], ordenar_por)
+    
+    # La página cambia si cambia algún vuelo (versión) o los datos de referencia
+    etag = make_etag(
+        "flights",
+        await _reference_huella(db),
+        [(v.id, v.version) for v in vuelos],
+        next_cursor
     )
+    cache_control_value = cache_control(settings.FLIGHTS_CACHE_MAX_AGE_SECONDS)
+    if etag_matches(if_none_match, etag):
+        response = not_modified(etag, cache_control_value)
+    else:
+        set_cache_headers(response, etag, cache_control_value)
     
-    # Ordenar según preferencia
-    if ordenar_por == "precio":
-        vuelos = sorted(vuelos, key=lambda v: v.tarifa_base)
-    elif ordenar_por == "aerolinea":
-        vuelos = sorted(vuelos, key=lambda v: v.aerolinea.nombre)
-    else:  # Por defecto por fecha/hora
-        vuelos = sorted(vuelos, key=lambda v: v.hora_salida)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
-    return vuelos
+    if response.status_code == status.HTTP_304_NOT_MODIFIED:
+        return response
+    return _VUELOS.response(await db.run_sync(reference_cache.flights_as_dicts, vuelos), response)
 
 # --- BÚSQUEDA DE VUELOS ---
 
 @router.get("/search", response_model=List[flight_schema.FlightResult])
-def search_available_flights(
+async def search_available_flights(
     origen: str = Query(..., description="Código IATA de origen (ej. 'UIO', 'GYE')"),
     destino: str = Query(..., description="Código IATA de destino (ej. 'UIO', 'GYE')"),
     fecha: date = Query(..., description="Fecha de salida (YYYY-MM-DD)"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Busca vuelos disponibles entre dos ciudades para una fecha específica.
@@ -79,57 +143,63 @@ def search_available_flights(
     
     Devuelve lista vacía si no hay vuelos disponibles.
     """
-    vuelos = crud_flight.search_flights(
+    vuelos = await crud_flight.search_flights_async(
         db, 
         origen_iata=origen.upper(), 
         destino_iata=destino.upper(), 
         fecha=fecha
     )
     
-    return vuelos
+    return _VUELOS.response(await db.run_sync(reference_cache.flights_as_dicts, vuelos))
 
 # --- BÚSQUEDA POR PRECIO ---
 
 @router.get("/search/by-price", response_model=List[flight_schema.FlightResult])
-def search_flights_by_price(
+async def search_flights_by_price(
     origen: str = Query(..., description="Código IATA de origen"),
     destino: str = Query(..., description="Código IATA de destino"),
     fecha: date = Query(..., description="Fecha de salida"),
-    db: Session = Depends(get_db)
+    categoria: Optional[str] = Query(None, description="Calcular el precio para una categoría: Economica, Business, PrimeraClase"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     **REQUISITO:** Consulta de vuelos ordenados por TARIFA (más baratos primero).
     
-    Busca vuelos y los ordena por precio (tarifa_base + precio promedio de asientos).
+    Ordena por precio efectivo: tarifa_base + recargo del asiento disponible
+    más barato (de la categoría indicada, si se especifica). El precio se
+    devuelve en `precio_efectivo`; los vuelos sin asientos disponibles
+    quedan al final con `precio_efectivo = null`.
     
     - **origen**: Código IATA del aeropuerto de origen
     - **destino**: Código IATA del aeropuerto de destino
     - **fecha**: Fecha de salida en formato YYYY-MM-DD
+    - **categoria** (opcional): solo vuelos con asientos de esa categoría
     """
-    # Buscar vuelos
-    vuelos = crud_flight.search_flights(
+    categoria_enum = _parse_categoria(categoria)
+    
+    # Buscar vuelos ordenados por precio efectivo en la BD
+    vuelos = await crud_flight.search_flights_async(
         db, 
         origen_iata=origen.upper(), 
         destino_iata=destino.upper(), 
-        fecha=fecha
+        fecha=fecha,
+        categoria_asiento=categoria_enum,
+        ordenar_por="precio"
     )
     
-    # Ordenar por tarifa_base (de menor a mayor)
-    vuelos_ordenados = sorted(vuelos, key=lambda v: v.tarifa_base)
-    
-    return vuelos_ordenados
+    return _VUELOS.response(await db.run_sync(reference_cache.flights_as_dicts, vuelos))
 
 # --- BÚSQUEDA AVANZADA CON PREFERENCIAS ---
 
 @router.get("/search/advanced", response_model=List[flight_schema.FlightResult])
-def advanced_flight_search(
+async def advanced_flight_search(
     origen: str = Query(..., description="Código IATA de origen"),
     destino: str = Query(..., description="Código IATA de destino"),
     fecha: date = Query(..., description="Fecha de salida"),
     aerolinea: Optional[str] = Query(None, description="Código IATA de aerolínea preferida (ej. 'LA', 'AV')"),
     categoria_asiento: Optional[str] = Query(None, description="Categoría preferida: Economica, Business, PrimeraClase"),
     ordenar_por: str = Query("horario", description="Ordenar por: 'horario' o 'precio'"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     **REQUISITO:** Búsqueda con PREFERENCIAS.
@@ -139,46 +209,147 @@ def advanced_flight_search(
     - Categoría de asiento deseada
     - Orden por horario o precio
     
-    **NOTA:** La opción "solo_directos" está implementada por defecto 
-    (el sistema actual solo maneja vuelos directos, no conexiones).
+    **NOTA:** Solo devuelve vuelos directos. Para itinerarios con escalas
+    usar `/flights/search/connections`.
+    
+    Los filtros y el orden (precio efectivo o horario) se resuelven en una sola consulta.
     """
-    # Buscar vuelos base
-    vuelos = crud_flight.search_flights(
+    categoria_enum = _parse_categoria(categoria_asiento)
+    
+    # Buscar vuelos con los filtros de preferencia aplicados en la BD
+    vuelos = await crud_flight.search_flights_async(
         db, 
         origen_iata=origen.upper(), 
         destino_iata=destino.upper(), 
-        fecha=fecha
+        fecha=fecha,
+        aerolinea_iata=aerolinea,
+        categoria_asiento=categoria_enum,
+        ordenar_por=ordenar_por
+    )
+    
+    return _VUELOS.response(await db.run_sync(reference_cache.flights_as_dicts, vuelos))
+
+# --- BÚSQUEDA CON CONEXIONES ---
+
+@router.get("/search/connections", response_model=List[flight_schema.ItinerarioResult])
+async def search_connections(
+    origen: str = Query(..., description="Código IATA de origen (ej. 'CUE')"),
+    destino: str = Query(..., description="Código IATA de destino (ej. 'MAD')"),
+    fecha: date = Query(..., description="Fecha de salida del primer vuelo"),
+    max_escalas: int = Query(2, ge=0, le=2, description="Máximo de escalas (0-2)"),
+    min_conexion: int = Query(45, ge=0, description="Tiempo mínimo de conexión en minutos"),
+    max_conexion: int = Query(720, ge=0, le=2880, description="Tiempo máximo de conexión en minutos"),
+    ordenar_por: str = Query("duracion", description="Ordenar por: 'duracion' o 'precio'"),
+    limit: int = Query(20, ge=1, le=100, description="Cantidad máxima de itinerarios"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Busca itinerarios entre dos ciudades incluyendo vuelos con escalas.
+    
+    - Directos y con 1 o 2 escalas (según **max_escalas**)
+    - Cada conexión respeta **min_conexion** y **max_conexion** (minutos)
+    - Ordena por duración total del viaje o por suma de tarifas
+    
+    Se resuelve sobre un grafo de rutas en memoria (sin consultas por vuelo)
+    que se refresca en segundo plano: un vuelo creado, modificado o cancelado
+    desde otro proceso aparece aquí en hasta ROUTE_GRAPH_CHECK_SECONDS.
+    """
+    if min_conexion > max_conexion:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_conexion no puede ser mayor que max_conexion"
+        )
+    
+    # Solo carga si el grafo aún no existe (antes de la primera vuelta de la tarea)
+    await asyncio.to_thread(route_graph.ensure_loaded)
+    
+    origen_id = await db.run_sync(reference_cache.aeropuerto_id, origen.upper())
+    destino_id = await db.run_sync(reference_cache.aeropuerto_id, destino.upper())
+    if origen_id is None or destino_id is None or origen_id == destino_id:
+        return []
+    
+    # Búsqueda en el grafo (CPU): en un hilo, sin bloquear el event loop
+    itinerarios = await asyncio.to_thread(
+        route_graph.find_itineraries,
+        origen_id,
+        destino_id,
+        fecha,
+        max_escalas=max_escalas,
+        min_conexion=timedelta(minutes=min_conexion),
+        max_conexion=timedelta(minutes=max_conexion),
+        ordenar_por=ordenar_por,
+        limit=limit
+    )
+    
+    return await db.run_sync(lambda s: [route_graph.itinerario_as_dict(s, it) for it in itinerarios])
+
+# --- CALENDARIO DE TARIFAS ---
+
+# Máximo de días permitidos en una consulta de calendario
+MAX_DIAS_CALENDARIO = 62
+
+@router.get("/calendar", response_model=List[flight_schema.FareCalendarDay])
+async def get_fare_calendar(
+    origen: str = Query(..., description="Código IATA de origen"),
+    destino: str = Query(..., description="Código IATA de destino"),
+    desde: date = Query(..., description="Primer día del rango (YYYY-MM-DD)"),
+    hasta: date = Query(..., description="Último día del rango (YYYY-MM-DD)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Calendario de tarifas: la tarifa más baja y la cantidad de vuelos
+    disponibles por día para una ruta, en un rango de fechas.
+    
+    La tarifa es efectiva: tarifa_base + el menor recargo entre los asientos
+    disponibles del vuelo. Devuelve un elemento por cada día del rango
+    (tarifa_minima = null si ese día no hay vuelos con asientos).
+    
+    Se resuelve con una sola consulta agrupada (máximo 62 días).
+    """
+    if hasta < desde:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La fecha 'hasta' debe ser igual o posterior a 'desde'"
+        )
+    
+    dias = (hasta - desde).days + 1
+    if dias > MAX_DIAS_CALENDARIO:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El rango máximo es de {MAX_DIAS_CALENDARIO} días"
+        )
+    
+    calendario = await crud_flight.get_fare_calendar_async(
+        db,
+        origen_iata=origen.upper(),
+        destino_iata=destino.upper(),
+        desde=desde,
+        hasta=hasta
     )
     
-    # Filtrar por aerolínea si se especifica
-    if aerolinea:
-        vuelos = [v for v in vuelos if v.aerolinea.codigo_iata.upper() == aerolinea.upper()]
-    
-    # Filtrar por disponibilidad de categoría de asiento
-    if categoria_asiento:
-        vuelos_con_categoria = []
-        for vuelo in vuelos:
-            asientos_categoria = crud_asiento.get_seats_by_category(db, vuelo.id, categoria_asiento)
-            if asientos_categoria:  # Si tiene asientos disponibles en esa categoría
-                vuelos_con_categoria.append(vuelo)
-        vuelos = vuelos_con_categoria
-    
-    # Ordenar según preferencia
-    if ordenar_por == "precio":
-        vuelos = sorted(vuelos, key=lambda v: v.tarifa_base)
-    else:  # por defecto ordenar por horario
-        vuelos = sorted(vuelos, key=lambda v: v.hora_salida)
-    
-    return vuelos
+    resultado = []
+    for i in range(dias):
+        fecha = desde + timedelta(days=i)
+        tarifa, vuelos = calendario.get(fecha, (None, 0))
+        resultado.append({"fecha": fecha, "tarifa_minima": tarifa, "vuelos": vuelos})
+    
+    return resultado
 
 # --- DETALLES DE VUELO ---
 
 @router.get("/{flight_id}", response_model=flight_schema.FlightResult)
-def get_flight_details(flight_id: int = Path(..., description="ID del vuelo"), db: Session = Depends(get_db)):
+async def get_flight_details(
+    response: Response,
+    flight_id: int = Path(..., description="ID del vuelo"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Obtiene los detalles completos de un vuelo específico por su ID.
+    
+    Incluye `ETag`: con `If-None-Match` responde 304 si el vuelo no cambió.
     """
-    vuelo = crud_flight.get_flight_by_id(db, flight_id)
+    vuelo = await crud_flight.get_flight_async(db, flight_id)
     
     if not vuelo:
         raise HTTPException(
@@ -186,15 +357,67 @@ def get_flight_details(flight_id: int = Path(..., description="ID del vuelo"), d
             detail=f"Vuelo con ID {flight_id} no encontrado"
         )
     
-    return vuelo
+    etag = make_etag("flight", vuelo.id, vuelo.version, await _reference_huella(db))
+    cache_control_value = cache_control(settings.FLIGHTS_CACHE_MAX_AGE_SECONDS)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, cache_control_value)
+    
+    set_cache_headers(response, etag, cache_control_value)
+    return await db.run_sync(reference_cache.flight_as_dict, vuelo)
 
 # --- ASIENTOS DISPONIBLES ---
 
+async def _seat_map_etag(db: AsyncSession, variante: str, flight_id: int, sello: str) -> str:
+    """ETag de las vistas de asientos: cambia con el sello del mapa (vuelo y asientos)."""
+    return make_etag(variante, flight_id, sello, await _reference_huella(db))
+
+async def _seat_map_not_modified(db: AsyncSession, variante: str, flight_id: int, if_none_match: Optional[str]) -> Optional[Response]:
+    """
+    Si el cliente envía If-None-Match, lo compara con el sello actual del
+    mapa (una consulta de agregación) antes de cargar los asientos.
+    Devuelve la respuesta 304 o None si hay que generar el contenido.
+    """
+    if not if_none_match:
+        return None
+    
+    sello = await crud_asiento.get_seat_map_stamp_async(db, flight_id)
+    if sello is None:
+        return None  # _load_seat_map responde 404
+    
+    etag = await _seat_map_etag(db, variante, flight_id, sello)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, NO_CACHE)
+    return None
+
+async def _load_seat_map(db: AsyncSession, flight_id: int):
+    """
+    Carga vuelo + asientos en una sola consulta y valida que el vuelo
+    exista y sea reservable usando ese mismo resultado.
+    """
+    seat_map = await crud_asiento.get_seat_map_async(db, flight_id)
+    if seat_map is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Vuelo con ID {flight_id} no encontrado"
+        )
+    
+    vuelo, asientos, sello = seat_map
+    disponibles = sum(1 for a in asientos if a["estado"] == "Disponible")
+    if not crud_flight.is_bookable(vuelo.estado, disponibles):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Este vuelo no está disponible para reservas (cancelado o sin asientos)"
+        )
+    
+    return vuelo, asientos, sello
+
 @router.get("/{flight_id}/seats", response_model=List[asiento_schema.AsientoResponse])
-def get_available_seats(
+async def get_available_seats(
+    response: Response,
     flight_id: int = Path(..., description="ID del vuelo"),
     categoria: Optional[str] = Query(None, description="Filtrar por categoría: Economica, Business, PrimeraClase"),
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtiene todos los asientos disponibles de un vuelo.
@@ -203,63 +426,120 @@ def get_available_seats(
     - **categoria** (opcional): Filtrar por categoría de asiento
     
     Devuelve lista de asientos disponibles ordenados por número.
+    Incluye `ETag`: con `If-None-Match` responde 304 si ningún asiento cambió.
     """
-    # Verificar que el vuelo existe
-    vuelo = crud_flight.get_flight_by_id(db, flight_id)
-    if not vuelo:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Vuelo con ID {flight_id} no encontrado"
-        )
+    categoria_enum = _parse_categoria(categoria)
+    variante = f"seats:{categoria_enum.value if categoria_enum else ''}"
+    
+    cached = await _seat_map_not_modified(db, variante, flight_id, if_none_match)
+    if cached:
+        return cached
+    
+    vuelo, asientos, sello = await _load_seat_map(db, flight_id)
+    set_cache_headers(response, await _seat_map_etag(db, variante, flight_id, sello), NO_CACHE)
     
-    # Verificar que el vuelo es reservable
-    if not crud_flight.is_flight_bookable(db, flight_id):
+    return _ASIENTOS.response(
+        (
+            a for a in asientos
+            if a["estado"] == "Disponible"
+            and (categoria_enum is None or a["categoria"] == categoria_enum.value)
+        ),
+        response
+    )
+
+@router.get("/{flight_id}/seatmap", response_model=flight_schema.SeatMapResponse)
+async def get_seat_map(
+    response: Response,
+    flight_id: int = Path(..., description="ID del vuelo"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Mapa de asientos para la página de selección: datos del vuelo y
+    TODOS sus asientos (con su estado) en una sola consulta.
+    
+    - **flight_id**: ID del vuelo
+    
+    Devuelve 400 si el vuelo está cancelado o no tiene asientos disponibles.
+    Incluye `ETag`: con `If-None-Match` responde 304 si nada cambió.
+    """
+    cached = await _seat_map_not_modified(db, "seatmap", flight_id, if_none_match)
+    if cached:
+        return cached
+    
+    vuelo, asientos, sello = await _load_seat_map(db, flight_id)
+    set_cache_headers(response, await _seat_map_etag(db, "seatmap", flight_id, sello), NO_CACHE)
+    
+    return {
+        "vuelo": await db.run_sync(reference_cache.flight_as_dict, vuelo),
+        "asientos": asientos
+    }
+
+@router.get("/{flight_id}/seatmap/grid", response_model=flight_schema.SeatGridResponse)
+async def get_seat_map_grid(
+    response: Response,
+    flight_id: int = Path(..., description="ID del vuelo"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Mapa de asientos en formato compacto: grilla filas × columnas, tabla de
+    tarifas por categoría y un byte por celda (base64) con tarifa y estado.
+    Mismos datos que /seatmap en una fracción del tamaño.
+    
+    - **flight_id**: ID del vuelo
+    
+    Devuelve 422 si el vuelo tiene más tarifas distintas de las que admite
+    la grilla (usar `/flights/{id}/seatmap`).
+    """
+    cached = await _seat_map_not_modified(db, "seatmap-grid", flight_id, if_none_match)
+    if cached:
+        return cached
+    
+    vuelo, asientos, sello = await _load_seat_map(db, flight_id)
+    
+    try:
+        grid = await asyncio.to_thread(build_seat_grid, asientos)
+    except ValueError as e:
+        # Más de MAX_TARIFAS combinaciones (categoría, precio): no caben en la celda
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Este vuelo no está disponible para reservas (cancelado o sin asientos)"
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{e}. Usa /flights/{flight_id}/seatmap para este vuelo"
         )
     
-    # Obtener asientos según filtro
-    if categoria:
-        asientos = crud_asiento.get_seats_by_category(db, flight_id, categoria)
-    else:
-        asientos = crud_asiento.get_available_seats(db, flight_id)
-    
-    return asientos
+    set_cache_headers(response, await _seat_map_etag(db, "seatmap-grid", flight_id, sello), NO_CACHE)
+    return {
+        "vuelo": await db.run_sync(reference_cache.flight_as_dict, vuelo),
+        "grid": grid
+    }
 
 @router.get("/{flight_id}/seats/count", response_model=dict)
-def count_available_seats(
+async def count_available_seats(
     flight_id: int = Path(..., description="ID del vuelo"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Cuenta los asientos disponibles por categoría para un vuelo.
     
     Devuelve un diccionario con el conteo por categoría y total.
+    Lee los contadores de disponibilidad (no recorre la tabla de asientos).
     """
     # Verificar que el vuelo existe
-    vuelo = crud_flight.get_flight_by_id(db, flight_id)
-    if not vuelo:
+    if await crud_flight.get_flight_estado_async(db, flight_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Vuelo con ID {flight_id} no encontrado"
         )
     
     # Contar por categoría
-    from app.database import CategoriaAsientosEnum
-    
-    economica = len(crud_asiento.get_seats_by_category(db, flight_id, CategoriaAsientosEnum.Economica.value))
-    business = len(crud_asiento.get_seats_by_category(db, flight_id, CategoriaAsientosEnum.Business.value))
-    primera = len(crud_asiento.get_seats_by_category(db, flight_id, CategoriaAsientosEnum.PrimeraClase.value))
-    
-    total = crud_asiento.count_available_seats(db, flight_id)
+    conteo = await crud_disponibilidad.get_disponibles_by_vuelo_async(db, flight_id)
     
     return {
         "flight_id": flight_id,
-        "total_disponibles": total,
+        "total_disponibles": sum(conteo.values()),
         "por_categoria": {
-            "economica": economica,
-            "business": business,
-            "primera_clase": primera
+            "economica": conteo[CategoriaAsientosEnum.Economica],
+            "business": conteo[CategoriaAsientosEnum.Business],
+            "primera_clase": conteo[CategoriaAsientosEnum.PrimeraClase]
         }
-    }
\ No newline at end of file
+    }
@@ -1,22 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Path
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Header
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.database.database import get_db
-from app.database import Usuario, EstadoReservaEnum
+from app.database import EstadoReservaEnum, EstadoAsientoEnum
 from app.schemas import reserva as reserva_schema
-from app.crud import crud_reserva, crud_asiento, crud_pasajero
+from app.crud import crud_reserva, crud_asiento, crud_pasajero, crud_user
 from app.core.security import get_current_user
+from app.services.principal_cache import Principal
+from app.services.idempotency import ClavePendiente, IdempotencyKeyTaken, idempotency_store
+from app.core import fast_json
 
 router = APIRouter()
 
+# Serializador precompilado para la lista de reservas
+_RESERVAS = fast_json.ListSerializer(reserva_schema.ReservaDetail)
+
 # --- CREAR RESERVA ---
 
 @router.post("/", response_model=reserva_schema.ReservaResponse, status_code=status.HTTP_201_CREATED)
 def create_reservation(
     reserva_data: reserva_schema.ReservaCreate,
-    current_user: Usuario = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     """
     Crea una nueva reserva para el usuario autenticado.
@@ -25,34 +32,67 @@ def create_reservation(
     - Calcula el monto total automáticamente
     - Crea pasajeros asociados si se proporcionan
     - Marca asientos como 'Reservado'
+    - Con el header **Idempotency-Key**, un reintento devuelve la reserva ya creada
     
     **Requiere autenticación JWT.**
     """
-    # Validar que todos los asientos existan y estén disponibles
+    payload = reserva_data.model_dump(mode="json")
+    id_reserva, pendiente = idempotency_store.begin(db, current_user.id, "POST /reservas", idempotency_key, payload)
+    
+    if id_reserva is None:
+        try:
+            return _create_reservation(reserva_data, current_user, db, pendiente)
+        except (IdempotencyKeyTaken, HTTPException) as e:
+            # ¿Otra petición con la misma clave creó la reserva primero?
+            id_reserva = idempotency_store.after_failure(db, pendiente, payload, e)
+    
+    reserva = crud_reserva.get_reserva_by_id(db, id_reserva)
+    return idempotency_store.replay(
+        status.HTTP_201_CREATED,
+        reserva_schema.ReservaResponse.model_validate(reserva).model_dump(mode="json")
+    )
+
+def _create_reservation(reserva_data: reserva_schema.ReservaCreate, current_user: Principal, db: Session, idempotencia: Optional[ClavePendiente] = None):
+    """Valida los asientos y crea la reserva (registrando la clave de idempotencia, si la hay)."""
     asientos_ids = [p.id_asiento for p in reserva_data.pasajeros]
     
+    if not asientos_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La reserva debe incluir al menos un pasajero"
+        )
+    
+    if len(set(asientos_ids)) != len(asientos_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Hay asientos repetidos en la reserva"
+        )
+    
+    # Validar todos los asientos con una sola consulta (existencia, disponibilidad y vuelo)
+    asientos = {fila.id: fila for fila in crud_asiento.get_seats_for_booking(db, asientos_ids)}
+    
     for asiento_id in asientos_ids:
-        asiento = crud_asiento.get_asiento_by_id(db, asiento_id)
+        asiento = asientos.get(asiento_id)
         if not asiento:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Asiento con ID {asiento_id} no encontrado"
             )
         
-        if not crud_asiento.is_seat_available(db, asiento_id):
+        if asiento.estado != EstadoAsientoEnum.Disponible:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Asiento {asiento.numero_asiento} no está disponible"
             )
     
-    # Calcular monto total
-    from app.crud.crud_flight import get_flight_by_id
-    
-    # Obtener el vuelo del primer asiento para calcular tarifa base
-    primer_asiento = crud_asiento.get_asiento_by_id(db, asientos_ids[0])
-    vuelo = get_flight_by_id(db, primer_asiento.id_vuelo)
+    if len({asiento.id_vuelo for asiento in asientos.values()}) > 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Todos los asientos de una reserva deben pertenecer al mismo vuelo"
+        )
     
-    monto_total = crud_reserva.calculate_total(db, asientos_ids, vuelo.tarifa_base)
+    # Calcular monto total (tarifa base del vuelo + precio adicional de cada asiento)
+    monto_total = crud_reserva.price_seats(asientos.values())
     
     # Crear la reserva con pasajeros
     try:
@@ -60,11 +100,20 @@ def create_reservation(
             db,
             user_id=current_user.id,
             monto_total=monto_total,
-            pasajeros_data=[p.model_dump() for p in reserva_data.pasajeros]
+            pasajeros_data=[p.model_dump() for p in reserva_data.pasajeros],
+            idempotencia=idempotencia
         )
         
         return reserva
     
+    except IdempotencyKeyTaken:
+        raise
+    except ValueError as e:
+        # Un asiento dejó de estar disponible entre la validación y la reserva
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -75,7 +124,7 @@ def create_reservation(
 
 @router.get("/me", response_model=List[reserva_schema.ReservaDetail])
 def get_my_reservations(
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
     estado: str = None
 ):
@@ -86,24 +135,24 @@ def get_my_reservations(
     
     **Requiere autenticación JWT.**
     """
+    estado_enum = None
     if estado:
         try:
             estado_enum = EstadoReservaEnum[estado]
-            reservas = crud_reserva.get_reservas_by_estado(db, current_user.id, estado_enum)
         except KeyError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Estado inválido. Usar: Pendiente, Confirmada, Cancelada"
             )
-    else:
-        reservas = crud_reserva.get_reservas_by_user(db, current_user.id)
     
-    return reservas
+    reservas = crud_reserva.get_reservas_detail_rows(db, current_user.id, estado_enum)
+    
+    return _RESERVAS.response(reservas)
 
 @router.get("/{reserva_id}", response_model=reserva_schema.ReservaDetail)
 def get_reservation_details(
     reserva_id: int = Path(..., description="ID de la reserva"),
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -139,7 +188,7 @@ def get_reservation_details(
 @router.patch("/{reserva_id}/cancel", response_model=reserva_schema.ReservaResponse)
 def cancel_reservation(
     reserva_id: int = Path(..., description="ID de la reserva"),
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -189,7 +238,7 @@ def change_passenger_seat(
     reserva_id: int = Path(..., description="ID de la reserva"),
     pasajero_id: int = Path(..., description="ID del pasajero"),
     nuevo_asiento_id: int = None,
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -263,7 +312,7 @@ def change_passenger_seat(
 
 @router.get("/me/count", response_model=dict)
 def count_my_reservations(
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -271,15 +320,12 @@ def count_my_reservations(
     
     **Requiere autenticación JWT.**
     """
-    total = crud_reserva.count_reservas_by_user(db, current_user.id)
-    pendientes = len(crud_reserva.get_reservas_by_estado(db, current_user.id, EstadoReservaEnum.Pendiente))
-    confirmadas = len(crud_reserva.get_reservas_by_estado(db, current_user.id, EstadoReservaEnum.Confirmada))
-    canceladas = len(crud_reserva.get_reservas_by_estado(db, current_user.id, EstadoReservaEnum.Cancelada))
+    stats = crud_user.get_user_stats(db, current_user.id)
     
     return {
         "user_id": current_user.id,
-        "total_reservas": total,
-        "pendientes": pendientes,
-        "confirmadas": confirmadas,
-        "canceladas": canceladas
+        "total_reservas": stats["total_reservas"],
+        "pendientes": stats["pendientes"],
+        "confirmadas": stats["confirmadas"],
+        "canceladas": stats["canceladas"]
     }
@@ -3,10 +3,10 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from app.database.database import get_db
-from app.database import Usuario
 from app.schemas import tarjeta as tarjeta_schema
 from app.crud import crud_tarjeta
 from app.core.security import get_current_user
+from app.services.principal_cache import Principal
 
 router = APIRouter()
 
@@ -15,7 +15,7 @@ router = APIRouter()
 @router.post("/", response_model=tarjeta_schema.TarjetaResponse, status_code=status.HTTP_201_CREATED)
 def register_credit_card(
     tarjeta_data: tarjeta_schema.TarjetaCreate,
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -59,7 +59,7 @@ def register_credit_card(
 
 @router.get("/me", response_model=List[tarjeta_schema.TarjetaSegura])
 def get_my_credit_cards(
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -81,7 +81,7 @@ def get_my_credit_cards(
 
 @router.get("/me/default", response_model=tarjeta_schema.TarjetaSegura)
 def get_default_credit_card(
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -105,7 +105,7 @@ def get_default_credit_card(
 @router.get("/{tarjeta_id}", response_model=tarjeta_schema.TarjetaSegura)
 def get_credit_card(
     tarjeta_id: int = Path(..., description="ID de la tarjeta"),
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -138,7 +138,7 @@ def get_credit_card(
 @router.patch("/{tarjeta_id}/set-default", response_model=tarjeta_schema.TarjetaResponse)
 def set_default_credit_card(
     tarjeta_id: int = Path(..., description="ID de la tarjeta"),
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -180,7 +180,7 @@ def set_default_credit_card(
 def update_credit_card(
     tarjeta_id: int = Path(..., description="ID de la tarjeta"),
     tarjeta_update: tarjeta_schema.TarjetaUpdate = None,
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -226,7 +226,7 @@ def update_credit_card(
 @router.delete("/{tarjeta_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_credit_card(
     tarjeta_id: int = Path(..., description="ID de la tarjeta"),
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -276,7 +276,7 @@ def delete_credit_card(
 
 @router.get("/me/count", response_model=dict)
 def count_my_credit_cards(
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -2,10 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.database.database import get_db
-from app.database import Usuario
 from app.schemas import user as user_schema
 from app.crud import crud_user
 from app.core.security import get_current_user
+from app.services.principal_cache import Principal
 
 router = APIRouter()
 
@@ -13,7 +13,7 @@ router = APIRouter()
 
 @router.get("/me/profile", response_model=user_schema.UserProfile)
 def get_my_profile(
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -26,16 +26,8 @@ def get_my_profile(
     
     **Requiere autenticación JWT.**
     """
-    from app.crud import crud_reserva, crud_billete, crud_tarjeta
-    
-    # Obtener estadísticas
-    total_reservas = crud_reserva.count_reservas_by_user(db, current_user.id)
-    total_billetes = crud_billete.count_billetes_by_user(db, current_user.id)
-    total_tarjetas = crud_tarjeta.count_tarjetas_by_user(db, current_user.id)
-    
-    # Calcular monto total gastado
-    billetes = crud_billete.get_billetes_by_user(db, current_user.id)
-    monto_total = sum([b.reserva.monto_total for b in billetes])
+    # Obtener estadísticas (una sola consulta agregada)
+    stats = crud_user.get_user_stats(db, current_user.id)
     
     return {
         "id": current_user.id,
@@ -43,10 +35,10 @@ def get_my_profile(
         "email": current_user.email,
         "fecha_creacion": current_user.fecha_creacion,
         "estadisticas": {
-            "total_reservas": total_reservas,
-            "total_billetes": total_billetes,
-            "total_tarjetas": total_tarjetas,
-            "monto_total_gastado": float(monto_total)
+            "total_reservas": stats["total_reservas"],
+            "total_billetes": stats["total_billetes"],
+            "total_tarjetas": stats["total_tarjetas"],
+            "monto_total_gastado": float(stats["monto_total_gastado"])
         }
     }
 
@@ -55,7 +47,7 @@ def get_my_profile(
 @router.put("/me", response_model=user_schema.User)
 def update_my_profile(
     user_update: user_schema.UserUpdate,
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -93,7 +85,7 @@ def update_my_profile(
 @router.patch("/me/change-password", response_model=dict)
 def change_my_password(
     password_data: user_schema.PasswordChange,
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -107,8 +99,9 @@ def change_my_password(
     """
     from app.core.security import verify_password, get_password_hash
     
-    # Verificar contraseña actual
-    if not verify_password(password_data.current_password, current_user.password_hash):
+    # Verificar contraseña actual (el principal no incluye el hash)
+    usuario = crud_user.get_user_by_id(db, current_user.id)
+    if not usuario or not verify_password(password_data.current_password, usuario.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="La contraseña actual es incorrecta"
@@ -141,7 +134,7 @@ def change_my_password(
 @router.delete("/me", status_code=status.HTTP_200_OK, response_model=dict)
 def delete_my_account(
     confirmation: user_schema.AccountDeletion,
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -169,8 +162,9 @@ def delete_my_account(
             detail="Debes confirmar explícitamente la eliminación de tu cuenta"
         )
     
-    # Verificar contraseña
-    if not verify_password(confirmation.password, current_user.password_hash):
+    # Verificar contraseña (el principal no incluye el hash)
+    usuario = crud_user.get_user_by_id(db, current_user.id)
+    if not usuario or not verify_password(confirmation.password, usuario.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Contraseña incorrecta"
@@ -212,7 +206,7 @@ def delete_my_account(
 
 @router.get("/me/summary", response_model=dict)
 def get_my_summary(
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -220,22 +214,8 @@ def get_my_summary(
     
     **Requiere autenticación JWT.**
     """
-    from app.crud import crud_reserva, crud_billete, crud_tarjeta
-    from app.database import EstadoReservaEnum
-    
-    # Estadísticas de reservas
-    reservas_pendientes = len(crud_reserva.get_reservas_by_estado(
-        db, current_user.id, EstadoReservaEnum.Pendiente
-    ))
-    reservas_confirmadas = len(crud_reserva.get_reservas_by_estado(
-        db, current_user.id, EstadoReservaEnum.Confirmada
-    ))
-    
-    # Estadísticas de billetes
-    total_billetes = crud_billete.count_billetes_by_user(db, current_user.id)
-    
-    # Estadísticas de tarjetas
-    total_tarjetas = crud_tarjeta.count_tarjetas_by_user(db, current_user.id)
+    # Estadísticas de reservas, billetes y tarjetas (una sola consulta agregada)
+    stats = crud_user.get_user_stats(db, current_user.id)
     
     return {
         "usuario": {
@@ -244,13 +224,13 @@ def get_my_summary(
             "miembro_desde": current_user.fecha_creacion
         },
         "reservas": {
-            "pendientes": reservas_pendientes,
-            "confirmadas": reservas_confirmadas
+            "pendientes": stats["pendientes"],
+            "confirmadas": stats["confirmadas"]
         },
         "compras": {
-            "total_billetes": total_billetes
+            "total_billetes": stats["total_billetes"]
         },
         "pagos": {
-            "tarjetas_registradas": total_tarjetas
+            "tarjetas_registradas": stats["total_tarjetas"]
         }
     }
@@ -1,19 +1,29 @@
 # Core module - Configuración y seguridad
 from .config import settings, Settings
-from .security import (
-    verify_password,
-    get_password_hash,
-    create_access_token,
-    verify_token
+
+# security depende de app.database (get_db), que a su vez usa la configuración:
+# sus funciones se exportan bajo demanda para evitar la importación circular
+_SECURITY_EXPORTS = (
+    "verify_password",
+    "get_password_hash",
+    "verify_password_async",
+    "get_password_hash_async",
+    "password_needs_rehash",
+    "create_access_token",
+    "decode_token",
+    "verify_token",
 )
 
+def __getattr__(name):
+    if name in _SECURITY_EXPORTS:
+        from . import security
+        return getattr(security, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 __all__ = [
     # Config
     "settings",
     "Settings",
     # Security
-    "verify_password",
-    "get_password_hash",
-    "create_access_token",
-    "verify_token",
+    *_SECURITY_EXPORTS,
 ]
@@ -1,12 +1,70 @@
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
+from typing import Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # URL para el acceso async (opcional: por defecto se deriva de DATABASE_URL con asyncpg)
+    ASYNC_DATABASE_URL: Optional[str] = None
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     
+    # bcrypt: costo (work factor) y pool de procesos dedicado (0 = en el hilo del endpoint)
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    # Operaciones de bcrypt en curso permitidas; por encima se responde 503
+    PASSWORD_HASH_MAX_PENDING: int = 16
+    
+    # Caché del usuario autenticado (evita la consulta del usuario en cada petición).
+    # La invalidación es por proceso: en los demás workers un cambio de perfil
+    # o una baja de cuenta se ven con hasta PRINCIPAL_CACHE_TTL_SECONDS de retraso
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 5
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    
+    # Pool de conexiones (cada motor, sync y async, tiene su propio pool)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Abrir DB_POOL_SIZE conexiones al iniciar, antes de recibir tráfico
+    DB_POOL_WARMUP: bool = True
+    
+    # Grafo de rutas en memoria (búsqueda con conexiones): recarga completa y
+    # comprobación en segundo plano de cambios en Vuelos hechos por otros procesos
+    ROUTE_GRAPH_RELOAD_SECONDS: int = 300
+    ROUTE_GRAPH_CHECK_SECONDS: int = 5
+    
+    # Caché de datos de referencia (aeropuertos y aerolíneas)
+    REFERENCE_CACHE_TTL_SECONDS: int = 3600
+    
+    # Cache-Control (max-age) de /flights y /flights/{id}; los asientos siempre se revalidan
+    FLIGHTS_CACHE_MAX_AGE_SECONDS: int = 30
+    
+    # Retención de asientos de reservas pendientes de pago y barrido de las vencidas
+    RESERVA_HOLD_MINUTES: int = 15
+    HOLD_SWEEPER_ENABLED: bool = True
+    HOLD_SWEEP_INTERVAL_SECONDS: int = 30
+    HOLD_SWEEP_BATCH_SIZE: int = 200
+    
+    # Consolidación de las variaciones de disponibilidad (siempre activa, independiente del barrido):
+    # intervalo, variaciones por lote y pendientes de un vuelo que adelantan su consolidación
+    DISPONIBILIDAD_FOLD_INTERVAL_SECONDS: int = 10
+    DISPONIBILIDAD_FOLD_BATCH_SIZE: int = 5000
+    DISPONIBILIDAD_FOLD_THRESHOLD: int = 200
+    
+    # Códigos de confirmación: números que cada proceso toma de la secuencia por bloque
+    CODIGO_CONFIRMACION_BLOCK_SIZE: int = 100
+    
+    # Claves de idempotencia (header Idempotency-Key) de POST /reservas y /billetes/purchase
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    # Claves vencidas que el barrido borra por lote
+    IDEMPOTENCY_PURGE_BATCH_SIZE: int = 1000
+    
+    # Clave para los endpoints /admin (header X-Admin-Key). Sin clave, quedan deshabilitados
+    ADMIN_API_KEY: Optional[str] = None
+    
     model_config = ConfigDict(env_file=".env", env_file_encoding='utf-8')
 
 # Única instancia que será usada en toda la app
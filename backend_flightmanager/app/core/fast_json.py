@@ -0,0 +1,43 @@
+"""
+Serialización rápida (opcional) para respuestas grandes de tipo lista.
+
+Por defecto FastAPI valida cada objeto contra el response_model, lo
+convierte a tipos de Python y luego lo pasa por json.dumps. Los endpoints
+que devuelven listas largas pueden usar en su lugar ListSerializer: un
+TypeAdapter precompilado de List[schema] que valida contra el mismo
+esquema y genera el JSON en un solo paso (pydantic-core). El esquema sigue
+siendo la única definición de la respuesta.
+
+Produce los mismos bytes que el camino por defecto (ver
+benchmark_serialization.py). El response_model del endpoint se mantiene
+para la documentación.
+"""
+from typing import Any, Iterable, List, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+def _copy_headers(response: Optional[Response]) -> dict:
+    """Headers ya asignados al Response inyectado en el endpoint (ETag, cursores...)."""
+    if response is None:
+        return {}
+    return {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+
+class ListSerializer:
+    """TypeAdapter precompilado para respuestas List[schema]."""
+
+    def __init__(self, schema: Any):
+        self.adapter = TypeAdapter(List[schema])
+
+    def dump_json(self, items: Iterable[Any]) -> bytes:
+        """Valida (objetos ORM, filas o dicts) y genera el JSON en un solo paso."""
+        validados = self.adapter.validate_python(list(items), from_attributes=True)
+        return self.adapter.dump_json(validados)
+
+    def response(self, items: Iterable[Any], response: Optional[Response] = None) -> Response:
+        """Respuesta JSON lista para devolver desde el endpoint."""
+        return Response(
+            content=self.dump_json(items),
+            media_type="application/json",
+            headers=_copy_headers(response)
+        )
@@ -0,0 +1,50 @@
+"""
+Validación condicional HTTP para respuestas de lectura.
+
+Cada endpoint arma su ETag a partir de lo que determina el contenido (por
+ejemplo, id y versión de los vuelos); si el cliente envía ese mismo valor
+en If-None-Match se responde 304 sin cuerpo.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Response, status
+
+# Los mapas de asientos cambian con cada reserva: siempre revalidar
+NO_CACHE = "no-cache"
+
+def cache_control(max_age: int) -> str:
+    """Cache-Control para datos públicos que pueden servirse hasta max_age segundos."""
+    if max_age <= 0:
+        return NO_CACHE
+    return f"public, max-age={max_age}, must-revalidate"
+
+def make_etag(*partes) -> str:
+    """ETag fuerte a partir de las partes que determinan el contenido."""
+    texto = "|".join(str(parte) for parte in partes)
+    return '"' + hashlib.sha1(texto.encode("utf-8")).hexdigest()[:20] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Compara el header If-None-Match con un ETag (comparación débil:
+    se ignora el prefijo W/). Acepta listas separadas por comas y "*".
+    """
+    if not if_none_match:
+        return False
+
+    for etiqueta in if_none_match.split(","):
+        etiqueta = etiqueta.strip()
+        if etiqueta == "*" or etiqueta.removeprefix("W/") == etag:
+            return True
+    return False
+
+def set_cache_headers(response: Response, etag: str, cache_control_value: str):
+    """Agrega ETag y Cache-Control a una respuesta."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control_value
+
+def not_modified(etag: str, cache_control_value: str) -> Response:
+    """Respuesta 304 con los mismos headers de caché que tendría la 200."""
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_cache_headers(response, etag, cache_control_value)
+    return response
@@ -0,0 +1,152 @@
+"""
+Ejecutor dedicado para bcrypt (hash y verificación de contraseñas).
+
+bcrypt consume ~250 ms de CPU por operación. Si se ejecuta en los hilos
+de los endpoints, una ráfaga de logins los ocupa todos y el resto de la
+API se queda esperando. Aquí se ejecuta en un pool de procesos de
+PASSWORD_HASH_WORKERS procesos (paralelismo real entre núcleos) con
+un límite de operaciones pendientes: si hay más de
+PASSWORD_HASH_MAX_PENDING en curso, la operación se rechaza de inmediato
+con PasswordHasherBusy (503 en la API) en lugar de encolarse.
+
+El costo de bcrypt es configurable (PASSWORD_BCRYPT_ROUNDS). Los hashes
+con otro costo se siguen verificando y el login los rehace con el costo
+actual (needs_rehash).
+
+Los endpoints de login y registro son async y usan hash_async /
+verify_async: esperan el resultado del pool con asyncio.wrap_future sin
+ocupar ningún hilo. hash / verify esperan con future.result() y bloquean
+el hilo que llama; en la API solo los usan los endpoints sincrónicos de
+cambio de contraseña, actualización de perfil y baja de cuenta, que
+ocupan un hilo del threadpool de AnyIO (40 por defecto, compartido con
+el resto de endpoints sincrónicos) durante cada operación. Como mucho
+hay PASSWORD_HASH_MAX_PENDING operaciones en curso, así que ese valor
+debe quedar por debajo del tamaño del threadpool.
+
+El pool se crea al iniciar la app (start() en el evento startup). Con
+PASSWORD_HASH_WORKERS=0, o fuera de la app (seed_data.py y otros
+scripts), bcrypt se ejecuta en el hilo que llama (las variantes async,
+en un hilo de asyncio.to_thread).
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+from typing import Optional
+
+import bcrypt
+
+from app.core.config import settings
+
+class PasswordHasherBusy(Exception):
+    """Hay demasiadas operaciones de bcrypt pendientes."""
+
+# --- FUNCIONES DE LOS PROCESOS (deben poder serializarse con pickle) ---
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+class PasswordHasher:
+    """Pool de procesos con límite de operaciones pendientes."""
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max(max_pending, workers)
+        self.rounds = rounds
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pendientes = 0
+        self.rechazadas = 0
+
+    def start(self):
+        """Crea el pool de procesos (evento startup de la app)."""
+        with self._lock:
+            if self._executor is None and self.workers > 0:
+                # spawn: los procesos no heredan las conexiones abiertas de los motores
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+        return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _reservar(self):
+        """Cuenta una operación pendiente o la rechaza (backpressure)."""
+        with self._lock:
+            if self._pendientes >= self.max_pending:
+                self.rechazadas += 1
+                raise PasswordHasherBusy()
+            self._pendientes += 1
+
+    def _liberar(self):
+        with self._lock:
+            self._pendientes -= 1
+
+    def _run(self, funcion, *args):
+        """Ejecuta `funcion` en el pool y espera el resultado bloqueando el hilo."""
+        executor = self._executor
+        if executor is None:
+            return funcion(*args)
+
+        self._reservar()
+        try:
+            return executor.submit(funcion, *args).result()
+        finally:
+            self._liberar()
+
+    async def _run_async(self, funcion, *args):
+        """Ejecuta `funcion` en el pool y espera el resultado sin ocupar un hilo."""
+        executor = self._executor
+        if executor is None:
+            return await asyncio.to_thread(funcion, *args)
+
+        self._reservar()
+        try:
+            return await asyncio.wrap_future(executor.submit(funcion, *args))
+        finally:
+            self._liberar()
+
+    # --- API ---
+
+    def hash(self, password: str) -> str:
+        return self._run(_hashpw, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._run(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    async def hash_async(self, password: str) -> str:
+        return (await self._run_async(_hashpw, password.encode('utf-8'), self.rounds)).decode('utf-8')
+
+    async def verify_async(self, password: str, hashed: str) -> bool:
+        return await self._run_async(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True si el hash usa un costo distinto de PASSWORD_BCRYPT_ROUNDS."""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self) -> dict:
+        return {
+            "procesos": self.workers,
+            "pendientes": self._pendientes,
+            "max_pendientes": self.max_pending,
+            "rechazadas": self.rechazadas,
+            "rounds": self.rounds
+        }
+
+# Única instancia compartida por la app
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.PASSWORD_BCRYPT_ROUNDS
+)
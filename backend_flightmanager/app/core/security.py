@@ -1,32 +1,38 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
-import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.password_hasher import password_hasher
+from app.database.database import get_db
 
 # Configuración OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 # --- Funciones de Contraseña ---
+# bcrypt se ejecuta en un pool de procesos dedicado (ver password_hasher.py)
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica si la contraseña plana coincide con el hash."""
-    # Convertir strings a bytes para bcrypt
-    password_bytes = plain_password.encode('utf-8')
-    hashed_bytes = hashed_password.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
+    return password_hasher.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Genera un hash de la contraseña usando bcrypt."""
-    # Convertir password a bytes y generar salt
-    password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    # Retornar como string
-    return hashed.decode('utf-8')
+    """Genera un hash de la contraseña usando bcrypt (costo PASSWORD_BCRYPT_ROUNDS)."""
+    return password_hasher.hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Como verify_password, para endpoints async (no ocupa un hilo mientras espera)."""
+    return await password_hasher.verify_async(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Como get_password_hash, para endpoints async (no ocupa un hilo mientras espera)."""
+    return await password_hasher.hash_async(password)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True si el hash se generó con un costo distinto del configurado."""
+    return password_hasher.needs_rehash(hashed_password)
 
 # --- Funciones de JWT ---
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -41,28 +47,34 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str, credentials_exception) -> str:
-    """Valida el token JWT y devuelve el email (subject)."""
+def decode_token(token: str, credentials_exception) -> dict:
+    """Valida el token JWT y devuelve sus claims (requiere "sub")."""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
-    return email
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+def verify_token(token: str, credentials_exception) -> str:
+    """Valida el token JWT y devuelve el email (subject)."""
+    return decode_token(token, credentials_exception)["sub"]
 
 # --- Dependencia de Usuario Actual ---
 def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(lambda: None)  # Placeholder, se obtiene manualmente
+    db: Session = Depends(get_db)
 ):
     """
     Dependencia para obtener el usuario actual desde el token JWT.
-    Úsala en endpoints protegidos: current_user: Usuario = Depends(get_current_user)
+    Úsala en endpoints protegidos: current_user: Principal = Depends(get_current_user)
+    
+    Usa la misma sesión que el endpoint (get_db se resuelve una vez por
+    petición) y solo consulta la BD si el usuario no está en principal_cache.
     """
-    from app.database.database import get_db
     from app.crud import crud_user
+    from app.services.principal_cache import Principal, principal_cache
     
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -70,19 +82,23 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    email = verify_token(token, credentials_exception)
+    claims = decode_token(token, credentials_exception)
+    user_id = claims.get("uid")
     
-    # Obtener la sesión de base de datos manualmente
-    db_gen = get_db()
-    db = next(db_gen)
+    if user_id is not None:
+        principal = principal_cache.get(user_id)
+        if principal is not None:
+            return principal
     
-    try:
-        user = crud_user.get_user_by_email(db, email=email)
-        if user is None:
-            raise credentials_exception
-        return user
-    finally:
-        try:
-            db_gen.close()
-        except:
-            pass
+    generacion = principal_cache.generacion()
+    if user_id is not None:
+        user = crud_user.get_user_by_id(db, user_id)
+    else:
+        # Tokens emitidos antes de incluir "uid"
+        user = crud_user.get_user_by_email(db, email=claims["sub"])
+    if user is None:
+        raise credentials_exception
+    
+    principal = Principal.from_usuario(user)
+    principal_cache.put(principal, generacion)
+    return principal
@@ -1,7 +1,12 @@
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.sql.expression import func
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import Asiento, Vuelo, EstadoAsientoEnum, CategoriaAsientosEnum
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 from decimal import Decimal
+from app.crud import crud_disponibilidad
+from app.services.seat_map import seat_sort_key
 
 # --- READ ---
 
@@ -36,6 +41,107 @@ def get_seats_by_category(db: Session, vuelo_id: int, categoria: CategoriaAsient
         .order_by(Asiento.numero_asiento)\
         .all()
 
+def _sello(version_vuelo: int, total: int, suma_versiones: Optional[int], max_id: Optional[int]) -> str:
+    """
+    Sello del mapa de asientos para el ETag: cambia si cambia el vuelo
+    (versión), si se actualiza algún asiento (suma de versiones), si se
+    borra alguno (total) o si se crea alguno (mayor ID).
+    """
+    return f"{version_vuelo}.{total}.{suma_versiones or 0}.{max_id or 0}"
+
+def get_seat_map_stamp(db: Session, vuelo_id: int) -> Optional[str]:
+    """
+    Obtiene solo el sello del mapa de asientos de un vuelo (una consulta de
+    agregación, sin cargar los asientos). None si el vuelo no existe.
+    """
+    fila = db.query(
+            Vuelo.version,
+            func.count(Asiento.id),
+            func.sum(Asiento.version),
+            func.max(Asiento.id)
+        )\
+        .outerjoin(Asiento, Asiento.id_vuelo == Vuelo.id)\
+        .filter(Vuelo.id == vuelo_id)\
+        .group_by(Vuelo.id, Vuelo.version)\
+        .first()
+    return _sello(*fila) if fila else None
+
+def get_seat_map(db: Session, vuelo_id: int) -> Optional[Tuple[Any, List[dict], str]]:
+    """
+    Obtiene en UNA sola consulta el encabezado del vuelo y todos sus asientos
+    (LEFT JOIN Vuelos → Asientos, una fila por asiento).
+    Devuelve (vuelo, asientos, sello) o None si el vuelo no existe:
+      - vuelo: fila con las columnas de Vuelos (sirve para flight_as_dict)
+      - asientos: dicts con el formato de AsientoResponse, en orden natural
+        de fila y columna ("2A" antes que "10A")
+      - sello: el mismo que get_seat_map_stamp (para el ETag)
+    """
+    filas = db.query(
+            Vuelo.id,
+            Vuelo.numero_vuelo,
+            Vuelo.id_aerolinea,
+            Vuelo.id_aeropuerto_origen,
+            Vuelo.id_aeropuerto_destino,
+            Vuelo.hora_salida,
+            Vuelo.hora_llegada,
+            Vuelo.tarifa_base,
+            Vuelo.estado,
+            Vuelo.version,
+            Asiento.id.label("asiento_id"),
+            Asiento.numero_asiento,
+            Asiento.categoria,
+            Asiento.precio_adicional,
+            Asiento.estado.label("asiento_estado"),
+            Asiento.version.label("asiento_version")
+        )\
+        .outerjoin(Asiento, Asiento.id_vuelo == Vuelo.id)\
+        .filter(Vuelo.id == vuelo_id)\
+        .all()
+    
+    if not filas:
+        return None
+    
+    # Un vuelo sin asientos devuelve una sola fila con las columnas de Asientos en NULL
+    asientos = [
+        {
+            "id": fila.asiento_id,
+            "numero_asiento": fila.numero_asiento,
+            "categoria": fila.categoria.value,
+            "precio_adicional": fila.precio_adicional,
+            "estado": fila.asiento_estado.value
+        }
+        for fila in filas
+        if fila.asiento_id is not None
+    ]
+    asientos.sort(key=lambda a: seat_sort_key(a["numero_asiento"]))
+    sello = _sello(
+        filas[0].version,
+        len(asientos),
+        sum(fila.asiento_version for fila in filas if fila.asiento_id is not None),
+        max((a["id"] for a in asientos), default=None)
+    )
+    return filas[0], asientos, sello
+
+def get_seats_for_booking(db: Session, asientos_ids: List[int]) -> List[Any]:
+    """
+    Obtiene en UNA consulta los asientos pedidos para una reserva junto con
+    la tarifa base de su vuelo: filas (id, id_vuelo, numero_asiento, estado,
+    precio_adicional, tarifa_base). Los IDs inexistentes no aparecen.
+    """
+    if not asientos_ids:
+        return []
+    return db.query(
+            Asiento.id,
+            Asiento.id_vuelo,
+            Asiento.numero_asiento,
+            Asiento.estado,
+            Asiento.precio_adicional,
+            Vuelo.tarifa_base
+        )\
+        .join(Vuelo, Vuelo.id == Asiento.id_vuelo)\
+        .filter(Asiento.id.in_(asientos_ids))\
+        .all()
+
 def get_seat_by_number(db: Session, vuelo_id: int, numero_asiento: str) -> Optional[Asiento]:
     """Obtiene un asiento específico por número."""
     return db.query(Asiento)\
@@ -52,6 +158,8 @@ def create_asiento(db: Session, asiento_data: dict) -> Asiento:
     """
     db_asiento = Asiento(**asiento_data)
     db.add(db_asiento)
+    db.flush()
+    crud_disponibilidad.adjust_for_asiento(db, db_asiento, None)
     db.commit()
     db.refresh(db_asiento)
     return db_asiento
@@ -60,6 +168,14 @@ def create_asientos_bulk(db: Session, asientos_data: List[dict]) -> List[Asiento
     """Crea múltiples asientos a la vez (útil al crear un vuelo)."""
     asientos = [Asiento(**data) for data in asientos_data]
     db.add_all(asientos)
+    db.flush()
+    
+    deltas = {}
+    for asiento in asientos:
+        clave = (asiento.id_vuelo, CategoriaAsientosEnum(asiento.categoria))
+        deltas[clave] = deltas.get(clave, 0) + crud_disponibilidad.estado_delta(None, asiento.estado)
+    crud_disponibilidad.adjust_disponibles(db, deltas)
+    
     db.commit()
     for asiento in asientos:
         db.refresh(asiento)
@@ -69,20 +185,115 @@ def create_asientos_bulk(db: Session, asientos_data: List[dict]) -> List[Asiento
 
 def reserve_seat(db: Session, asiento_id: int) -> Optional[Asiento]:
     """
-    Marca un asiento como Reservado.
+    Marca un asiento como Reservado (UPDATE condicional, ver reserve_seats).
     Retorna None si el asiento no existe o no está disponible.
     """
-    asiento = get_asiento_by_id(db, asiento_id)
-    if not asiento:
-        return None
-    
-    if asiento.estado != EstadoAsientoEnum.Disponible:
-        return None  # No se puede reservar si no está disponible
+    try:
+        reserve_seats(db, [asiento_id])
+    except ValueError:
+        db.rollback()
+        return None  # No existe o no está disponible
     
-    asiento.estado = EstadoAsientoEnum.Reservado
     db.commit()
-    db.refresh(asiento)
-    return asiento
+    return get_asiento_by_id(db, asiento_id)
+
+def reserve_seats(db: Session, asientos_ids: List[int]) -> List[Any]:
+    """
+    Marca varios asientos como Reservados dentro de la transacción actual
+    (NO hace commit) con un único UPDATE condicional:
+    
+        UPDATE Asientos SET estado = 'Reservado'
+        WHERE id IN (SELECT id ... AND estado = 'Disponible' ORDER BY id FOR UPDATE)
+        RETURNING ...
+    
+    Solo se reclaman los asientos que siguen Disponibles en el momento del
+    UPDATE (sin leerlos antes en Python), y las filas se bloquean en orden de
+    ID para que dos reservas concurrentes no se bloqueen mutuamente.
+    Si no se pudieron reclamar todos lanza ValueError y la transacción debe
+    revertirse (rollback) para devolver los que sí se reclamaron.
+    Retorna las filas reclamadas (id, id_vuelo, numero_asiento, categoria,
+    precio_adicional) en orden de ID.
+    """
+    if len(set(asientos_ids)) != len(asientos_ids):
+        raise ValueError("Hay asientos repetidos en la reserva")
+    if not asientos_ids:
+        return []
+
+    disponibles = select(Asiento.id)\
+        .where(Asiento.id.in_(asientos_ids))\
+        .where(Asiento.estado == EstadoAsientoEnum.Disponible)\
+        .order_by(Asiento.id)\
+        .with_for_update()
+
+    filas = db.execute(
+        update(Asiento)
+            .where(Asiento.id.in_(disponibles))
+            .where(Asiento.estado == EstadoAsientoEnum.Disponible)
+            .values(estado=EstadoAsientoEnum.Reservado)
+            .returning(
+                Asiento.id,
+                Asiento.id_vuelo,
+                Asiento.numero_asiento,
+                Asiento.categoria,
+                Asiento.precio_adicional
+            )
+            .execution_options(synchronize_session=False)
+    ).all()
+
+    if len(filas) != len(asientos_ids):
+        # Identificar el primer asiento que falló para el mensaje de error
+        reclamados = {fila.id for fila in filas}
+        faltantes = [asiento_id for asiento_id in asientos_ids if asiento_id not in reclamados]
+        existentes = dict(
+            db.query(Asiento.id, Asiento.numero_asiento)
+                .filter(Asiento.id.in_(faltantes))
+                .all()
+        )
+        for asiento_id in faltantes:
+            if asiento_id not in existentes:
+                raise ValueError(f"Asiento con ID {asiento_id} no encontrado")
+        raise ValueError(f"Asiento {existentes[faltantes[0]]} no está disponible")
+
+    deltas = {}
+    for fila in filas:
+        clave = (fila.id_vuelo, CategoriaAsientosEnum(fila.categoria))
+        deltas[clave] = deltas.get(clave, 0) + crud_disponibilidad.estado_delta(EstadoAsientoEnum.Disponible, EstadoAsientoEnum.Reservado)
+    crud_disponibilidad.adjust_disponibles(db, deltas)
+
+    return sorted(filas, key=lambda fila: fila.id)
+
+def set_seats_estado(db: Session, asientos_ids, nuevo_estado: EstadoAsientoEnum) -> int:
+    """
+    Cambia el estado de varios asientos con un único UPDATE y ajusta los
+    contadores. asientos_ids: lista de IDs o un select de IDs. Bloquea los
+    asientos en orden de ID. NO hace commit. Retorna la cantidad de asientos.
+    """
+    filas = db.query(Asiento.id, Asiento.id_vuelo, Asiento.categoria, Asiento.estado)\
+        .filter(Asiento.id.in_(asientos_ids))\
+        .order_by(Asiento.id)\
+        .with_for_update()\
+        .all()
+    if not filas:
+        return 0
+
+    db.query(Asiento)\
+        .filter(Asiento.id.in_([f.id for f in filas]))\
+        .update({Asiento.estado: nuevo_estado}, synchronize_session=False)
+
+    deltas = {}
+    for fila in filas:
+        clave = (fila.id_vuelo, CategoriaAsientosEnum(fila.categoria))
+        deltas[clave] = deltas.get(clave, 0) + crud_disponibilidad.estado_delta(fila.estado, nuevo_estado)
+    crud_disponibilidad.adjust_disponibles(db, deltas)
+    return len(filas)
+
+def release_seats(db: Session, asientos_ids) -> int:
+    """Libera (Disponible) varios asientos. Ver set_seats_estado. NO hace commit."""
+    return set_seats_estado(db, asientos_ids, EstadoAsientoEnum.Disponible)
+
+def occupy_seats(db: Session, asientos_ids) -> int:
+    """Marca varios asientos como Ocupados (tras el pago). Ver set_seats_estado. NO hace commit."""
+    return set_seats_estado(db, asientos_ids, EstadoAsientoEnum.Ocupado)
 
 def occupy_seat(db: Session, asiento_id: int) -> Optional[Asiento]:
     """
@@ -92,7 +303,9 @@ def occupy_seat(db: Session, asiento_id: int) -> Optional[Asiento]:
     if not asiento:
         return None
     
+    estado_anterior = asiento.estado
     asiento.estado = EstadoAsientoEnum.Ocupado
+    crud_disponibilidad.adjust_for_asiento(db, asiento, estado_anterior)
     db.commit()
     db.refresh(asiento)
     return asiento
@@ -106,7 +319,9 @@ def release_seat(db: Session, asiento_id: int) -> Optional[Asiento]:
     if not asiento:
         return None
     
+    estado_anterior = asiento.estado
     asiento.estado = EstadoAsientoEnum.Disponible
+    crud_disponibilidad.adjust_for_asiento(db, asiento, estado_anterior)
     db.commit()
     db.refresh(asiento)
     return asiento
@@ -117,7 +332,9 @@ def update_asiento_estado(db: Session, asiento_id: int, nuevo_estado: EstadoAsie
     if not asiento:
         return None
     
+    estado_anterior = asiento.estado
     asiento.estado = nuevo_estado
+    crud_disponibilidad.adjust_for_asiento(db, asiento, estado_anterior)
     db.commit()
     db.refresh(asiento)
     return asiento
@@ -130,7 +347,11 @@ def delete_asiento(db: Session, asiento_id: int) -> bool:
     if not asiento:
         return False
     
+    estado_anterior = asiento.estado
     db.delete(asiento)
+    crud_disponibilidad.adjust_disponibles(db, {
+        (asiento.id_vuelo, CategoriaAsientosEnum(asiento.categoria)): crud_disponibilidad.estado_delta(estado_anterior, None)
+    })
     db.commit()
     return True
 
@@ -142,19 +363,12 @@ def is_seat_available(db: Session, asiento_id: int) -> bool:
     return asiento is not None and asiento.estado == EstadoAsientoEnum.Disponible
 
 def count_available_seats(db: Session, vuelo_id: int) -> int:
-    """Cuenta los asientos disponibles de un vuelo."""
-    return db.query(Asiento)\
-        .filter(Asiento.id_vuelo == vuelo_id)\
-        .filter(Asiento.estado == EstadoAsientoEnum.Disponible)\
-        .count()
+    """Cuenta los asientos disponibles de un vuelo (desde los contadores)."""
+    return crud_disponibilidad.count_disponibles(db, vuelo_id)
 
 def count_seats_by_category(db: Session, vuelo_id: int, categoria: CategoriaAsientosEnum) -> int:
-    """Cuenta asientos disponibles por categoría."""
-    return db.query(Asiento)\
-        .filter(Asiento.id_vuelo == vuelo_id)\
-        .filter(Asiento.categoria == categoria)\
-        .filter(Asiento.estado == EstadoAsientoEnum.Disponible)\
-        .count()
+    """Cuenta asientos disponibles por categoría (desde los contadores)."""
+    return crud_disponibilidad.count_disponibles(db, vuelo_id, categoria)
 
 def get_seat_price(db: Session, asiento_id: int, tarifa_base: Decimal) -> Decimal:
     """
@@ -172,3 +386,13 @@ def seat_exists(db: Session, vuelo_id: int, numero_asiento: str) -> bool:
         .filter(Asiento.id_vuelo == vuelo_id)\
         .filter(Asiento.numero_asiento == numero_asiento)\
         .first() is not None
+
+# --- VERSIONES ASYNC (AsyncSession) ---
+
+async def get_seat_map_async(db: AsyncSession, vuelo_id: int) -> Optional[Tuple[Any, List[dict], str]]:
+    """Versión async de get_seat_map (misma consulta única sobre el motor async)."""
+    return await db.run_sync(get_seat_map, vuelo_id)
+
+async def get_seat_map_stamp_async(db: AsyncSession, vuelo_id: int) -> Optional[str]:
+    """Versión async de get_seat_map_stamp."""
+    return await db.run_sync(get_seat_map_stamp, vuelo_id)
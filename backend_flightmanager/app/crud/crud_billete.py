@@ -1,8 +1,12 @@
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
-from app.database import Billete, Reserva
+from app.database import Billete, Reserva, TarjetaCredito
+from app.services.codigo_confirmacion import codigo_allocator
+from app.services.idempotency import ClavePendiente, idempotency_store
 from typing import List, Optional
-import secrets
-import string
+
+# Intentos de INSERT si el código choca con la restricción UNIQUE
+MAX_INTENTOS_CODIGO = 5
 
 # --- READ ---
 
@@ -45,29 +49,92 @@ def get_billetes_by_user(db: Session, user_id: int, skip: int = 0, limit: int =
         .limit(limit)\
         .all()
 
+def get_billete_rows_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> list:
+    """
+    Billetes de un usuario solo con las columnas de Billetes (formato
+    BilleteResponse), sin cargar reservas ni pasajeros.
+    """
+    return db.query(
+            Billete.id,
+            Billete.id_reserva,
+            Billete.id_tarjeta_credito,
+            Billete.codigo_confirmacion,
+            Billete.fecha_compra
+        )\
+        .join(Reserva, Billete.id_reserva == Reserva.id)\
+        .filter(Reserva.id_usuario == user_id)\
+        .order_by(Billete.fecha_compra.desc())\
+        .offset(skip)\
+        .limit(limit)\
+        .all()
+
 # --- CREATE ---
 
-def create_billete(db: Session, reserva_id: int, tarjeta_credito_id: int) -> Billete:
+def lock_reserva_for_purchase(db: Session, reserva_id: int, tarjeta_id: int):
+    """
+    Primer paso de la compra: bloquea la reserva (FOR UPDATE) y en la MISMA
+    consulta trae su billete (si ya tiene uno) y el dueño de la tarjeta.
+    Retorna la fila (id, id_usuario, estado, expira_en, id_billete,
+    id_tarjeta, id_usuario_tarjeta) o None si la reserva no existe.
+    NO hace commit: seguir con create_billete o hacer rollback.
     """
-    Crea un billete tras una compra exitosa.
-    Genera automáticamente el código de confirmación.
+    return db.query(
+            Reserva.id,
+            Reserva.id_usuario,
+            Reserva.estado,
+            Reserva.expira_en,
+            Billete.id.label("id_billete"),
+            TarjetaCredito.id.label("id_tarjeta"),
+            TarjetaCredito.id_usuario.label("id_usuario_tarjeta")
+        )\
+        .outerjoin(Billete, Billete.id_reserva == Reserva.id)\
+        .outerjoin(TarjetaCredito, TarjetaCredito.id == tarjeta_id)\
+        .filter(Reserva.id == reserva_id)\
+        .with_for_update(of=Reserva)\
+        .first()
+
+def create_billete(db: Session, reserva_id: int, tarjeta_credito_id: int, idempotencia: Optional[ClavePendiente] = None) -> Billete:
     """
-    # Generar código de confirmación único
-    codigo = generate_codigo_confirmacion(db)
+    Crea un billete tras una compra exitosa, en la misma transacción que
+    confirma la reserva (llamar después de lock_reserva_for_purchase):
     
-    db_billete = Billete(
-        id_reserva=reserva_id,
-        id_tarjeta_credito=tarjeta_credito_id,
-        codigo_confirmacion=codigo
-    )
-    db.add(db_billete)
-    db.commit()
-    db.refresh(db_billete)
+    1. INSERT del billete (en un SAVEPOINT)
+    2. Asientos de la reserva -> Ocupado (un UPDATE, más los contadores)
+    3. Reserva -> Confirmada (un UPDATE)
+    4. Clave de idempotencia, si la hay (un INSERT)
+    5. Un único commit
+    
+    El código de confirmación es único por construcción (sin consultar la
+    tabla). Si aun así el INSERT choca con la restricción UNIQUE del código,
+    se reintenta con otro código.
+    """
+    from app.crud.crud_reserva import confirm_locked
     
-    # Confirmar la reserva
-    from app.crud.crud_reserva import confirm_reserva
-    confirm_reserva(db, reserva_id)
+    try:
+        for intento in range(MAX_INTENTOS_CODIGO):
+            db_billete = Billete(
+                id_reserva=reserva_id,
+                id_tarjeta_credito=tarjeta_credito_id,
+                codigo_confirmacion=generate_codigo_confirmacion(db)
+            )
+            try:
+                # SAVEPOINT: un choque de código no revierte el resto de la transacción
+                with db.begin_nested():
+                    db.add(db_billete)
+                break
+            except IntegrityError as e:
+                if "codigo_confirmacion" not in str(e.orig) or intento == MAX_INTENTOS_CODIGO - 1:
+                    raise
+        
+        # Confirmar la reserva y ocupar los asientos
+        confirm_locked(db, [reserva_id])
+        idempotency_store.register(db, idempotencia, db_billete.id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     
+    db.refresh(db_billete)
     return db_billete
 
 # --- UPDATE ---
@@ -89,17 +156,12 @@ def codigo_confirmacion_exists(db: Session, codigo: str) -> bool:
         .filter(Billete.codigo_confirmacion == codigo)\
         .first() is not None
 
-def generate_codigo_confirmacion(db: Session, length: int = 8) -> str:
+def generate_codigo_confirmacion(db: Session) -> str:
     """
-    Genera un código de confirmación único alfanumérico.
-    Formato: ABCD1234 (8 caracteres por defecto)
+    Genera un código de confirmación alfanumérico.
+    Formato: ABCD1234 (8 caracteres). Ver services/codigo_confirmacion.py.
     """
-    characters = string.ascii_uppercase + string.digits
-    
-    while True:
-        codigo = ''.join(secrets.choice(characters) for _ in range(length))
-        if not codigo_confirmacion_exists(db, codigo):
-            return codigo
+    return codigo_allocator.next_codigo(db)
 
 def count_billetes_by_user(db: Session, user_id: int) -> int:
     """Cuenta los billetes de un usuario."""
@@ -0,0 +1,285 @@
+from sqlalchemy import cast, delete, insert, literal, select, text, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.expression import func
+from app.core.config import settings
+from app.database import (
+    Asiento, DisponibilidadAsiento, DisponibilidadDelta,
+    EstadoAsientoEnum, CategoriaAsientosEnum
+)
+from typing import Dict, List, Optional, Tuple
+
+# Contadores materializados de asientos disponibles por (vuelo, categoría).
+# Las funciones de ajuste NO hacen commit ni actualizan los contadores:
+# dentro de la transacción que cambia el estado de los asientos solo
+# insertan la variación en DisponibilidadDeltas (sin bloquear filas
+# compartidas). fold_deltas, desde la consolidación periódica
+# (services/disponibilidad_folder.py), suma esas variaciones a los
+# contadores. Disponibles = contador + variaciones pendientes; si un vuelo
+# aún no tiene contadores, se cuenta sobre Asientos.
+# Las lecturas nunca escriben.
+
+# --- READ ---
+
+def get_disponibles_by_vuelo(db: Session, vuelo_id: int) -> Dict[CategoriaAsientosEnum, int]:
+    """
+    Obtiene los asientos disponibles por categoría de un vuelo: contadores
+    más variaciones pendientes, en una sola consulta.
+    Si el vuelo aún no tiene contadores, cuenta sobre Asientos (sin escribir).
+    Si acumula más de DISPONIBILIDAD_FOLD_THRESHOLD variaciones, pide a la
+    consolidación que sume las del vuelo (en segundo plano).
+    """
+    partes = union_all(
+        select(
+            DisponibilidadAsiento.categoria.label("categoria"),
+            DisponibilidadAsiento.disponibles.label("valor"),
+            literal(1).label("contador")
+        ).where(DisponibilidadAsiento.id_vuelo == vuelo_id),
+        select(
+            DisponibilidadDelta.categoria,
+            DisponibilidadDelta.delta,
+            literal(0)
+        ).where(DisponibilidadDelta.id_vuelo == vuelo_id)
+    ).subquery()
+    filas = db.execute(
+        select(partes.c.categoria, func.sum(partes.c.valor), func.sum(partes.c.contador), func.count())
+        .group_by(partes.c.categoria)
+    ).all()
+    
+    if sum(filas_total - contadores for _, _, contadores, filas_total in filas) > settings.DISPONIBILIDAD_FOLD_THRESHOLD:
+        from app.services.disponibilidad_folder import disponibilidad_folder
+        disponibilidad_folder.request(vuelo_id)
+    
+    conteo = {categoria: 0 for categoria in CategoriaAsientosEnum}
+    if not any(contadores for _, _, contadores, _ in filas):
+        for (_, categoria), total in _conteo_real(db, vuelo_id).items():
+            conteo[categoria] = total
+        return conteo
+    
+    for categoria, total, _, _ in filas:
+        conteo[CategoriaAsientosEnum(categoria)] = int(total)
+    return conteo
+
+def count_disponibles(db: Session, vuelo_id: int, categoria: Optional[CategoriaAsientosEnum] = None) -> int:
+    """Cuenta los asientos disponibles de un vuelo (opcionalmente por categoría)."""
+    conteo = get_disponibles_by_vuelo(db, vuelo_id)
+    if categoria:
+        return conteo[CategoriaAsientosEnum(categoria)]
+    return sum(conteo.values())
+
+async def get_disponibles_by_vuelo_async(db: AsyncSession, vuelo_id: int) -> Dict[CategoriaAsientosEnum, int]:
+    """Versión async de get_disponibles_by_vuelo (solo lectura: no escribe ni hace commit)."""
+    return await db.run_sync(get_disponibles_by_vuelo, vuelo_id)
+
+# --- AJUSTES ---
+
+def estado_delta(estado_anterior: Optional[EstadoAsientoEnum], estado_nuevo: Optional[EstadoAsientoEnum]) -> int:
+    """
+    Variación del contador al pasar un asiento de un estado a otro:
+    +1 si pasa a Disponible, -1 si deja de estarlo, 0 en otro caso.
+    """
+    antes = estado_anterior == EstadoAsientoEnum.Disponible
+    despues = estado_nuevo == EstadoAsientoEnum.Disponible
+    return int(despues) - int(antes)
+
+def adjust_disponibles(db: Session, deltas: Dict[Tuple[int, CategoriaAsientosEnum], int]):
+    """
+    Registra variaciones de los contadores.
+    deltas: {(id_vuelo, categoria): variación}
+    
+    Un solo INSERT en DisponibilidadDeltas: no actualiza (ni bloquea) las
+    filas de DisponibilidadAsientos, así dos reservas del mismo vuelo no se
+    esperan entre sí. fold_deltas las consolida después.
+    """
+    filas = [
+        {"id_vuelo": vuelo_id, "categoria": categoria, "delta": delta}
+        for (vuelo_id, categoria), delta in deltas.items()
+        if delta
+    ]
+    if filas:
+        db.execute(insert(DisponibilidadDelta), filas)
+
+def adjust_for_asiento(db: Session, asiento: Asiento, estado_anterior: Optional[EstadoAsientoEnum]):
+    """Ajusta el contador tras cambiar el estado de un único asiento."""
+    delta = estado_delta(estado_anterior, asiento.estado)
+    adjust_disponibles(db, {(asiento.id_vuelo, CategoriaAsientosEnum(asiento.categoria)): delta})
+
+# --- CONSOLIDACIÓN ---
+
+def fold_deltas(db: Session, limite: int, vuelo_id: Optional[int] = None) -> int:
+    """
+    Suma a los contadores hasta `limite` variaciones pendientes (las más
+    antiguas, de todos los vuelos o de uno) y las borra, en una transacción
+    con commit. Varios procesos pueden consolidar a la vez: cada uno bloquea
+    sus filas con SKIP LOCKED.
+    Retorna las variaciones consolidadas (0 si no quedaba ninguna).
+    """
+    query = db.query(DisponibilidadDelta.id, DisponibilidadDelta.id_vuelo, DisponibilidadDelta.categoria, DisponibilidadDelta.delta)
+    if vuelo_id is not None:
+        query = query.filter(DisponibilidadDelta.id_vuelo == vuelo_id)
+    
+    filas = query.order_by(DisponibilidadDelta.id)\
+        .limit(limite)\
+        .with_for_update(skip_locked=True)\
+        .all()
+    if not filas:
+        db.rollback()
+        return 0
+    
+    sumas: Dict[Tuple[int, CategoriaAsientosEnum], int] = {}
+    for fila in filas:
+        clave = (fila.id_vuelo, CategoriaAsientosEnum(fila.categoria))
+        sumas[clave] = sumas.get(clave, 0) + fila.delta
+    
+    for (vuelo_id, categoria), delta in sorted(sumas.items(), key=lambda item: (item[0][0], item[0][1].value)):
+        if delta and not _sumar(db, vuelo_id, categoria, delta):
+            _crear_contadores(db, vuelo_id)
+            _sumar(db, vuelo_id, categoria, delta)
+    
+    db.execute(delete(DisponibilidadDelta).where(DisponibilidadDelta.id.in_([fila.id for fila in filas])))
+    db.commit()
+    return len(filas)
+
+def _sumar(db: Session, vuelo_id: int, categoria: CategoriaAsientosEnum, delta: int) -> bool:
+    """Suma `delta` a un contador. Retorna False si el contador no existe."""
+    return db.query(DisponibilidadAsiento)\
+        .filter(DisponibilidadAsiento.id_vuelo == vuelo_id)\
+        .filter(DisponibilidadAsiento.categoria == categoria)\
+        .update(
+            {DisponibilidadAsiento.disponibles: DisponibilidadAsiento.disponibles + delta},
+            synchronize_session=False
+        ) > 0
+
+def _crear_contadores(db: Session, vuelo_id: int):
+    """
+    Crea los contadores que falten de un vuelo (uno por categoría) con
+    INSERT ... ON CONFLICT DO NOTHING: dos transacciones que los crean a la
+    vez no chocan con la clave primaria. El conteo sobre Asientos ya incluye
+    todas las variaciones pendientes del vuelo, por eso se descuentan (se
+    suman al consolidarlas).
+    
+    Conteo y variaciones se leen en la MISMA sentencia (una sola foto en
+    READ COMMITTED): una reserva que confirma entre dos consultas separadas
+    quedaría descontada sin estar en el conteo.
+    """
+    tipo = DisponibilidadAsiento.categoria.type
+    filas = []
+    for categoria in CategoriaAsientosEnum:
+        real = select(func.count(Asiento.id))\
+            .where(Asiento.id_vuelo == vuelo_id)\
+            .where(Asiento.categoria == categoria)\
+            .where(Asiento.estado == EstadoAsientoEnum.Disponible)\
+            .scalar_subquery()
+        pendientes = select(func.coalesce(func.sum(DisponibilidadDelta.delta), 0))\
+            .where(DisponibilidadDelta.id_vuelo == vuelo_id)\
+            .where(DisponibilidadDelta.categoria == categoria)\
+            .scalar_subquery()
+        filas.append(select(literal(vuelo_id), cast(literal(categoria, tipo), tipo), real - pendientes))
+    
+    db.execute(
+        pg_insert(DisponibilidadAsiento)
+        .from_select(["id_vuelo", "categoria", "disponibles"], union_all(*filas))
+        .on_conflict_do_nothing()
+    )
+
+def _pendientes(db: Session, vuelo_id: Optional[int] = None) -> Dict[Tuple[int, CategoriaAsientosEnum], int]:
+    """Suma de las variaciones pendientes por (vuelo, categoría)."""
+    query = db.query(
+        DisponibilidadDelta.id_vuelo,
+        DisponibilidadDelta.categoria,
+        func.sum(DisponibilidadDelta.delta)
+    )
+    if vuelo_id is not None:
+        query = query.filter(DisponibilidadDelta.id_vuelo == vuelo_id)
+    
+    filas = query.group_by(DisponibilidadDelta.id_vuelo, DisponibilidadDelta.categoria).all()
+    return {(v, CategoriaAsientosEnum(c)): int(total) for v, c, total in filas}
+
+# --- RECONSTRUCCIÓN Y VERIFICACIÓN ---
+
+def _conteo_real(db: Session, vuelo_id: Optional[int] = None) -> Dict[Tuple[int, CategoriaAsientosEnum], int]:
+    """Cuenta los asientos disponibles directamente sobre Asientos."""
+    query = db.query(
+        Asiento.id_vuelo,
+        Asiento.categoria,
+        func.count(Asiento.id)
+    ).filter(Asiento.estado == EstadoAsientoEnum.Disponible)
+    
+    if vuelo_id is not None:
+        query = query.filter(Asiento.id_vuelo == vuelo_id)
+    
+    filas = query.group_by(Asiento.id_vuelo, Asiento.categoria).all()
+    return {(v, CategoriaAsientosEnum(c)): total for v, c, total in filas}
+
+def rebuild_disponibilidad(db: Session, vuelo_id: Optional[int] = None) -> int:
+    """
+    Reconstruye los contadores desde Asientos (de un vuelo o de todos) y
+    descarta sus variaciones pendientes (ya incluidas en el conteo).
+    Crea una fila por categoría para cada vuelo con asientos.
+    No hace commit. Retorna la cantidad de filas escritas.
+    
+    Bloquea DisponibilidadDeltas hasta el commit de quien llama (EXCLUSIVE:
+    solo admite lecturas): espera a las transacciones que ya registraron
+    variaciones y detiene las nuevas y la consolidación, así el conteo y
+    las variaciones que se borran corresponden al mismo estado. Una reserva que cambió asientos pero aún
+    no registró su variación no entra en el conteo y la registra después.
+    """
+    db.flush()
+    db.execute(text('LOCK TABLE "DisponibilidadDeltas" IN EXCLUSIVE MODE'))
+    real = _conteo_real(db, vuelo_id)
+    
+    vuelos_query = db.query(Asiento.id_vuelo).distinct()
+    if vuelo_id is not None:
+        vuelos_query = vuelos_query.filter(Asiento.id_vuelo == vuelo_id)
+    vuelos = [v for (v,) in vuelos_query.all()]
+    if vuelo_id is not None and vuelo_id not in vuelos:
+        vuelos.append(vuelo_id)
+    
+    borrar = db.query(DisponibilidadAsiento)
+    if vuelo_id is not None:
+        borrar = borrar.filter(DisponibilidadAsiento.id_vuelo == vuelo_id)
+    borrar.delete(synchronize_session=False)
+    
+    borrar = db.query(DisponibilidadDelta)
+    if vuelo_id is not None:
+        borrar = borrar.filter(DisponibilidadDelta.id_vuelo == vuelo_id)
+    borrar.delete(synchronize_session=False)
+    
+    filas = [
+        {"id_vuelo": v, "categoria": categoria, "disponibles": real.get((v, categoria), 0)}
+        for v in vuelos
+        for categoria in CategoriaAsientosEnum
+    ]
+    if filas:
+        db.bulk_insert_mappings(DisponibilidadAsiento, filas)
+    return len(filas)
+
+def verify_disponibilidad(db: Session, vuelo_id: Optional[int] = None) -> List[dict]:
+    """
+    Compara los contadores (más sus variaciones pendientes) con el conteo
+    real sobre Asientos. Retorna la lista de diferencias (vacía si todo cuadra).
+    """
+    real = _conteo_real(db, vuelo_id)
+    pendientes = _pendientes(db, vuelo_id)
+    
+    query = db.query(DisponibilidadAsiento)
+    if vuelo_id is not None:
+        query = query.filter(DisponibilidadAsiento.id_vuelo == vuelo_id)
+    guardado = {
+        (f.id_vuelo, CategoriaAsientosEnum(f.categoria)): f.disponibles + pendientes.get((f.id_vuelo, CategoriaAsientosEnum(f.categoria)), 0)
+        for f in query.all()
+    }
+    
+    diferencias = []
+    for clave in sorted(set(real) | set(guardado), key=lambda c: (c[0], c[1].value)):
+        esperado = real.get(clave, 0)
+        actual = guardado.get(clave)
+        if actual != esperado:
+            diferencias.append({
+                "id_vuelo": clave[0],
+                "categoria": clave[1].value,
+                "contador": actual,
+                "real": esperado
+            })
+    return diferencias
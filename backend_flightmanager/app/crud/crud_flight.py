@@ -1,9 +1,83 @@
-from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.expression import func
-from sqlalchemy import or_
-from app.database import Vuelo, Aeropuerto, Aerolinea, Asiento, EstadoVueloEnum, EstadoAsientoEnum
-from datetime import date, datetime
-from typing import List, Optional
+from sqlalchemy import exists, select, tuple_
+from app.database import Vuelo, Aerolinea, Asiento, EstadoVueloEnum, EstadoAsientoEnum, CategoriaAsientosEnum
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import binascii
+import json
+
+from app.services.route_graph import route_graph
+from app.services.reference_cache import reference_cache
+
+# --- RANGOS DE FECHA ---
+
+def _day_start(fecha: date) -> datetime:
+    """Devuelve el instante 00:00 del día indicado."""
+    return datetime.combine(fecha, time.min)
+
+def _day_bounds(fecha: date) -> Tuple[datetime, datetime]:
+    """
+    Devuelve el rango semiabierto [inicio, fin) que cubre un día completo.
+    Permite filtrar por hora_salida sin envolver la columna en func.date(),
+    de modo que la BD pueda usar el índice sobre hora_salida.
+    """
+    inicio = _day_start(fecha)
+    return inicio, inicio + timedelta(days=1)
+
+# --- ORDENAMIENTO Y CURSORES ---
+
+# Criterios de orden soportados por el listado general de vuelos
+ORDEN_VUELOS = ("fecha", "precio", "aerolinea")
+
+def _sort_column(ordenar_por: str):
+    """Devuelve la columna SQL usada como clave de orden."""
+    if ordenar_por == "precio":
+        return Vuelo.tarifa_base
+    if ordenar_por == "aerolinea":
+        return Aerolinea.nombre
+    return Vuelo.hora_salida
+
+def _sort_value(db: Session, vuelo: Vuelo, ordenar_por: str) -> Any:
+    """Obtiene el valor de la clave de orden de un vuelo ya cargado."""
+    if ordenar_por == "precio":
+        return str(vuelo.tarifa_base)
+    if ordenar_por == "aerolinea":
+        return reference_cache.get(db).aerolineas[vuelo.id_aerolinea].nombre
+    return vuelo.hora_salida.isoformat()
+
+def encode_flight_cursor(db: Session, vuelo: Vuelo, ordenar_por: str) -> str:
+    """
+    Genera un cursor opaco que apunta justo después del vuelo dado.
+    Contiene el criterio de orden, el valor de la clave y el ID (desempate).
+    """
+    payload = {"o": ordenar_por, "k": _sort_value(db, vuelo, ordenar_por), "id": vuelo.id}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_flight_cursor(cursor: str, ordenar_por: str) -> Tuple[Any, int]:
+    """
+    Decodifica un cursor generado por encode_flight_cursor.
+    Lanza ValueError si el cursor es inválido o fue generado con otro orden.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        orden, valor, vuelo_id = payload["o"], payload["k"], int(payload["id"])
+        if orden != ordenar_por:
+            raise ValueError("El cursor corresponde a otro criterio de orden")
+        if ordenar_por == "precio":
+            valor = Decimal(valor)
+        elif ordenar_por == "fecha":
+            valor = datetime.fromisoformat(valor)
+        elif not isinstance(valor, str):
+            raise ValueError("Cursor inválido")
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ArithmeticError) as e:
+        raise ValueError("Cursor inválido") from e
+    return valor, vuelo_id
 
 # --- BÚSQUEDA Y CONSULTAS ---
 
@@ -15,100 +89,153 @@ def get_all_flights_filtered(
     destino_iata: Optional[str] = None,
     fecha_desde: Optional[date] = None,
     fecha_hasta: Optional[date] = None,
-    aerolinea: Optional[str] = None
+    aerolinea: Optional[str] = None,
+    ordenar_por: str = "fecha",
+    cursor: Optional[str] = None
 ) -> List[Vuelo]:
     """
     Obtiene TODOS los vuelos con filtros opcionales y paginación.
     Ideal para la vista principal de exploración de vuelos.
+    
+    El orden ('fecha', 'precio', 'aerolinea') se aplica en SQL con el ID como
+    desempate. Si se pasa un cursor (ver encode_flight_cursor) se usa paginación
+    por clave (keyset) y se ignora skip, así el costo no crece con la página.
+    Lanza ValueError si el cursor es inválido.
+    
+    Solo selecciona columnas de Vuelos: los códigos IATA y la aerolínea se
+    resuelven con reference_cache (serializar con reference_cache.flights_as_dicts).
     """
-    AeropuertoOrigen = aliased(Aeropuerto)
-    AeropuertoDestino = aliased(Aeropuerto)
+    if ordenar_por not in ORDEN_VUELOS:
+        ordenar_por = "fecha"
+    sort_column = _sort_column(ordenar_por)
     
     query = db.query(Vuelo)\
-        .join(AeropuertoOrigen, Vuelo.id_aeropuerto_origen == AeropuertoOrigen.id)\
-        .join(AeropuertoDestino, Vuelo.id_aeropuerto_destino == AeropuertoDestino.id)\
-        .join(Aerolinea, Vuelo.id_aerolinea == Aerolinea.id)\
-        .options(
-            joinedload(Vuelo.origen),
-            joinedload(Vuelo.destino),
-            joinedload(Vuelo.aerolinea)
-        )\
         .filter(Vuelo.estado != EstadoVueloEnum.Cancelado)
     
+    # Solo se une Aerolineas cuando se ordena por su nombre
+    if ordenar_por == "aerolinea":
+        query = query.join(Aerolinea, Vuelo.id_aerolinea == Aerolinea.id)
+    
     # Aplicar filtros opcionales
     if origen_iata:
-        query = query.filter(AeropuertoOrigen.codigo_iata == origen_iata)
+        origen_id = reference_cache.aeropuerto_id(db, origen_iata)
+        if origen_id is None:
+            return []
+        query = query.filter(Vuelo.id_aeropuerto_origen == origen_id)
     
     if destino_iata:
-        query = query.filter(AeropuertoDestino.codigo_iata == destino_iata)
+        destino_id = reference_cache.aeropuerto_id(db, destino_iata)
+        if destino_id is None:
+            return []
+        query = query.filter(Vuelo.id_aeropuerto_destino == destino_id)
     
     if fecha_desde:
-        query = query.filter(func.date(Vuelo.hora_salida) >= fecha_desde)
+        query = query.filter(Vuelo.hora_salida >= _day_start(fecha_desde))
     
     if fecha_hasta:
-        query = query.filter(func.date(Vuelo.hora_salida) <= fecha_hasta)
+        query = query.filter(Vuelo.hora_salida < _day_start(fecha_hasta + timedelta(days=1)))
     
     if aerolinea:
         # Buscar por código O nombre de aerolínea
-        query = query.filter(
-            or_(
-                Aerolinea.codigo_iata.ilike(f"%{aerolinea}%"),
-                Aerolinea.nombre.ilike(f"%{aerolinea}%")
-            )
-        )
+        aerolineas_ids = reference_cache.aerolinea_ids(db, aerolinea)
+        if not aerolineas_ids:
+            return []
+        query = query.filter(Vuelo.id_aerolinea.in_(aerolineas_ids))
+    
+    if cursor:
+        valor, vuelo_id = decode_flight_cursor(cursor, ordenar_por)
+        query = query.filter(tuple_(sort_column, Vuelo.id) > tuple_(valor, vuelo_id))
+        skip = 0
     
-    return query.order_by(Vuelo.hora_salida)\
+    return query.order_by(sort_column, Vuelo.id)\
         .offset(skip)\
         .limit(limit)\
         .all()
 
-def search_flights(db: Session, origen_iata: str, destino_iata: str, fecha: date) -> List[Vuelo]:
+def search_flights(
+    db: Session,
+    origen_iata: str,
+    destino_iata: str,
+    fecha: date,
+    aerolinea_iata: Optional[str] = None,
+    categoria_asiento: Optional[CategoriaAsientosEnum] = None,
+    ordenar_por: str = "horario"
+) -> List[Vuelo]:
     """
     Busca vuelos basados en código IATA de origen, destino y fecha.
-    Carga las relaciones de aerolínea, aeropuertos origen y destino.
+    Solo selecciona columnas de Vuelos: los códigos IATA se resuelven con
+    reference_cache (serializar con reference_cache.flights_as_dicts).
+    
+    Filtros opcionales (resueltos en la misma consulta):
+    - aerolinea_iata: código IATA de la aerolínea
+    - categoria_asiento: solo vuelos con al menos un asiento disponible
+      en esa categoría (EXISTS sobre Asientos)
+    
+    Cada vuelo devuelto lleva el atributo precio_efectivo (ver precio_efectivo(),
+    calculado para categoria_asiento si se indica). ordenar_por: 'horario' o
+    'precio' (precio efectivo, vuelos sin disponibilidad al final).
     """
-    # Crear alias para distinguir entre aeropuerto origen y destino
-    AeropuertoOrigen = aliased(Aeropuerto)
-    AeropuertoDestino = aliased(Aeropuerto)
+    origen_id = reference_cache.aeropuerto_id(db, origen_iata)
+    destino_id = reference_cache.aeropuerto_id(db, destino_iata)
+    if origen_id is None or destino_id is None:
+        return []
     
-    return db.query(Vuelo)\
-        .join(AeropuertoOrigen, Vuelo.id_aeropuerto_origen == AeropuertoOrigen.id)\
-        .join(AeropuertoDestino, Vuelo.id_aeropuerto_destino == AeropuertoDestino.id)\
-        .join(Aerolinea, Vuelo.id_aerolinea == Aerolinea.id)\
-        .options(
-            joinedload(Vuelo.origen),
-            joinedload(Vuelo.destino),
-            joinedload(Vuelo.aerolinea)
-        )\
-        .filter(AeropuertoOrigen.codigo_iata == origen_iata)\
-        .filter(AeropuertoDestino.codigo_iata == destino_iata)\
-        .filter(func.date(Vuelo.hora_salida) == fecha)\
-        .filter(Vuelo.estado != EstadoVueloEnum.Cancelado)\
-        .order_by(Vuelo.hora_salida)\
-        .all()
+    inicio, fin = _day_bounds(fecha)
+    precio = precio_efectivo(categoria_asiento).label("precio_efectivo")
+    
+    query = db.query(Vuelo, precio)\
+        .filter(Vuelo.id_aeropuerto_origen == origen_id)\
+        .filter(Vuelo.id_aeropuerto_destino == destino_id)\
+        .filter(Vuelo.hora_salida >= inicio)\
+        .filter(Vuelo.hora_salida < fin)\
+        .filter(Vuelo.estado != EstadoVueloEnum.Cancelado)
+    
+    if aerolinea_iata:
+        query = query.join(Aerolinea, Vuelo.id_aerolinea == Aerolinea.id)\
+            .filter(Aerolinea.codigo_iata == aerolinea_iata.upper())
+    
+    if categoria_asiento:
+        query = query.filter(
+            exists()
+            .where(Asiento.id_vuelo == Vuelo.id)
+            .where(Asiento.categoria == categoria_asiento)
+            .where(Asiento.estado == EstadoAsientoEnum.Disponible)
+        )
+    
+    if ordenar_por == "precio":
+        query = query.order_by(precio.nulls_last(), Vuelo.hora_salida, Vuelo.id)
+    else:
+        query = query.order_by(Vuelo.hora_salida, Vuelo.id)
+    
+    vuelos = []
+    for vuelo, precio_vuelo in query.all():
+        vuelo.precio_efectivo = precio_vuelo
+        vuelos.append(vuelo)
+    return vuelos
 
 def get_flight_by_id(db: Session, flight_id: int) -> Optional[Vuelo]:
-    """Obtiene un vuelo por su ID con todas las relaciones cargadas."""
+    """
+    Obtiene un vuelo por su ID con sus asientos cargados.
+    Aeropuertos y aerolínea se obtienen de reference_cache al serializar.
+    """
+    return db.query(Vuelo)\
+        .options(joinedload(Vuelo.asientos))\
+        .filter(Vuelo.id == flight_id)\
+        .first()
+
+def get_flight(db: Session, flight_id: int) -> Optional[Vuelo]:
+    """Obtiene un vuelo por su ID sin cargar asientos ni relaciones."""
     return db.query(Vuelo)\
-        .options(
-            joinedload(Vuelo.origen),
-            joinedload(Vuelo.destino),
-            joinedload(Vuelo.aerolinea),
-            joinedload(Vuelo.asientos)
-        )\
         .filter(Vuelo.id == flight_id)\
         .first()
 
 def get_flight_by_number(db: Session, numero_vuelo: str, fecha: date) -> Optional[Vuelo]:
     """Obtiene un vuelo por su número y fecha."""
+    inicio, fin = _day_bounds(fecha)
     return db.query(Vuelo)\
-        .options(
-            joinedload(Vuelo.origen),
-            joinedload(Vuelo.destino),
-            joinedload(Vuelo.aerolinea)
-        )\
         .filter(Vuelo.numero_vuelo == numero_vuelo)\
-        .filter(func.date(Vuelo.hora_salida) == fecha)\
+        .filter(Vuelo.hora_salida >= inicio)\
+        .filter(Vuelo.hora_salida < fin)\
         .first()
 
 def get_flights(
@@ -118,12 +245,7 @@ def get_flights(
     estado: Optional[EstadoVueloEnum] = None
 ) -> List[Vuelo]:
     """Lista vuelos con paginación y filtro opcional por estado."""
-    query = db.query(Vuelo)\
-        .options(
-            joinedload(Vuelo.origen),
-            joinedload(Vuelo.destino),
-            joinedload(Vuelo.aerolinea)
-        )
+    query = db.query(Vuelo)
     
     if estado:
         query = query.filter(Vuelo.estado == estado)
@@ -153,11 +275,82 @@ def get_seats_by_category(db: Session, flight_id: int, categoria: str) -> List[A
         .all()
 
 def count_available_seats(db: Session, flight_id: int) -> int:
-    """Cuenta los asientos disponibles de un vuelo."""
-    return db.query(Asiento)\
-        .filter(Asiento.id_vuelo == flight_id)\
-        .filter(Asiento.estado == EstadoAsientoEnum.Disponible)\
-        .count()
+    """Cuenta los asientos disponibles de un vuelo (desde los contadores)."""
+    from app.crud.crud_disponibilidad import count_disponibles
+    
+    return count_disponibles(db, flight_id)
+
+def get_flight_estado(db: Session, flight_id: int) -> Optional[EstadoVueloEnum]:
+    """Obtiene solo el estado de un vuelo (None si no existe)."""
+    fila = db.query(Vuelo.estado)\
+        .filter(Vuelo.id == flight_id)\
+        .first()
+    return fila.estado if fila else None
+
+def _recargo_minimo(categoria: Optional[CategoriaAsientosEnum] = None):
+    """
+    Subconsulta correlacionada con el menor precio_adicional entre los
+    asientos Disponibles del vuelo (opcionalmente de una categoría).
+    Es NULL si el vuelo no tiene asientos disponibles.
+    Se resuelve por vuelo con el índice (id_vuelo, categoria, estado).
+    """
+    query = select(func.min(Asiento.precio_adicional))\
+        .where(Asiento.id_vuelo == Vuelo.id)\
+        .where(Asiento.estado == EstadoAsientoEnum.Disponible)
+    
+    if categoria:
+        query = query.where(Asiento.categoria == categoria)
+    
+    return query.correlate(Vuelo).scalar_subquery()
+
+def precio_efectivo(categoria: Optional[CategoriaAsientosEnum] = None):
+    """
+    Expresión SQL del precio más barato reservable de un vuelo:
+    tarifa_base + menor recargo de asiento disponible (NULL si está lleno).
+    """
+    return Vuelo.tarifa_base + _recargo_minimo(categoria)
+
+def get_fare_calendar(
+    db: Session,
+    origen_iata: str,
+    destino_iata: str,
+    desde: date,
+    hasta: date
+) -> Dict[date, Tuple[Decimal, int]]:
+    """
+    Calcula, en una sola consulta agrupada, la tarifa mínima efectiva
+    (tarifa_base + menor recargo de asiento disponible) y la cantidad de
+    vuelos con disponibilidad por día de salida.
+    Retorna {fecha: (tarifa_minima, cantidad_vuelos)} solo para días con vuelos.
+    """
+    origen_id = reference_cache.aeropuerto_id(db, origen_iata)
+    destino_id = reference_cache.aeropuerto_id(db, destino_iata)
+    if origen_id is None or destino_id is None:
+        return {}
+    
+    precio = precio_efectivo()
+    dia = func.date(Vuelo.hora_salida)
+    
+    filas = db.query(
+        dia.label("dia"),
+        func.min(precio).label("tarifa_minima"),
+        func.count(precio).label("vuelos")
+    )\
+        .filter(Vuelo.id_aeropuerto_origen == origen_id)\
+        .filter(Vuelo.id_aeropuerto_destino == destino_id)\
+        .filter(Vuelo.hora_salida >= _day_start(desde))\
+        .filter(Vuelo.hora_salida < _day_start(hasta + timedelta(days=1)))\
+        .filter(Vuelo.estado != EstadoVueloEnum.Cancelado)\
+        .group_by(dia)\
+        .all()
+    
+    calendario = {}
+    for fila in filas:
+        if not fila.vuelos:
+            continue
+        fecha = date.fromisoformat(fila.dia) if isinstance(fila.dia, str) else fila.dia
+        calendario[fecha] = (Decimal(fila.tarifa_minima), fila.vuelos)
+    return calendario
 
 # --- CREAR ---
 
@@ -171,6 +364,7 @@ def create_flight(db: Session, flight_data: dict) -> Vuelo:
     db.add(db_flight)
     db.commit()
     db.refresh(db_flight)
+    route_graph.refresh_flight(db, db_flight.id)
     return db_flight
 
 # --- ACTUALIZAR ---
@@ -182,8 +376,10 @@ def update_flight_status(db: Session, flight_id: int, nuevo_estado: EstadoVueloE
         return None
     
     db_flight.estado = nuevo_estado
+    db_flight.version = Vuelo.version + 1
     db.commit()
     db.refresh(db_flight)
+    route_graph.refresh_flight(db, flight_id)
     return db_flight
 
 def update_flight_times(db: Session, flight_id: int, hora_salida: Optional[datetime] = None, hora_llegada: Optional[datetime] = None) -> Optional[Vuelo]:
@@ -197,8 +393,10 @@ def update_flight_times(db: Session, flight_id: int, hora_salida: Optional[datet
     if hora_llegada:
         db_flight.hora_llegada = hora_llegada
     
+    db_flight.version = Vuelo.version + 1
     db.commit()
     db.refresh(db_flight)
+    route_graph.refresh_flight(db, flight_id)
     return db_flight
 
 def update_flight(db: Session, flight_id: int, flight_data: dict) -> Optional[Vuelo]:
@@ -211,8 +409,10 @@ def update_flight(db: Session, flight_id: int, flight_data: dict) -> Optional[Vu
         if hasattr(db_flight, key) and value is not None:
             setattr(db_flight, key, value)
     
+    db_flight.version = Vuelo.version + 1
     db.commit()
     db.refresh(db_flight)
+    route_graph.refresh_flight(db, flight_id)
     return db_flight
 
 # --- ELIMINAR ---
@@ -225,28 +425,61 @@ def delete_flight(db: Session, flight_id: int) -> bool:
     
     db.delete(db_flight)
     db.commit()
+    route_graph.refresh_flight(db, flight_id)
     return True
 
 # --- VALIDACIONES Y UTILIDADES ---
 
 def flight_exists(db: Session, numero_vuelo: str, fecha: date) -> bool:
     """Verifica si un vuelo existe por número y fecha."""
+    inicio, fin = _day_bounds(fecha)
     return db.query(Vuelo)\
         .filter(Vuelo.numero_vuelo == numero_vuelo)\
-        .filter(func.date(Vuelo.hora_salida) == fecha)\
+        .filter(Vuelo.hora_salida >= inicio)\
+        .filter(Vuelo.hora_salida < fin)\
         .first() is not None
 
+def is_bookable(estado: EstadoVueloEnum, asientos_disponibles: int) -> bool:
+    """
+    Criterio de reserva a partir de datos ya cargados.
+    Criterios: No cancelado y tiene asientos disponibles.
+    """
+    return estado != EstadoVueloEnum.Cancelado and asientos_disponibles > 0
+
 def is_flight_bookable(db: Session, flight_id: int) -> bool:
     """
     Verifica si un vuelo se puede reservar.
     Criterios: No cancelado y tiene asientos disponibles.
     """
-    flight = get_flight_by_id(db, flight_id)
-    if not flight:
+    estado = get_flight_estado(db, flight_id)
+    if estado is None:
         return False
     
-    if flight.estado == EstadoVueloEnum.Cancelado:
+    if estado == EstadoVueloEnum.Cancelado:
         return False
     
-    available_seats = count_available_seats(db, flight_id)
-    return available_seats > 0
\ No newline at end of file
+    return is_bookable(estado, count_available_seats(db, flight_id))
+
+# --- VERSIONES ASYNC (AsyncSession) ---
+# Ejecutan las mismas consultas sobre el motor async (run_sync): la espera
+# de la BD no ocupa un hilo del pool de AnyIO.
+
+async def get_all_flights_filtered_async(db: AsyncSession, **filtros) -> List[Vuelo]:
+    """Versión async de get_all_flights_filtered (mismos parámetros)."""
+    return await db.run_sync(lambda s: get_all_flights_filtered(s, **filtros))
+
+async def search_flights_async(db: AsyncSession, **filtros) -> List[Vuelo]:
+    """Versión async de search_flights (mismos parámetros)."""
+    return await db.run_sync(lambda s: search_flights(s, **filtros))
+
+async def get_flight_async(db: AsyncSession, flight_id: int) -> Optional[Vuelo]:
+    """Versión async de get_flight."""
+    return await db.run_sync(get_flight, flight_id)
+
+async def get_flight_estado_async(db: AsyncSession, flight_id: int) -> Optional[EstadoVueloEnum]:
+    """Versión async de get_flight_estado."""
+    return await db.run_sync(get_flight_estado, flight_id)
+
+async def get_fare_calendar_async(db: AsyncSession, **filtros) -> Dict[date, Tuple[Decimal, int]]:
+    """Versión async de get_fare_calendar (mismos parámetros)."""
+    return await db.run_sync(lambda s: get_fare_calendar(s, **filtros))
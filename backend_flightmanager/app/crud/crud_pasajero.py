@@ -60,15 +60,10 @@ def update_pasajero(db: Session, pasajero_id: int, pasajero_data: dict) -> Optio
     if not pasajero:
         return None
     
-    # Si se cambia el asiento, liberar el anterior y reservar el nuevo
+    # Si se cambia el asiento, reclamar el nuevo y liberar el anterior (misma transacción)
     if 'id_asiento' in pasajero_data and pasajero_data['id_asiento'] != pasajero.id_asiento:
-        from app.crud.crud_asiento import release_seat, reserve_seat
-        
-        # Liberar asiento anterior
-        release_seat(db, pasajero.id_asiento)
-        
-        # Reservar nuevo asiento
-        reserve_seat(db, pasajero_data['id_asiento'])
+        if not _swap_seat(db, pasajero, pasajero_data['id_asiento']):
+            return None
     
     # Actualizar datos
     for key, value in pasajero_data.items():
@@ -79,26 +74,36 @@ def update_pasajero(db: Session, pasajero_id: int, pasajero_data: dict) -> Optio
     db.refresh(pasajero)
     return pasajero
 
-def change_pasajero_asiento(db: Session, pasajero_id: int, nuevo_asiento_id: int) -> Optional[Pasajero]:
-    """Cambia el asiento de un pasajero."""
-    from app.crud.crud_asiento import release_seat, reserve_seat, is_seat_available
+def _swap_seat(db: Session, pasajero: Pasajero, nuevo_asiento_id: int) -> bool:
+    """
+    Reclama el nuevo asiento (UPDATE condicional) y libera el anterior, sin
+    commit. Si el nuevo asiento no está disponible revierte y retorna False.
+    """
+    from app.crud.crud_asiento import release_seats, reserve_seats
+    
+    asiento_anterior = pasajero.id_asiento
+    try:
+        reserve_seats(db, [nuevo_asiento_id])
+    except ValueError:
+        db.rollback()
+        return False
     
+    release_seats(db, [asiento_anterior])
+    pasajero.id_asiento = nuevo_asiento_id
+    return True
+
+def change_pasajero_asiento(db: Session, pasajero_id: int, nuevo_asiento_id: int) -> Optional[Pasajero]:
+    """
+    Cambia el asiento de un pasajero en una sola transacción.
+    Retorna None si el pasajero no existe o el nuevo asiento no está disponible.
+    """
     pasajero = get_pasajero_by_id(db, pasajero_id)
     if not pasajero:
         return None
     
-    # Verificar que el nuevo asiento esté disponible
-    if not is_seat_available(db, nuevo_asiento_id):
+    if not _swap_seat(db, pasajero, nuevo_asiento_id):
         return None
     
-    # Liberar asiento anterior
-    release_seat(db, pasajero.id_asiento)
-    
-    # Reservar nuevo asiento
-    reserve_seat(db, nuevo_asiento_id)
-    
-    # Actualizar pasajero
-    pasajero.id_asiento = nuevo_asiento_id
     db.commit()
     db.refresh(pasajero)
     return pasajero
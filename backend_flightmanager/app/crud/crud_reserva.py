@@ -1,8 +1,13 @@
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
-from app.database import Reserva, Pasajero, Asiento, EstadoReservaEnum
-from typing import List, Optional
+from sqlalchemy.sql.expression import func
+from app.core.config import settings
+from app.database import Reserva, Pasajero, EstadoReservaEnum
+from app.services.idempotency import ClavePendiente, idempotency_store
+from typing import Any, List, Optional, Tuple
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # --- READ ---
 
@@ -40,6 +45,68 @@ def get_reservas_by_estado(db: Session, user_id: int, estado: EstadoReservaEnum,
         .limit(limit)\
         .all()
 
+def get_reservas_detail_rows(
+    db: Session,
+    user_id: int,
+    estado: Optional[EstadoReservaEnum] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> List[dict]:
+    """
+    Reservas de un usuario con sus pasajeros como dicts (formato ReservaDetail),
+    leyendo solo columnas: sin hidratar objetos ORM ni cargar asientos.
+    Dos consultas: reservas paginadas y pasajeros de esas reservas.
+    """
+    query = db.query(
+            Reserva.id,
+            Reserva.id_usuario,
+            Reserva.fecha_reserva,
+            Reserva.estado,
+            Reserva.monto_total,
+            Reserva.expira_en
+        )\
+        .filter(Reserva.id_usuario == user_id)
+    
+    if estado is not None:
+        query = query.filter(Reserva.estado == estado)
+    
+    filas = query.order_by(Reserva.fecha_reserva.desc())\
+        .offset(skip)\
+        .limit(limit)\
+        .all()
+    
+    reservas = [
+        {
+            "id": f.id,
+            "id_usuario": f.id_usuario,
+            "fecha_reserva": f.fecha_reserva,
+            "estado": f.estado.value,
+            "monto_total": f.monto_total,
+            "expira_en": f.expira_en,
+            "pasajeros": []
+        }
+        for f in filas
+    ]
+    if not reservas:
+        return reservas
+    
+    por_id = {r["id"]: r for r in reservas}
+    pasajeros = db.query(
+            Pasajero.id,
+            Pasajero.id_reserva,
+            Pasajero.id_asiento,
+            Pasajero.nombre_completo,
+            Pasajero.documento_identidad
+        )\
+        .filter(Pasajero.id_reserva.in_(list(por_id)))\
+        .order_by(Pasajero.id)\
+        .all()
+    
+    for p in pasajeros:
+        por_id[p.id_reserva]["pasajeros"].append(p._asdict())
+    
+    return reservas
+
 def get_pending_reservas(db: Session, user_id: int) -> List[Reserva]:
     """Obtiene reservas pendientes de pago de un usuario."""
     return db.query(Reserva)\
@@ -50,30 +117,58 @@ def get_pending_reservas(db: Session, user_id: int) -> List[Reserva]:
 
 # --- CREATE ---
 
-def create_reserva(db: Session, user_id: int, monto_total: Decimal, pasajeros_data: Optional[List[dict]] = None) -> Reserva:
+def create_reserva(db: Session, user_id: int, monto_total: Decimal, pasajeros_data: Optional[List[dict]] = None, idempotencia: Optional[ClavePendiente] = None) -> Reserva:
     """
-    Crea una nueva reserva.
+    Crea una nueva reserva en UNA sola transacción (todo o nada):
+    bloquea y reserva los asientos de los pasajeros (reserve_seats), inserta
+    la reserva y todos los pasajeros en un solo INSERT y hace un único commit.
+    Los asientos quedan retenidos RESERVA_HOLD_MINUTES (expira_en); si la
+    reserva no se paga antes, el barrido (hold_sweeper.py) la cancela.
     pasajeros_data (opcional): lista de dicts con {nombre_completo, documento_identidad, id_asiento}
+    idempotencia (opcional): ClavePendiente a registrar en la misma transacción.
+    Lanza ValueError (sin dejar cambios) si algún asiento no existe o no está disponible.
     """
-    db_reserva = Reserva(
-        id_usuario=user_id,
-        monto_total=monto_total,
-        estado=EstadoReservaEnum.Pendiente
-    )
-    db.add(db_reserva)
-    db.commit()
+    from app.crud.crud_asiento import reserve_seats
+
+    pasajeros_data = pasajeros_data or []
+    try:
+        if pasajeros_data:
+            reserve_seats(db, [p['id_asiento'] for p in pasajeros_data])
+
+        db_reserva = Reserva(
+            id_usuario=user_id,
+            monto_total=monto_total,
+            estado=EstadoReservaEnum.Pendiente,
+            expira_en=datetime.now() + timedelta(minutes=settings.RESERVA_HOLD_MINUTES)
+        )
+        db.add(db_reserva)
+        db.flush()
+
+        # Pasajeros en un solo INSERT (executemany), sin importar cuántos sean
+        if pasajeros_data:
+            db.execute(
+                insert(Pasajero),
+                [
+                    {
+                        "id_reserva": db_reserva.id,
+                        "id_asiento": p['id_asiento'],
+                        "nombre_completo": p['nombre_completo'],
+                        "documento_identidad": p.get('documento_identidad')
+                    }
+                    for p in pasajeros_data
+                ]
+            )
+        idempotency_store.register(db, idempotencia, db_reserva.id)
+        db.commit()
+    except IntegrityError:
+        # Índice único ux_pasajeros_asiento_activo: el asiento ya tiene un pasajero activo
+        db.rollback()
+        raise ValueError("Uno de los asientos ya está asignado a otro pasajero")
+    except Exception:
+        db.rollback()
+        raise
+
     db.refresh(db_reserva)
-    
-    # Si se proporcionan pasajeros, agregarlos
-    if pasajeros_data:
-        from app.crud.crud_pasajero import create_pasajero
-        for pasajero_data in pasajeros_data:
-            pasajero_data['id_reserva'] = db_reserva.id
-            create_pasajero(db, pasajero_data)
-        
-        # Recargar la reserva con los pasajeros
-        db.refresh(db_reserva)
-    
     return db_reserva
 
 # --- UPDATE ---
@@ -85,53 +180,63 @@ def update_reserva_estado(db: Session, reserva_id: int, nuevo_estado: EstadoRese
         return None
     
     reserva.estado = nuevo_estado
+    if nuevo_estado == EstadoReservaEnum.Cancelada:
+        # Los pasajeros de una reserva cancelada no ocupan asiento
+        for pasajero in reserva.pasajeros:
+            pasajero.activo = False
     db.commit()
     db.refresh(reserva)
     return reserva
 
 def confirm_reserva(db: Session, reserva_id: int) -> Optional[Reserva]:
     """
-    Confirma una reserva (tras pago exitoso).
-    Cambia el estado a Confirmada y marca los asientos como Ocupados.
+    Confirma una reserva (tras pago exitoso) en una transacción.
+    Cambia el estado a Confirmada y marca los asientos como Ocupados
+    (un UPDATE para los asientos y otro para la reserva).
     """
-    from app.crud.crud_asiento import occupy_seat
-    
-    reserva = get_reserva_by_id(db, reserva_id)
-    if not reserva:
-        return None
-    
-    # Cambiar estado de la reserva
-    reserva.estado = EstadoReservaEnum.Confirmada
-    
-    # Marcar todos los asientos como ocupados
-    for pasajero in reserva.pasajeros:
-        occupy_seat(db, pasajero.id_asiento)
+    try:
+        if not lock_reservas(db, [reserva_id]):
+            db.rollback()
+            return None
+        
+        confirm_locked(db, [reserva_id])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     
-    db.commit()
-    db.refresh(reserva)
-    return reserva
+    return get_reserva_by_id(db, reserva_id)
 
 def cancel_reserva(db: Session, reserva_id: int) -> Optional[Reserva]:
     """
-    Cancela una reserva.
+    Cancela una reserva en una transacción.
     Libera los asientos asociados.
     """
-    from app.crud.crud_asiento import release_seat
-    
-    reserva = get_reserva_by_id(db, reserva_id)
-    if not reserva:
-        return None
-    
-    # Cambiar estado de la reserva
-    reserva.estado = EstadoReservaEnum.Cancelada
-    
-    # Liberar todos los asientos
-    for pasajero in reserva.pasajeros:
-        release_seat(db, pasajero.id_asiento)
-    
-    db.commit()
-    db.refresh(reserva)
-    return reserva
+    cancel_reservas(db, [reserva_id])
+    return get_reserva_by_id(db, reserva_id)
+
+def cancel_reservas(db: Session, reserva_ids: List[int]) -> Tuple[int, int]:
+    """
+    Cancela varias reservas (p. ej. todas las de un vuelo cancelado) en UNA
+    transacción: un UPDATE para todos los asientos, uno para los pasajeros
+    y uno para las reservas. Las ya canceladas se ignoran.
+    Retorna (reservas canceladas, asientos liberados).
+    """
+    try:
+        ids = [
+            r.id for r in lock_reservas(db, reserva_ids)
+            if r.estado != EstadoReservaEnum.Cancelada
+        ]
+        if not ids:
+            db.rollback()
+            return 0, 0
+        
+        asientos = _cancel_locked(db, ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(ids), asientos
 
 def update_reserva_monto(db: Session, reserva_id: int, nuevo_monto: Decimal) -> Optional[Reserva]:
     """Actualiza el monto total de una reserva."""
@@ -144,42 +249,171 @@ def update_reserva_monto(db: Session, reserva_id: int, nuevo_monto: Decimal) ->
     db.refresh(reserva)
     return reserva
 
+# --- TRANSICIONES EN LOTE ---
+# Orden de bloqueo común a todas las transiciones (confirmar, comprar,
+# cancelar, eliminar, barrido de retenciones): primero las reservas en orden de ID y
+# después sus asientos en orden de ID. Así dos transacciones que tocan las
+# mismas filas se esperan en lugar de bloquearse mutuamente.
+
+def lock_reservas(db: Session, reserva_ids: List[int]) -> List[Any]:
+    """
+    Bloquea (FOR UPDATE) las reservas indicadas en orden de ID.
+    Retorna filas (id, estado) de las que existen. NO hace commit.
+    """
+    if not reserva_ids:
+        return []
+    return db.query(Reserva.id, Reserva.estado)\
+        .filter(Reserva.id.in_(reserva_ids))\
+        .order_by(Reserva.id)\
+        .with_for_update()\
+        .all()
+
+def _active_seats(reserva_ids: List[int]):
+    """Select de los asientos ocupados por pasajeros activos de las reservas."""
+    return select(Pasajero.id_asiento)\
+        .where(Pasajero.id_reserva.in_(reserva_ids))\
+        .where(Pasajero.activo.is_(True))
+
+def release_reserva_seats(db: Session, reserva_ids: List[int]) -> int:
+    """
+    Libera (Disponible) los asientos de los pasajeros activos de varias
+    reservas con un único UPDATE y ajusta los contadores. Los pasajeros
+    quedan inactivos (ya no ocupan el asiento). NO hace commit.
+    Retorna los asientos liberados.
+    """
+    from app.crud.crud_asiento import release_seats
+    
+    if not reserva_ids:
+        return 0
+    
+    liberados = release_seats(db, _active_seats(reserva_ids))
+    db.query(Pasajero)\
+        .filter(Pasajero.id_reserva.in_(reserva_ids))\
+        .update({Pasajero.activo: False}, synchronize_session=False)
+    return liberados
+
+def confirm_locked(db: Session, reserva_ids: List[int]) -> int:
+    """
+    Confirma reservas ya bloqueadas: marca sus asientos como Ocupados (un
+    UPDATE) y las reservas como Confirmadas (otro UPDATE). NO hace commit.
+    Retorna los asientos ocupados.
+    """
+    from app.crud.crud_asiento import occupy_seats
+    
+    asientos = occupy_seats(db, _active_seats(reserva_ids))
+    db.query(Reserva)\
+        .filter(Reserva.id.in_(reserva_ids))\
+        .update({Reserva.estado: EstadoReservaEnum.Confirmada}, synchronize_session=False)
+    return asientos
+
+def _cancel_locked(db: Session, reserva_ids: List[int]) -> int:
+    """
+    Cancela reservas ya bloqueadas: libera sus asientos y las marca como
+    Canceladas. NO hace commit. Retorna los asientos liberados.
+    """
+    asientos = release_reserva_seats(db, reserva_ids)
+    db.query(Reserva)\
+        .filter(Reserva.id.in_(reserva_ids))\
+        .update({Reserva.estado: EstadoReservaEnum.Cancelada}, synchronize_session=False)
+    return asientos
+
+# --- RETENCIONES VENCIDAS ---
+
+def get_oldest_expired_hold(db: Session, ahora: datetime) -> Optional[datetime]:
+    """Vencimiento más antiguo entre las reservas pendientes ya vencidas."""
+    return db.query(func.min(Reserva.expira_en))\
+        .filter(Reserva.estado == EstadoReservaEnum.Pendiente)\
+        .filter(Reserva.expira_en <= ahora)\
+        .scalar()
+
+def release_expired_holds(db: Session, ahora: datetime, limite: int) -> Tuple[int, int]:
+    """
+    Cancela hasta `limite` reservas Pendientes con la retención vencida
+    (misma semántica que cancel_reservas: estado Cancelada y asientos
+    Disponibles) en una transacción. Las reservas se bloquean en orden de
+    ID y se saltan las bloqueadas por otra transacción (p. ej. una compra
+    en curso u otro proceso barriendo).
+    Retorna (reservas canceladas, asientos liberados).
+    """
+    ids = [
+        r.id for r in db.query(Reserva.id)
+            .filter(Reserva.estado == EstadoReservaEnum.Pendiente)
+            .filter(Reserva.expira_en <= ahora)
+            .order_by(Reserva.id)
+            .limit(limite)
+            .with_for_update(skip_locked=True)
+            .all()
+    ]
+    if not ids:
+        db.rollback()
+        return 0, 0
+    
+    try:
+        asientos = _cancel_locked(db, ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(ids), asientos
+
+def is_hold_expired(reserva: Reserva, ahora: Optional[datetime] = None) -> bool:
+    """True si la reserva está Pendiente y su retención ya venció (aunque el barrido no haya pasado)."""
+    return reserva.estado == EstadoReservaEnum.Pendiente \
+        and reserva.expira_en is not None \
+        and reserva.expira_en <= (ahora or datetime.now())
+
 # --- DELETE ---
 
 def delete_reserva(db: Session, reserva_id: int) -> bool:
     """
-    Elimina una reserva.
+    Elimina una reserva en una transacción.
     Libera los asientos antes de eliminar.
     """
-    reserva = get_reserva_by_id(db, reserva_id)
-    if not reserva:
-        return False
-    
-    # Liberar asientos primero
-    cancel_reserva(db, reserva_id)
-    
-    # Eliminar reserva
-    db.delete(reserva)
-    db.commit()
+    try:
+        if not lock_reservas(db, [reserva_id]):
+            db.rollback()
+            return False
+        
+        # Liberar asientos primero
+        release_reserva_seats(db, [reserva_id])
+        
+        # Eliminar pasajeros y reserva
+        db.query(Pasajero)\
+            .filter(Pasajero.id_reserva == reserva_id)\
+            .delete(synchronize_session=False)
+        db.query(Reserva)\
+            .filter(Reserva.id == reserva_id)\
+            .delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     return True
 
 # --- VALIDACIONES Y UTILIDADES ---
 
+def price_seats(filas) -> Decimal:
+    """
+    Monto total a partir de filas ya cargadas con tarifa_base y
+    precio_adicional (crud_asiento.get_seats_for_booking).
+    """
+    return sum((fila.tarifa_base + fila.precio_adicional for fila in filas), Decimal('0'))
+
 def calculate_total(db: Session, asientos_ids: List[int], tarifa_base: Decimal) -> Decimal:
     """
     Calcula el monto total de una reserva.
     tarifa_base: precio base del vuelo
     asientos_ids: lista de IDs de asientos seleccionados
     """
-    from app.crud.crud_asiento import get_asiento_by_id
+    from app.database import Asiento
     
-    total = Decimal('0')
-    for asiento_id in asientos_ids:
-        asiento = get_asiento_by_id(db, asiento_id)
-        if asiento:
-            total += tarifa_base + asiento.precio_adicional
+    if not asientos_ids:
+        return Decimal('0')
     
-    return total
+    adicionales = db.query(Asiento.precio_adicional)\
+        .filter(Asiento.id.in_(asientos_ids))\
+        .all()
+    return sum((tarifa_base + adicional for (adicional,) in adicionales), Decimal('0'))
 
 def reserva_exists(db: Session, reserva_id: int) -> bool:
     """Verifica si una reserva existe."""
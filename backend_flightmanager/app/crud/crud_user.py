@@ -1,14 +1,21 @@
+from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
 from typing import Optional, List
-from app.database import Usuario
+from decimal import Decimal
+from app.database import Usuario, Reserva, Billete, TarjetaCredito, EstadoReservaEnum
 from app.schemas import UserCreate, UserUpdate
 from app.core.security import get_password_hash
+from app.services.principal_cache import principal_cache
 
 # --- CREATE ---
-def create_user(db: Session, user: UserCreate) -> Usuario:
-    """Crea un nuevo usuario en la BD."""
+def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None) -> Usuario:
+    """
+    Crea un nuevo usuario en la BD. `hashed_password` permite pasar el hash
+    ya calculado (el endpoint de registro lo calcula sin bloquear un hilo).
+    """
     # Hasheamos la contraseña antes de guardarla
-    hashed_password = get_password_hash(user.password)
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     
     db_user = Usuario(
         email=user.email,
@@ -52,6 +59,13 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[
     
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate(user_id)
+    return db_user
+
+def update_password_hash(db: Session, db_user: Usuario, password_hash: str) -> Usuario:
+    """Reemplaza el hash de la contraseña (rehash con el costo actual al hacer login)."""
+    db_user.password_hash = password_hash
+    db.commit()
     return db_user
 
 # --- DELETE ---
@@ -63,9 +77,49 @@ def delete_user(db: Session, user_id: int) -> bool:
     
     db.delete(db_user)
     db.commit()
+    principal_cache.invalidate(user_id)
     return True
 
 # --- VALIDACIONES ---
 def user_exists(db: Session, email: str) -> bool:
     """Verifica si un usuario existe por email."""
-    return db.query(Usuario).filter(Usuario.email == email).first() is not None
\ No newline at end of file
+    return db.query(Usuario).filter(Usuario.email == email).first() is not None
+
+# --- ESTADÍSTICAS ---
+def get_user_stats(db: Session, user_id: int) -> dict:
+    """
+    Estadísticas del usuario en UNA consulta agregada (reservas por estado,
+    billetes, tarjetas y monto gastado), sin cargar filas. La usan
+    /users/me/profile, /users/me/summary, /reservas/me/count y
+    /billetes/me/count.
+    """
+    def por_estado(estado: EstadoReservaEnum):
+        return func.coalesce(func.sum(case((Reserva.estado == estado, 1), else_=0)), 0)
+    
+    total_tarjetas = select(func.count(TarjetaCredito.id))\
+        .where(TarjetaCredito.id_usuario == user_id)\
+        .scalar_subquery()
+    
+    fila = db.query(
+            func.count(Reserva.id).label("total_reservas"),
+            por_estado(EstadoReservaEnum.Pendiente).label("pendientes"),
+            por_estado(EstadoReservaEnum.Confirmada).label("confirmadas"),
+            por_estado(EstadoReservaEnum.Cancelada).label("canceladas"),
+            func.count(Billete.id).label("total_billetes"),
+            func.coalesce(func.sum(case((Billete.id.isnot(None), Reserva.monto_total))), 0).label("monto_total_gastado"),
+            total_tarjetas.label("total_tarjetas")
+        )\
+        .select_from(Reserva)\
+        .outerjoin(Billete, Billete.id_reserva == Reserva.id)\
+        .filter(Reserva.id_usuario == user_id)\
+        .one()
+    
+    return {
+        "total_reservas": fila.total_reservas,
+        "pendientes": fila.pendientes,
+        "confirmadas": fila.confirmadas,
+        "canceladas": fila.canceladas,
+        "total_billetes": fila.total_billetes,
+        "total_tarjetas": fila.total_tarjetas,
+        "monto_total_gastado": Decimal(fila.monto_total_gastado)
+    }
@@ -1,5 +1,5 @@
 # Database module - Modelos y conexión
-from .database import engine, SessionLocal, Base, get_db
+from .database import engine, SessionLocal, Base, get_db, async_engine, AsyncSessionLocal, get_async_db
 from .models import (
     # Enums
     CategoriaAsientosEnum,
@@ -15,7 +15,10 @@ from .models import (
     Asiento,
     Reserva,
     Pasajero,
-    Billete
+    Billete,
+    DisponibilidadAsiento,
+    DisponibilidadDelta,
+    ClaveIdempotencia
 )
 
 __all__ = [
@@ -24,6 +27,9 @@ __all__ = [
     "SessionLocal",
     "Base",
     "get_db",
+    "async_engine",
+    "AsyncSessionLocal",
+    "get_async_db",
     # Enums
     "CategoriaAsientosEnum",
     "EstadoVueloEnum",
@@ -39,4 +45,7 @@ __all__ = [
     "Reserva",
     "Pasajero",
     "Billete",
+    "DisponibilidadAsiento",
+    "DisponibilidadDelta",
+    "ClaveIdempotencia",
 ]
@@ -1,10 +1,13 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.database.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, pool_options
 
-# Crear el motor de SQLAlchemy
-engine = create_engine(settings.DATABASE_URL)
+# Crear el motor de SQLAlchemy (pool configurable e instrumentado, ver pool.py)
+engine = create_engine(settings.DATABASE_URL, poolclass=InstrumentedQueuePool, **pool_options())
 
 # Fábrica de sesiones
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -17,4 +20,24 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# --- ACCESO ASYNC (endpoints de solo lectura con mucho tráfico) ---
+
+def _async_database_url(url: str) -> str:
+    """Deriva la URL async a partir de DATABASE_URL (postgresql:// → postgresql+asyncpg://)."""
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+# Motor async: usa ASYNC_DATABASE_URL o la deriva de DATABASE_URL
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or _async_database_url(settings.DATABASE_URL),
+    poolclass=InstrumentedAsyncQueuePool,
+    **pool_options()
+)
+
+# Fábrica de sesiones async (sin expirar objetos al hacer commit: no hay lazy load en async)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, VARCHAR, TIMESTAMP, ForeignKey, DECIMAL, Boolean, Enum, text
+from sqlalchemy import Column, Integer, String, VARCHAR, TIMESTAMP, ForeignKey, DECIMAL, Boolean, Enum, Index, PrimaryKeyConstraint, Sequence, text
 from sqlalchemy.orm import relationship
 from .database import Base
 import enum
@@ -53,6 +53,8 @@ class Vuelo(Base):
     id_aerolinea = Column(Integer, ForeignKey("Aerolineas.id"))
     id_aeropuerto_origen = Column(Integer, ForeignKey("Aeropuertos.id"))
     id_aeropuerto_destino = Column(Integer, ForeignKey("Aeropuertos.id"))
+    # Se incrementa con cada cambio de los datos del vuelo (ETag)
+    version = Column(Integer, nullable=False, default=0, server_default=text("0"))
 
     # Relaciones
     aerolinea = relationship("Aerolinea")
@@ -60,6 +62,15 @@ class Vuelo(Base):
     destino = relationship("Aeropuerto", foreign_keys=[id_aeropuerto_destino])
     asientos = relationship("Asiento", back_populates="vuelo")
 
+    # Índice compuesto para búsquedas por ruta y fecha (excluye vuelos cancelados)
+    __table_args__ = (
+        Index(
+            "ix_vuelos_ruta_salida",
+            "id_aeropuerto_origen", "id_aeropuerto_destino", "hora_salida",
+            postgresql_where=text("estado <> 'Cancelado'")
+        ),
+    )
+
 # 3. Modelo de Aeropuerto
 class Aeropuerto(Base):
     __tablename__ = "Aeropuertos"
@@ -101,11 +112,19 @@ class Asiento(Base):
     categoria = Column(Enum(CategoriaAsientosEnum), nullable=False)
     estado = Column(Enum(EstadoAsientoEnum), default=EstadoAsientoEnum.Disponible)
     precio_adicional = Column(DECIMAL(10, 2), default=0)
+    # Se incrementa en cada UPDATE del asiento: el ETag del mapa de asientos
+    # sale de estas versiones sin escribir en Vuelos al reservar
+    version = Column(Integer, nullable=False, default=0, server_default=text("0"), onupdate=text('"version" + 1'))
     
     # Relaciones
     vuelo = relationship("Vuelo", back_populates="asientos")
     pasajeros = relationship("Pasajero", back_populates="asiento")
 
+    # Índice para consultas de disponibilidad por vuelo y categoría
+    __table_args__ = (
+        Index("ix_asientos_vuelo_categoria_estado", "id_vuelo", "categoria", "estado"),
+    )
+
 # 7. Modelo de Reserva
 class Reserva(Base):
     __tablename__ = "Reservas"
@@ -115,12 +134,23 @@ class Reserva(Base):
     fecha_reserva = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
     estado = Column(Enum(EstadoReservaEnum), default=EstadoReservaEnum.Pendiente)
     monto_total = Column(DECIMAL(10, 2), nullable=False)
+    # Vencimiento de la retención de asientos mientras está Pendiente (ver hold_sweeper.py)
+    expira_en = Column(TIMESTAMP, nullable=True)
     
     # Relaciones
     usuario = relationship("Usuario", back_populates="reservas")
     pasajeros = relationship("Pasajero", back_populates="reserva", cascade="all, delete-orphan")
     billete = relationship("Billete", back_populates="reserva", uselist=False)
 
+    # Índice para buscar retenciones vencidas (solo reservas pendientes)
+    __table_args__ = (
+        Index(
+            "ix_reservas_pendientes_expira_en",
+            "expira_en",
+            postgresql_where=text("estado = 'Pendiente'")
+        ),
+    )
+
 # 8. Modelo de Pasajero
 class Pasajero(Base):
     __tablename__ = "Pasajeros"
@@ -130,11 +160,23 @@ class Pasajero(Base):
     id_asiento = Column(Integer, ForeignKey("Asientos.id"), nullable=False)
     nombre_completo = Column(VARCHAR(100), nullable=False)
     documento_identidad = Column(VARCHAR(50))  # Ej. Pasaporte
+    # False cuando la reserva se cancela: el pasajero ya no ocupa el asiento
+    activo = Column(Boolean, nullable=False, default=True, server_default=text("true"))
     
     # Relaciones
     reserva = relationship("Reserva", back_populates="pasajeros")
     asiento = relationship("Asiento", back_populates="pasajeros")
 
+    # Un asiento pertenece como máximo a un pasajero activo
+    __table_args__ = (
+        Index(
+            "ux_pasajeros_asiento_activo",
+            "id_asiento",
+            unique=True,
+            postgresql_where=text("activo")
+        ),
+    )
+
 # 9. Modelo de Billete
 class Billete(Base):
     __tablename__ = "Billetes"
@@ -147,4 +189,52 @@ class Billete(Base):
     
     # Relaciones
     reserva = relationship("Reserva", back_populates="billete")
-    tarjeta_credito = relationship("TarjetaCredito", back_populates="billetes")
\ No newline at end of file
+    tarjeta_credito = relationship("TarjetaCredito", back_populates="billetes")
+
+# Bloques de números para los códigos de confirmación (services/codigo_confirmacion.py)
+codigo_confirmacion_seq = Sequence("billetes_codigo_seq", start=0, minvalue=0, metadata=Base.metadata)
+
+# 10. Contadores de disponibilidad por vuelo y categoría
+# Tabla derivada de Asientos: la actualiza la consolidación periódica con las
+# variaciones de DisponibilidadDeltas y se puede reconstruir con
+# sync_disponibilidad.py
+class DisponibilidadAsiento(Base):
+    __tablename__ = "DisponibilidadAsientos"
+    
+    id_vuelo = Column(Integer, ForeignKey("Vuelos.id", ondelete="CASCADE"), nullable=False)
+    categoria = Column(Enum(CategoriaAsientosEnum), nullable=False)
+    disponibles = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        PrimaryKeyConstraint("id_vuelo", "categoria"),
+    )
+
+# 11. Variaciones de disponibilidad pendientes de consolidar
+# Cada cambio de estado de asientos agrega filas aquí (nunca actualiza un
+# contador): reservar en un vuelo con mucha demanda no espera por la fila
+# del contador. services/disponibilidad_folder.py las suma a los contadores.
+class DisponibilidadDelta(Base):
+    __tablename__ = "DisponibilidadDeltas"
+    
+    id = Column(Integer, primary_key=True)
+    id_vuelo = Column(Integer, ForeignKey("Vuelos.id", ondelete="CASCADE"), nullable=False, index=True)
+    categoria = Column(Enum(CategoriaAsientosEnum), nullable=False)
+    delta = Column(Integer, nullable=False)
+
+# 12. Claves de idempotencia (header Idempotency-Key, services/idempotency.py)
+# Se insertan en la misma transacción que la reserva o el billete que crean
+class ClaveIdempotencia(Base):
+    __tablename__ = "ClavesIdempotencia"
+    
+    id = Column(Integer, primary_key=True)
+    id_usuario = Column(Integer, ForeignKey("Usuarios.id", ondelete="CASCADE"), nullable=False)
+    endpoint = Column(VARCHAR(50), nullable=False)
+    clave = Column(VARCHAR(255), nullable=False)
+    huella = Column(VARCHAR(64), nullable=False)  # SHA-256 del cuerpo de la petición
+    id_recurso = Column(Integer, nullable=False)  # Reserva o billete creado
+    expira_en = Column(TIMESTAMP, nullable=False)
+    
+    __table_args__ = (
+        Index("ux_claves_idempotencia", "id_usuario", "endpoint", "clave", unique=True),
+        Index("ix_claves_idempotencia_expira_en", "expira_en"),
+    )
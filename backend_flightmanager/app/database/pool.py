@@ -0,0 +1,125 @@
+"""
+Pool de conexiones configurable e instrumentado.
+
+Los motores sync y async usan subclases de QueuePool que miden cuánto
+espera cada checkout (obtener una conexión del pool) y cuentan los
+timeouts. Junto con el estado actual del pool (conexiones en uso y
+libres), esas métricas se publican en GET /admin/pool-stats.
+"""
+from collections import deque
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+
+# Cantidad de esperas recientes usadas para los percentiles
+_VENTANA_ESPERAS = 1000
+
+class PoolStats:
+    """Contadores acumulados de checkouts de un pool."""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self._recientes = deque(maxlen=_VENTANA_ESPERAS)
+
+    def record_checkout(self, segundos: float):
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+            self._recientes.append(segundos)
+
+    def record_timeout(self, segundos: float):
+        with self._lock:
+            self.timeouts += 1
+            self.espera_max = max(self.espera_max, segundos)
+
+    def _percentil(self, ordenadas: list, p: float) -> float:
+        if not ordenadas:
+            return 0.0
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+
+    def as_dict(self, pool: Optional[QueuePool]) -> dict:
+        """Métricas acumuladas más el estado actual del pool (en milisegundos)."""
+        with self._lock:
+            recientes = sorted(self._recientes)
+            datos = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "espera_promedio_ms": round(self.espera_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "espera_max_ms": round(self.espera_max * 1000, 3),
+                "espera_p50_ms": round(self._percentil(recientes, 0.50) * 1000, 3),
+                "espera_p95_ms": round(self._percentil(recientes, 0.95) * 1000, 3),
+                "espera_p99_ms": round(self._percentil(recientes, 0.99) * 1000, 3),
+            }
+
+        if isinstance(pool, QueuePool):
+            capacidad = pool.size() + max(pool._max_overflow, 0)
+            en_uso = pool.checkedout()
+            datos.update({
+                "tamano": pool.size(),
+                "capacidad_maxima": capacidad,
+                "en_uso": en_uso,
+                "libres": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "saturacion": round(en_uso / capacidad, 3) if capacidad else 0.0,
+            })
+        return datos
+
+class _CheckoutTimingMixin:
+    """Mide la espera de cada checkout (incluye pre-ping y nuevas conexiones)."""
+
+    stats: PoolStats
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super().connect()
+        except exc.TimeoutError:
+            self.stats.record_timeout(time.perf_counter() - inicio)
+            raise
+        self.stats.record_checkout(time.perf_counter() - inicio)
+        return conexion
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    """QueuePool del motor sync."""
+    stats = PoolStats("sync")
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    """QueuePool del motor async."""
+    stats = PoolStats("async")
+
+def pool_options() -> dict:
+    """Parámetros de create_engine para el pool (comunes a ambos motores)."""
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+# --- PRECALENTAMIENTO ---
+
+def warm_up(engine, conexiones: int) -> int:
+    """Abre `conexiones` conexiones a la vez y las devuelve al pool."""
+    abiertas = [engine.connect() for _ in range(conexiones)]
+    for conexion in abiertas:
+        conexion.close()
+    return len(abiertas)
+
+async def warm_up_async(engine, conexiones: int) -> int:
+    """Versión para el motor async."""
+    abiertas = [await engine.connect() for _ in range(conexiones)]
+    for conexion in abiertas:
+        await conexion.close()
+    return len(abiertas)
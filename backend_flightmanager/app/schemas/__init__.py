@@ -4,11 +4,12 @@ from .token import Token, TokenData
 from .flight import (
     Aeropuerto, AeropuertoBase,
     Aerolinea, AerolineaBase,
-    FlightResult
+    FlightResult, ItinerarioResult, FareCalendarDay, SeatMapResponse, SeatGridResponse
 )
 from .asiento import (
     AsientoBase, AsientoCreate, 
-    AsientoUpdate, AsientoDisponible, AsientoResponse
+    AsientoUpdate, AsientoDisponible, AsientoResponse,
+    SeatGrid, SeatGridTarifa
 )
 from .pasajero import (
     PasajeroBase, PasajeroCreate,
@@ -35,10 +36,11 @@ __all__ = [
     # Flight
     "Aeropuerto", "AeropuertoBase",
     "Aerolinea", "AerolineaBase",
-    "FlightResult",
+    "FlightResult", "ItinerarioResult", "FareCalendarDay", "SeatMapResponse", "SeatGridResponse",
     # Asiento
     "AsientoBase", "AsientoCreate",
     "AsientoUpdate", "AsientoDisponible", "AsientoResponse",
+    "SeatGrid", "SeatGridTarifa",
     # Pasajero
     "PasajeroBase", "PasajeroCreate",
     "PasajeroResponse", "PasajeroDetail",
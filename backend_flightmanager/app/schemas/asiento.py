@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from decimal import Decimal
 
 # Esquemas para Asiento
@@ -33,3 +33,19 @@ class AsientoDisponible(BaseModel):
 
 # Alias para compatibilidad con endpoints
 AsientoResponse = AsientoDisponible
+
+# Mapa de asientos compacto (grilla filas × columnas)
+class SeatGridTarifa(BaseModel):
+    categoria: str
+    precio_adicional: Decimal
+
+class SeatGrid(BaseModel):
+    fila_inicial: int
+    filas: int
+    columnas: List[str]  # Letras de columna, ej. ["A", "B", "C", "D", "E", "F"]
+    tarifas: List[SeatGridTarifa]
+    # base64, un byte por celda en orden de filas: (índice de tarifa << 2) | estado
+    # estado: 0 = sin asiento, 1 = Disponible, 2 = Reservado, 3 = Ocupado
+    celdas: str
+    ids: List[int]  # ids de los asientos de las celdas no vacías, en el mismo orden
+    sin_posicion: List[AsientoDisponible] = []  # Asientos con número no interpretable
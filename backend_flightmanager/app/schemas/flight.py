@@ -1,6 +1,8 @@
 from pydantic import BaseModel, ConfigDict
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Optional
+
+from .asiento import AsientoResponse, SeatGrid
 
 # Esquemas para Aeropuertos
 class AeropuertoBase(BaseModel):
@@ -35,5 +37,32 @@ class FlightResult(BaseModel):
     aerolinea: Aerolinea
     origen: Aeropuerto
     destino: Aeropuerto
+    # tarifa_base + recargo del asiento disponible más barato (solo en búsquedas)
+    precio_efectivo: Optional[float] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+# Esquema para un itinerario con conexiones (uno o más vuelos)
+class ItinerarioResult(BaseModel):
+    escalas: int
+    hora_salida: datetime
+    hora_llegada: datetime
+    duracion_minutos: int
+    tarifa_total: float
+    vuelos: List[FlightResult]
+
+# Esquema para un día del calendario de tarifas
+class FareCalendarDay(BaseModel):
+    fecha: date
+    tarifa_minima: Optional[float] = None  # None si no hay vuelos con disponibilidad
+    vuelos: int = 0
+
+# Esquema del mapa de asientos (vuelo + todos sus asientos en una respuesta)
+class SeatMapResponse(BaseModel):
+    vuelo: FlightResult
+    asientos: List[AsientoResponse]
+
+# Esquema del mapa de asientos en formato grilla
+class SeatGridResponse(BaseModel):
+    vuelo: FlightResult
+    grid: SeatGrid
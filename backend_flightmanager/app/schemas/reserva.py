@@ -22,6 +22,8 @@ class ReservaResponse(BaseModel):
     fecha_reserva: datetime
     estado: str
     monto_total: Decimal
+    # Vencimiento de la retención de asientos (solo relevante mientras está Pendiente)
+    expira_en: Optional[datetime] = None
     
     model_config = ConfigDict(from_attributes=True)
 
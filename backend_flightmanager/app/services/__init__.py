@@ -0,0 +1 @@
+# Services module - Lógica en memoria reutilizada por los endpoints
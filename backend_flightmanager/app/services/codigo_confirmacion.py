@@ -0,0 +1,117 @@
+"""
+Generación de códigos de confirmación de billetes sin consultas por intento.
+
+Cada código sale de un número único: la secuencia billetes_codigo_seq de
+PostgreSQL entrega BLOQUES de CODIGO_CONFIRMACION_BLOCK_SIZE números a
+cada proceso (un nextval por bloque), y dentro del bloque los números se
+reparten en memoria. Cada número se transforma con una permutación de
+[0, 36^8) (Feistel con claves derivadas de SECRET_KEY, con "cycle walking")
+y se escribe en base 36 con el alfabeto A-Z0-9: 8 caracteres como
+antes (ABCD1234), distintos por construcción y sin orden visible.
+
+La restricción UNIQUE de Billetes.codigo_confirmacion sigue siendo la red
+de seguridad: si un INSERT choca (p. ej. un código antiguo aleatorio), se
+reintenta con el siguiente código (crud_billete.create_billete).
+"""
+import hashlib
+import string
+import threading
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import codigo_confirmacion_seq
+
+ALFABETO = string.ascii_uppercase + string.digits
+LONGITUD = 8
+ESPACIO = len(ALFABETO) ** LONGITUD  # 36^8 ≈ 2.8e12 códigos
+
+# Feistel balanceado de 2 × 21 bits: cubre 2^42 ≥ 36^8
+_MEDIO_BITS = 21
+_MASCARA = (1 << _MEDIO_BITS) - 1
+_RONDAS = 4
+
+def _claves_rondas(secreto: str) -> list:
+    return [
+        int.from_bytes(hashlib.sha256(f"{secreto}:codigo:{i}".encode()).digest()[:8], "big")
+        for i in range(_RONDAS)
+    ]
+
+_CLAVES = _claves_rondas(settings.SECRET_KEY)
+
+def _feistel(valor: int) -> int:
+    izquierda, derecha = valor >> _MEDIO_BITS, valor & _MASCARA
+    for clave in _CLAVES:
+        f = int.from_bytes(
+            hashlib.blake2b(derecha.to_bytes(4, "big"), digest_size=4, key=clave.to_bytes(8, "big")).digest(),
+            "big"
+        ) & _MASCARA
+        izquierda, derecha = derecha, izquierda ^ f
+    return (izquierda << _MEDIO_BITS) | derecha
+
+def permutar(numero: int) -> int:
+    """Biyección de [0, 36^8) en sí mismo (cycle walking sobre el Feistel)."""
+    if not 0 <= numero < ESPACIO:
+        raise ValueError("Número fuera del espacio de códigos")
+    valor = _feistel(numero)
+    while valor >= ESPACIO:
+        valor = _feistel(valor)
+    return valor
+
+def codificar(numero: int) -> str:
+    """Escribe un número de [0, 36^8) como código de 8 caracteres A-Z0-9."""
+    caracteres = []
+    for _ in range(LONGITUD):
+        numero, resto = divmod(numero, len(ALFABETO))
+        caracteres.append(ALFABETO[resto])
+    return "".join(reversed(caracteres))
+
+class CodigoConfirmacionAllocator:
+    """Reparte los números de un bloque de la secuencia entre los hilos del proceso."""
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._siguiente = 0
+        self._fin = 0
+        self.bloques = 0
+
+    def _nuevo_bloque(self, db: Session) -> int:
+        """
+        Reserva un bloque con un nextval en la sesión de quien llama. En
+        PostgreSQL nextval no se revierte con la transacción: el bloque
+        queda tomado aunque la compra falle (solo deja un hueco).
+        """
+        return db.execute(select(codigo_confirmacion_seq.next_value())).scalar()
+
+    def _tomar(self) -> Optional[int]:
+        """Siguiente número del bloque actual, o None si se agotó (con el lock tomado)."""
+        if self._siguiente >= self._fin:
+            return None
+        numero = self._siguiente % ESPACIO
+        self._siguiente += 1
+        return numero
+
+    def next_numero(self, db: Session) -> int:
+        """Siguiente número único."""
+        with self._lock:
+            numero = self._tomar()
+        while numero is None:
+            # Bloque agotado: el nextval (ida y vuelta a la BD) se hace sin el lock
+            bloque = self._nuevo_bloque(db)
+            with self._lock:
+                # Si otro hilo ya instaló un bloque nuevo, este se descarta (solo deja un hueco)
+                if self._siguiente >= self._fin:
+                    self._siguiente = bloque * self.block_size
+                    self._fin = self._siguiente + self.block_size
+                    self.bloques += 1
+                numero = self._tomar()
+        return numero
+
+    def next_codigo(self, db: Session) -> str:
+        return codificar(permutar(self.next_numero(db)))
+
+# Única instancia compartida por la app
+codigo_allocator = CodigoConfirmacionAllocator(block_size=settings.CODIGO_CONFIRMACION_BLOCK_SIZE)
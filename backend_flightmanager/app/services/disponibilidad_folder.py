@@ -0,0 +1,165 @@
+"""
+Consolidación de las variaciones de disponibilidad pendientes.
+
+Las reservas no actualizan los contadores de DisponibilidadAsientos: solo
+insertan variaciones en DisponibilidadDeltas, y las lecturas suman al
+contador las pendientes de su vuelo. Para que esas lecturas sigan siendo
+de pocas filas, una tarea asyncio de la app (siempre activa, independiente
+del barrido de retenciones) ejecuta cada DISPONIBILIDAD_FOLD_INTERVAL_SECONDS
+crud_disponibilidad.fold_deltas en lotes de DISPONIBILIDAD_FOLD_BATCH_SIZE
+hasta que no queden variaciones.
+
+Además, cuando una lectura encuentra un vuelo con más de
+DISPONIBILIDAD_FOLD_THRESHOLD variaciones pendientes, pide consolidar ese
+vuelo (request): la tarea se despierta sin esperar al intervalo y suma
+primero las del vuelo. La lectura no escribe ni espera.
+
+Varios procesos pueden consolidar a la vez (SKIP LOCKED). Las métricas se
+publican en GET /admin/disponibilidad-fold.
+"""
+import asyncio
+from datetime import datetime
+import threading
+import time as _time
+from typing import Optional, Set
+
+from app.core.config import settings
+from app.crud import crud_disponibilidad
+from app.database.database import SessionLocal
+
+class DisponibilidadFolder:
+    """Tarea periódica que suma las variaciones pendientes a los contadores."""
+
+    def __init__(self, interval_seconds: int, batch_size: int, threshold: int):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._pedidos_lock = threading.Lock()
+        self._pedidos: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._despertar: Optional[asyncio.Event] = None
+        # Métricas
+        self.ejecuciones = 0
+        self.deltas_consolidados = 0
+        self.vuelos_pedidos = 0
+        self.errores = 0
+        self.ultimo_error: Optional[str] = None
+        self.ultima_ejecucion: Optional[datetime] = None
+        self.ultima_duracion_ms = 0.0
+
+    # --- PEDIDOS POR VUELO ---
+
+    def request(self, vuelo_id: int):
+        """
+        Pide consolidar un vuelo con muchas variaciones pendientes. Seguro
+        desde cualquier hilo; no bloquea (la tarea lo atiende en segundo plano).
+        """
+        with self._pedidos_lock:
+            if vuelo_id in self._pedidos:
+                return
+            self._pedidos.add(vuelo_id)
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._despertar.set)
+
+    # --- CONSOLIDACIÓN ---
+
+    def fold_once(self) -> dict:
+        """
+        Consolida primero los vuelos pedidos y luego todas las variaciones
+        pendientes (sincrónico, con su propia sesión). Retorna las
+        variaciones consolidadas y los vuelos atendidos.
+        """
+        with self._lock:
+            with self._pedidos_lock:
+                vuelos = sorted(self._pedidos)
+                self._pedidos.clear()
+
+            inicio = _time.perf_counter()
+            deltas = 0
+            db = SessionLocal()
+            try:
+                for vuelo_id in vuelos:
+                    while True:
+                        consolidados = crud_disponibilidad.fold_deltas(db, self.batch_size, vuelo_id)
+                        deltas += consolidados
+                        if consolidados < self.batch_size:
+                            break
+
+                while True:
+                    consolidados = crud_disponibilidad.fold_deltas(db, self.batch_size)
+                    deltas += consolidados
+                    if consolidados < self.batch_size:
+                        break
+            except Exception as e:
+                self.errores += 1
+                self.ultimo_error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                db.close()
+                self.ejecuciones += 1
+                self.deltas_consolidados += deltas
+                self.vuelos_pedidos += len(vuelos)
+                self.ultima_ejecucion = datetime.now()
+                self.ultima_duracion_ms = round((_time.perf_counter() - inicio) * 1000, 3)
+
+        return {"deltas": deltas, "vuelos_pedidos": vuelos}
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._despertar.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._despertar.clear()
+            try:
+                # La sesión es sincrónica: la consolidación corre en un hilo
+                await asyncio.to_thread(self.fold_once)
+            except Exception as e:
+                print(f"⚠️  Error al consolidar la disponibilidad: {e}")
+
+    # --- CICLO DE VIDA ---
+
+    def start(self):
+        """Inicia la tarea periódica (evento startup de la app)."""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._despertar = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
+
+    def stats(self) -> dict:
+        with self._pedidos_lock:
+            pendientes = len(self._pedidos)
+        return {
+            "activo": self._task is not None,
+            "intervalo_segundos": self.interval_seconds,
+            "tamano_lote": self.batch_size,
+            "umbral_por_vuelo": self.threshold,
+            "ejecuciones": self.ejecuciones,
+            "deltas_consolidados": self.deltas_consolidados,
+            "vuelos_pedidos": self.vuelos_pedidos,
+            "pedidos_en_espera": pendientes,
+            "ultima_ejecucion": self.ultima_ejecucion,
+            "ultima_duracion_ms": self.ultima_duracion_ms,
+            "errores": self.errores,
+            "ultimo_error": self.ultimo_error
+        }
+
+# Única instancia compartida por la app
+disponibilidad_folder = DisponibilidadFolder(
+    interval_seconds=settings.DISPONIBILIDAD_FOLD_INTERVAL_SECONDS,
+    batch_size=settings.DISPONIBILIDAD_FOLD_BATCH_SIZE,
+    threshold=settings.DISPONIBILIDAD_FOLD_THRESHOLD
+)
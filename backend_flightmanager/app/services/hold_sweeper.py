@@ -0,0 +1,158 @@
+"""
+Barrido de retenciones vencidas de reservas pendientes de pago.
+
+Cada reserva Pendiente retiene sus asientos hasta expira_en
+(RESERVA_HOLD_MINUTES después de crearla). Una tarea asyncio de la app
+ejecuta cada HOLD_SWEEP_INTERVAL_SECONDS un barrido que cancela las
+reservas vencidas en lotes de HOLD_SWEEP_BATCH_SIZE
+(crud_reserva.release_expired_holds: un UPDATE para los asientos y otro
+para las reservas por lote) hasta que no queden vencidas.
+
+Después borra las claves de idempotencia vencidas (lotes de
+IDEMPOTENCY_PURGE_BATCH_SIZE). Las variaciones de disponibilidad que
+registran las liberaciones las consolida otra tarea
+(disponibilidad_folder.py), activa aunque el barrido esté deshabilitado.
+
+Varios procesos pueden barrer a la vez: cada lote bloquea sus reservas con
+SKIP LOCKED. Las métricas (retraso del barrido, tamaño de lote, filas
+liberadas) se publican en GET /admin/hold-sweeper.
+"""
+import asyncio
+from datetime import datetime
+import threading
+import time as _time
+from typing import Optional
+
+from app.core.config import settings
+from app.crud import crud_reserva
+from app.database.database import SessionLocal
+from app.services.idempotency import idempotency_store
+
+class HoldSweeper:
+    """Tarea periódica que libera las retenciones vencidas."""
+
+    def __init__(self, interval_seconds: int, batch_size: int, purge_batch_size: int):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.purge_batch_size = purge_batch_size
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Métricas
+        self.barridos = 0
+        self.lotes = 0
+        self.reservas_liberadas = 0
+        self.asientos_liberados = 0
+        self.claves_purgadas = 0
+        self.errores = 0
+        self.ultimo_error: Optional[str] = None
+        self.ultimo_barrido: Optional[datetime] = None
+        self.ultima_duracion_ms = 0.0
+        self.ultimo_lote = 0
+        self.ultimo_retraso_segundos = 0.0
+        self.max_retraso_segundos = 0.0
+
+    # --- BARRIDO ---
+
+    def sweep_once(self) -> dict:
+        """
+        Ejecuta un barrido completo (sincrónico, con su propia sesión).
+        Retorna las reservas y asientos liberados y las claves de
+        idempotencia purgadas.
+        """
+        with self._lock:
+            inicio = _time.perf_counter()
+            ahora = datetime.now()
+            reservas = asientos = lotes = ultimo_lote = claves = 0
+            db = SessionLocal()
+            try:
+                # Retraso: cuánto lleva vencida la retención más antigua sin liberar
+                mas_antigua = crud_reserva.get_oldest_expired_hold(db, ahora)
+                retraso = (ahora - mas_antigua).total_seconds() if mas_antigua else 0.0
+
+                while True:
+                    liberadas, asientos_lote = crud_reserva.release_expired_holds(db, ahora, self.batch_size)
+                    if not liberadas:
+                        break
+                    lotes += 1
+                    ultimo_lote = liberadas
+                    reservas += liberadas
+                    asientos += asientos_lote
+                    if liberadas < self.batch_size:
+                        break
+
+                while True:
+                    purgadas = idempotency_store.purge_expired(db, self.purge_batch_size)
+                    claves += purgadas
+                    if purgadas < self.purge_batch_size:
+                        break
+            except Exception as e:
+                self.errores += 1
+                self.ultimo_error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                db.close()
+                self.barridos += 1
+                self.lotes += lotes
+                self.reservas_liberadas += reservas
+                self.asientos_liberados += asientos
+                self.claves_purgadas += claves
+                self.ultimo_barrido = ahora
+                self.ultima_duracion_ms = round((_time.perf_counter() - inicio) * 1000, 3)
+                if lotes:
+                    self.ultimo_lote = ultimo_lote
+
+            self.ultimo_retraso_segundos = round(retraso, 3)
+            self.max_retraso_segundos = max(self.max_retraso_segundos, self.ultimo_retraso_segundos)
+
+        return {"reservas": reservas, "asientos": asientos, "lotes": lotes, "claves": claves}
+
+    async def _run(self):
+        while True:
+            try:
+                # La sesión es sincrónica: el barrido corre en un hilo
+                await asyncio.to_thread(self.sweep_once)
+            except Exception as e:
+                print(f"⚠️  Error en el barrido de retenciones: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    # --- CICLO DE VIDA ---
+
+    def start(self):
+        """Inicia la tarea periódica (evento startup de la app)."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "activo": self._task is not None,
+            "intervalo_segundos": self.interval_seconds,
+            "tamano_lote": self.batch_size,
+            "barridos": self.barridos,
+            "lotes": self.lotes,
+            "ultimo_lote": self.ultimo_lote,
+            "reservas_liberadas": self.reservas_liberadas,
+            "asientos_liberados": self.asientos_liberados,
+            "claves_purgadas": self.claves_purgadas,
+            "ultimo_barrido": self.ultimo_barrido,
+            "ultima_duracion_ms": self.ultima_duracion_ms,
+            "ultimo_retraso_segundos": self.ultimo_retraso_segundos,
+            "max_retraso_segundos": self.max_retraso_segundos,
+            "errores": self.errores,
+            "ultimo_error": self.ultimo_error
+        }
+
+# Única instancia compartida por la app
+hold_sweeper = HoldSweeper(
+    interval_seconds=settings.HOLD_SWEEP_INTERVAL_SECONDS,
+    batch_size=settings.HOLD_SWEEP_BATCH_SIZE,
+    purge_batch_size=settings.IDEMPOTENCY_PURGE_BATCH_SIZE
+)
@@ -0,0 +1,178 @@
+"""
+Claves de idempotencia (header Idempotency-Key) para POST /reservas y
+POST /billetes/purchase.
+
+Los clientes móviles reintentan las compras cuando la red falla. Si un
+reintento trae la misma Idempotency-Key que una petición que ya terminó
+bien, se devuelve el recurso que creó (header Idempotent-Replayed: true)
+sin volver a validar ni tocar reservas y asientos: no se crean reservas
+duplicadas que retengan asientos.
+
+- La clave es por usuario y por endpoint: (id_usuario, endpoint, clave),
+  con índice único en la tabla ClavesIdempotencia.
+- La fila de la clave se inserta en la MISMA transacción que crea la
+  reserva o el billete (register): o se guardan las dos cosas o ninguna.
+  Si la petición falla, no queda clave y el reintento se ejecuta de nuevo.
+- Dos peticiones simultáneas con la misma clave: la segunda falla (los
+  asientos ya están tomados, o choca con el índice único al insertar la
+  clave y su transacción se revierte entera) y responde con el recurso de
+  la primera (o 409, IdempotencyInProgress, si todavía no es visible).
+- Reusar la clave con otro cuerpo de petición da 422 (IdempotencyKeyMismatch).
+
+Las claves duran IDEMPOTENCY_TTL_SECONDS y se guardan en la base de datos
+(válidas entre procesos y reinicios). Nunca se borra una clave vigente: el
+barrido periódico (hold_sweeper.py) purga solo las vencidas (índice por
+expira_en).
+"""
+from datetime import datetime, timedelta
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import ClaveIdempotencia
+
+class IdempotencyInProgress(Exception):
+    """Otra petición con la misma clave todavía se está procesando."""
+
+class IdempotencyKeyMismatch(Exception):
+    """La clave ya se usó con un cuerpo de petición distinto."""
+
+class IdempotencyKeyTaken(Exception):
+    """Otra petición con la misma clave guardó su resultado primero (se revirtió todo)."""
+
+def fingerprint(payload: Any) -> str:
+    """Huella del cuerpo de la petición (para detectar claves reusadas)."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+class ClavePendiente:
+    """Clave de una petición en curso, a registrar junto con el recurso que cree."""
+    __slots__ = ("id_usuario", "endpoint", "clave", "huella")
+
+    def __init__(self, id_usuario: int, endpoint: str, clave: str, huella: str):
+        self.id_usuario = id_usuario
+        self.endpoint = endpoint
+        self.clave = clave
+        self.huella = huella
+
+class IdempotencyStore:
+    """Claves de idempotencia persistidas en la tabla ClavesIdempotencia."""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        # Métricas del proceso
+        self.repeticiones = 0
+        self.conflictos = 0
+        self.purgadas = 0
+
+    def begin(self, db: Session, user_id: int, endpoint: str, key: Optional[str], payload: Any):
+        """
+        Busca la clave antes de ejecutar la petición. Retorna:
+          - (id_recurso, None) si la clave ya se completó: la petición NO debe
+            ejecutarse, se responde con ese recurso (replay());
+          - (None, ClavePendiente) si hay que ejecutarla: pasar la clave a la
+            función que crea el recurso para que la registre (register());
+          - (None, None) sin clave.
+        Lanza IdempotencyKeyMismatch si la clave se usó con otro cuerpo.
+        """
+        if not key:
+            return None, None
+        huella = fingerprint(payload)
+        fila = db.execute(
+            select(ClaveIdempotencia.id, ClaveIdempotencia.huella, ClaveIdempotencia.id_recurso, ClaveIdempotencia.expira_en)
+            .where(ClaveIdempotencia.id_usuario == user_id)
+            .where(ClaveIdempotencia.endpoint == endpoint)
+            .where(ClaveIdempotencia.clave == key)
+        ).first()
+
+        if fila is not None and fila.expira_en <= datetime.now():
+            # Vencida y aún sin purgar: se libera en la transacción de esta petición
+            db.execute(delete(ClaveIdempotencia).where(ClaveIdempotencia.id == fila.id))
+            fila = None
+
+        if fila is None:
+            return None, ClavePendiente(user_id, endpoint, key, huella)
+        if fila.huella != huella:
+            self.conflictos += 1
+            raise IdempotencyKeyMismatch()
+        self.repeticiones += 1
+        return fila.id_recurso, None
+
+    def register(self, db: Session, pendiente: Optional[ClavePendiente], id_recurso: int):
+        """
+        Inserta la clave (sin commit) en la transacción que crea el recurso.
+        Si otra petición ya la registró, lanza IdempotencyKeyTaken: quien
+        llama debe revertir la transacción completa.
+        """
+        if pendiente is None:
+            return
+        try:
+            db.execute(insert(ClaveIdempotencia).values(
+                id_usuario=pendiente.id_usuario,
+                endpoint=pendiente.endpoint,
+                clave=pendiente.clave,
+                huella=pendiente.huella,
+                id_recurso=id_recurso,
+                expira_en=datetime.now() + timedelta(seconds=self.ttl_seconds)
+            ))
+        except IntegrityError:
+            self.conflictos += 1
+            raise IdempotencyKeyTaken()
+
+    def after_failure(self, db: Session, pendiente: Optional[ClavePendiente], payload: Any, error: Exception) -> int:
+        """
+        Tras el fallo de una petición con clave: si otra petición con la
+        misma clave terminó primero (la causa del fallo), retorna su recurso.
+        Si no, relanza el error (IdempotencyInProgress si fue el choque de
+        la clave pero el resultado de la otra aún no es visible).
+        """
+        if pendiente is None:
+            raise error
+        db.rollback()
+        id_recurso, _ = self.begin(db, pendiente.id_usuario, pendiente.endpoint, pendiente.clave, payload)
+        if id_recurso is not None:
+            return id_recurso
+        db.rollback()
+        if isinstance(error, IdempotencyKeyTaken):
+            raise IdempotencyInProgress()
+        raise error
+
+    @staticmethod
+    def replay(status_code: int, body: Any) -> JSONResponse:
+        """Respuesta de un reintento (serializable a JSON)."""
+        return JSONResponse(
+            status_code=status_code,
+            content=body,
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    def purge_expired(self, db: Session, limite: int) -> int:
+        """
+        Borra hasta `limite` claves vencidas (índice por expira_en), con
+        commit. Las claves vigentes nunca se borran. Retorna las borradas.
+        """
+        ids = select(ClaveIdempotencia.id)\
+            .where(ClaveIdempotencia.expira_en <= datetime.now())\
+            .order_by(ClaveIdempotencia.expira_en)\
+            .limit(limite)\
+            .scalar_subquery()
+        borradas = db.execute(delete(ClaveIdempotencia).where(ClaveIdempotencia.id.in_(ids))).rowcount
+        db.commit()
+        self.purgadas += borradas
+        return borradas
+
+    def stats(self) -> dict:
+        return {
+            "ttl_segundos": self.ttl_seconds,
+            "repeticiones": self.repeticiones,
+            "conflictos": self.conflictos,
+            "purgadas": self.purgadas
+        }
+
+# Única instancia compartida por la app
+idempotency_store = IdempotencyStore(ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS)
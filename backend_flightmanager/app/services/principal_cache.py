@@ -0,0 +1,102 @@
+"""
+Caché en memoria del usuario autenticado (principal).
+
+El token JWT lleva el id del usuario (claim "uid"). get_current_user busca
+el principal en esta caché y solo consulta la BD (con la sesión de la
+petición) cuando no está o ya venció. Las entradas duran
+PRINCIPAL_CACHE_TTL_SECONDS, la caché guarda como máximo
+PRINCIPAL_CACHE_MAX_SIZE usuarios (se descartan los menos usados) y
+crud_user.update_user/delete_user invalidan la entrada del usuario.
+
+La invalidación solo alcanza a la caché del proceso que hizo el cambio.
+Con varios workers (uvicorn --workers, varias réplicas) los demás siguen
+usando su copia hasta que vence: un cambio de nombre o email, o una baja
+de cuenta, tarda hasta PRINCIPAL_CACHE_TTL_SECONDS en verse en ellos (y
+durante ese tiempo un token del usuario borrado sigue autenticando). Por
+eso el TTL por defecto es de pocos segundos: basta para ahorrar la
+consulta en las ráfagas de peticiones de un mismo usuario y acota el
+desfase; con 0 la caché queda desactivada.
+
+El principal no incluye el hash de la contraseña: los endpoints que la
+verifican leen el usuario de la BD.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+import threading
+import time as _time
+from typing import Optional
+
+from app.core.config import settings
+from app.database import Usuario
+
+@dataclass(frozen=True)
+class Principal:
+    """Datos del usuario autenticado (mismos campos que el esquema User)."""
+    id: int
+    email: str
+    nombre_completo: str
+    fecha_creacion: datetime
+
+    @classmethod
+    def from_usuario(cls, usuario: Usuario) -> "Principal":
+        return cls(usuario.id, usuario.email, usuario.nombre_completo, usuario.fecha_creacion)
+
+class PrincipalCache:
+    """LRU con vencimiento por entrada, segura entre hilos."""
+
+    def __init__(self, ttl_seconds: int, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # Aumenta en cada invalidación: evita guardar datos leídos antes de un cambio
+        self._generacion = 0
+
+    def generacion(self) -> int:
+        """Valor a pasar a put() tomado ANTES de leer el usuario de la BD."""
+        return self._generacion
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        with self._lock:
+            entrada = self._entries.get(user_id)
+            if entrada is None:
+                return None
+            principal, vence = entrada
+            if vence <= _time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def put(self, principal: Principal, generacion: int):
+        """Guarda el principal si no hubo invalidaciones desde `generacion`."""
+        if self.ttl_seconds <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            if generacion != self._generacion:
+                return
+            self._entries[principal.id] = (principal, _time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Quita al usuario de la caché (llamar después del commit)."""
+        with self._lock:
+            self._generacion += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generacion += 1
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Única instancia compartida por la app
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE
+)
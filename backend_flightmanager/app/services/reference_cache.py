@@ -0,0 +1,164 @@
+"""
+Caché en memoria de datos de referencia: Aeropuertos y Aerolíneas.
+
+Son tablas pequeñas que casi nunca cambian. Se cargan una vez en una
+instantánea inmutable y versionada. Así las consultas de vuelos
+seleccionan solo columnas de Vuelos y resuelven los códigos IATA sin
+JOIN; los objetos de aeropuerto y aerolínea se adjuntan al serializar.
+
+La instantánea se recarga cuando supera REFERENCE_CACHE_TTL_SECONDS,
+cuando se invalida (endpoint /admin/reference-cache/reload) o cuando se
+pide un código IATA desconocido (como máximo una vez cada 30 segundos).
+"""
+from dataclasses import dataclass, field
+import hashlib
+from datetime import datetime
+import threading
+import time as _time
+from types import MappingProxyType
+from typing import List, Mapping, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database import Aeropuerto, Aerolinea, Vuelo
+
+# Intervalo mínimo entre recargas provocadas por códigos desconocidos
+_MISS_RELOAD_SECONDS = 30
+
+@dataclass(frozen=True)
+class AeropuertoRef:
+    id: int
+    codigo_iata: str
+    nombre: str
+    ciudad: str
+    pais: str
+
+@dataclass(frozen=True)
+class AerolineaRef:
+    id: int
+    codigo_iata: str
+    nombre: str
+
+@dataclass(frozen=True)
+class ReferenceSnapshot:
+    """Instantánea inmutable de los datos de referencia."""
+    version: int
+    cargado_en: datetime
+    aeropuertos: Mapping[int, AeropuertoRef] = field(default_factory=dict)
+    aerolineas: Mapping[int, AerolineaRef] = field(default_factory=dict)
+    aeropuertos_por_iata: Mapping[str, int] = field(default_factory=dict)
+    # Resumen del contenido: igual en todos los procesos si los datos son iguales (ETag)
+    huella: str = ""
+
+class ReferenceCache:
+    """Mantiene la instantánea vigente y la recarga bajo demanda."""
+    
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ReferenceSnapshot] = None
+        self._loaded_at: float = 0.0
+        self._last_miss_reload: float = 0.0
+        self._stale = True
+    
+    # --- CARGA ---
+    
+    def reload(self, db: Session) -> ReferenceSnapshot:
+        """Carga una nueva instantánea desde la BD e incrementa la versión."""
+        aeropuertos = {
+            a.id: AeropuertoRef(a.id, a.codigo_iata, a.nombre, a.ciudad, a.pais)
+            for a in db.query(Aeropuerto).all()
+        }
+        aerolineas = {
+            a.id: AerolineaRef(a.id, a.codigo_iata, a.nombre)
+            for a in db.query(Aerolinea).all()
+        }
+        
+        contenido = repr((sorted(aeropuertos.values(), key=lambda a: a.id), sorted(aerolineas.values(), key=lambda a: a.id)))
+        huella = hashlib.sha1(contenido.encode("utf-8")).hexdigest()[:12]
+        
+        with self._lock:
+            version = self._snapshot.version + 1 if self._snapshot else 1
+            self._snapshot = ReferenceSnapshot(
+                version=version,
+                cargado_en=datetime.now(),
+                aeropuertos=MappingProxyType(aeropuertos),
+                aerolineas=MappingProxyType(aerolineas),
+                aeropuertos_por_iata=MappingProxyType({a.codigo_iata: a.id for a in aeropuertos.values()}),
+                huella=huella
+            )
+            self._loaded_at = _time.monotonic()
+            self._stale = False
+            return self._snapshot
+    
+    def get(self, db: Session) -> ReferenceSnapshot:
+        """Devuelve la instantánea vigente, recargándola si está vencida o invalidada."""
+        snapshot = self._snapshot
+        if snapshot is None or self._stale or _time.monotonic() - self._loaded_at > self.ttl_seconds:
+            snapshot = self.reload(db)
+        return snapshot
+    
+    def invalidate(self):
+        """Marca la instantánea como vencida: se recarga en el próximo acceso."""
+        self._stale = True
+    
+    @property
+    def snapshot(self) -> Optional[ReferenceSnapshot]:
+        """Instantánea actual sin recargar (None si nunca se cargó)."""
+        return self._snapshot
+    
+    # --- CONSULTAS ---
+    
+    def aeropuerto_id(self, db: Session, codigo_iata: str) -> Optional[int]:
+        """
+        Resuelve un código IATA de aeropuerto a su ID.
+        Ante un código desconocido recarga la instantánea (con límite de frecuencia).
+        """
+        snapshot = self.get(db)
+        aeropuerto_id = snapshot.aeropuertos_por_iata.get(codigo_iata)
+        if aeropuerto_id is None and _time.monotonic() - self._last_miss_reload > _MISS_RELOAD_SECONDS:
+            self._last_miss_reload = _time.monotonic()
+            aeropuerto_id = self.reload(db).aeropuertos_por_iata.get(codigo_iata)
+        return aeropuerto_id
+    
+    def aerolinea_ids(self, db: Session, texto: str) -> List[int]:
+        """IDs de aerolíneas cuyo código o nombre contiene el texto (sin distinguir mayúsculas)."""
+        texto = texto.lower()
+        return [
+            a.id for a in self.get(db).aerolineas.values()
+            if texto in a.codigo_iata.lower() or texto in a.nombre.lower()
+        ]
+    
+    # --- SERIALIZACIÓN ---
+    
+    def flight_as_dict(self, db: Session, vuelo: Vuelo) -> dict:
+        """
+        Convierte un vuelo (solo columnas de Vuelos) al formato de FlightResult,
+        adjuntando aeropuertos y aerolínea desde la instantánea.
+        """
+        snapshot = self.get(db)
+        if (vuelo.id_aeropuerto_origen not in snapshot.aeropuertos
+                or vuelo.id_aeropuerto_destino not in snapshot.aeropuertos
+                or vuelo.id_aerolinea not in snapshot.aerolineas):
+            snapshot = self.reload(db)
+        
+        return {
+            "id": vuelo.id,
+            "numero_vuelo": vuelo.numero_vuelo,
+            "hora_salida": vuelo.hora_salida,
+            "hora_llegada": vuelo.hora_llegada,
+            "tarifa_base": vuelo.tarifa_base,
+            "estado": vuelo.estado.value if hasattr(vuelo.estado, "value") else vuelo.estado,
+            "aerolinea": snapshot.aerolineas[vuelo.id_aerolinea],
+            "origen": snapshot.aeropuertos[vuelo.id_aeropuerto_origen],
+            "destino": snapshot.aeropuertos[vuelo.id_aeropuerto_destino],
+            "precio_efectivo": getattr(vuelo, "precio_efectivo", None)
+        }
+    
+    def flights_as_dicts(self, db: Session, vuelos: List[Vuelo]) -> List[dict]:
+        """Versión de flight_as_dict para listas."""
+        return [self.flight_as_dict(db, v) for v in vuelos]
+
+# Única instancia compartida por la aplicación
+reference_cache = ReferenceCache(ttl_seconds=settings.REFERENCE_CACHE_TTL_SECONDS)
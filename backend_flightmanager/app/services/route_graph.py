@@ -0,0 +1,345 @@
+"""
+Grafo de rutas en memoria para la búsqueda de vuelos con conexiones.
+
+Cada aeropuerto guarda sus vuelos de salida ordenados por hora (grafo
+expandido en el tiempo): desde un vuelo que llega a un aeropuerto se
+buscan por bisección los vuelos que salen dentro de la ventana de
+conexión permitida. Así la búsqueda no consulta la BD por petición.
+
+El grafo se carga al iniciar la app y lo mantiene una tarea en segundo
+plano (nunca la petición de búsqueda): cada ROUTE_GRAPH_CHECK_SECONDS
+compara un sello de Vuelos (cantidad, suma de versiones e id máximo) con
+el de la última carga y recarga completo si cambió (un vuelo creado,
+modificado, cancelado o eliminado por CUALQUIER proceso) o si superó
+ROUTE_GRAPH_RELOAD_SECONDS. El proceso que modifica un vuelo además lo
+actualiza al instante (refresh_flight desde crud_flight); los demás lo ven
+en hasta ROUTE_GRAPH_CHECK_SECONDS.
+
+Si una búsqueda llega antes de la primera carga, la hace ella: una sola
+carga a la vez, aunque lleguen varias búsquedas simultáneas.
+"""
+import asyncio
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import heapq
+import threading
+import time as _time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database import Vuelo, EstadoVueloEnum
+from app.database.database import SessionLocal
+from app.services.reference_cache import reference_cache
+
+# Columnas de Vuelos necesarias para el grafo (sin relaciones)
+_VUELO_COLUMNS = (
+    Vuelo.id, Vuelo.numero_vuelo, Vuelo.hora_salida, Vuelo.hora_llegada,
+    Vuelo.tarifa_base, Vuelo.estado, Vuelo.id_aerolinea,
+    Vuelo.id_aeropuerto_origen, Vuelo.id_aeropuerto_destino
+)
+
+@dataclass(frozen=True)
+class Tramo:
+    """Un vuelo como arista del grafo."""
+    id: int
+    numero_vuelo: str
+    hora_salida: datetime
+    hora_llegada: datetime
+    tarifa_base: Decimal
+    estado: str
+    id_aerolinea: int
+    id_aeropuerto_origen: int
+    id_aeropuerto_destino: int
+
+@dataclass(frozen=True)
+class Itinerario:
+    """Secuencia de tramos conectados de origen a destino."""
+    tramos: Tuple[Tramo, ...]
+    
+    @property
+    def hora_salida(self) -> datetime:
+        return self.tramos[0].hora_salida
+    
+    @property
+    def hora_llegada(self) -> datetime:
+        return self.tramos[-1].hora_llegada
+    
+    @property
+    def duracion(self) -> timedelta:
+        return self.hora_llegada - self.hora_salida
+    
+    @property
+    def tarifa_total(self) -> Decimal:
+        return sum((t.tarifa_base for t in self.tramos), Decimal("0"))
+    
+    @property
+    def escalas(self) -> int:
+        return len(self.tramos) - 1
+
+def _tramo_from_row(row) -> Tramo:
+    estado = row.estado.value if hasattr(row.estado, "value") else row.estado
+    return Tramo(
+        id=row.id,
+        numero_vuelo=row.numero_vuelo,
+        hora_salida=row.hora_salida,
+        hora_llegada=row.hora_llegada,
+        tarifa_base=Decimal(row.tarifa_base),
+        estado=estado,
+        id_aerolinea=row.id_aerolinea,
+        id_aeropuerto_origen=row.id_aeropuerto_origen,
+        id_aeropuerto_destino=row.id_aeropuerto_destino
+    )
+
+class RouteGraph:
+    """
+    Índice en memoria de vuelos por aeropuerto de origen.
+    
+    Las listas por aeropuerto son tuplas inmutables que se reemplazan
+    completas al actualizar (copy-on-write): las búsquedas leen sin bloqueo.
+    """
+    
+    def __init__(self, reload_seconds: int, check_seconds: int):
+        self.reload_seconds = reload_seconds
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        # Una sola carga completa a la vez
+        self._carga_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._loaded_at: Optional[float] = None
+        self._sello: Optional[Tuple[int, int, int]] = None
+        self._desde: Optional[datetime] = None
+        # id_aeropuerto -> (tramos ordenados por salida, horas de salida)
+        self._salidas: Dict[int, Tuple[Tuple[Tramo, ...], Tuple[datetime, ...]]] = {}
+        self._tramos: Dict[int, Tramo] = {}
+    
+    # --- CARGA Y ACTUALIZACIÓN ---
+    
+    @staticmethod
+    def _sello_bd(db: Session) -> Tuple[int, int, int]:
+        """
+        Sello de Vuelos: cambia al crear, modificar (version + 1) o eliminar
+        un vuelo, lo haga el proceso que lo haga.
+        """
+        fila = db.query(
+            func.count(Vuelo.id),
+            func.coalesce(func.sum(Vuelo.version), 0),
+            func.coalesce(func.max(Vuelo.id), 0)
+        ).one()
+        return tuple(int(valor) for valor in fila)
+    
+    def load(self, db: Session):
+        """Carga (o recarga) el grafo completo desde la BD."""
+        desde = datetime.combine(date.today() - timedelta(days=1), time.min)
+        # El sello se lee antes que los vuelos: un cambio entre ambas
+        # consultas provoca otra recarga, nunca se pierde
+        sello = self._sello_bd(db)
+        filas = db.query(*_VUELO_COLUMNS)\
+            .filter(Vuelo.estado != EstadoVueloEnum.Cancelado)\
+            .filter(Vuelo.hora_salida >= desde)\
+            .order_by(Vuelo.hora_salida)\
+            .all()
+        
+        por_origen: Dict[int, List[Tramo]] = {}
+        tramos: Dict[int, Tramo] = {}
+        for fila in filas:
+            tramo = _tramo_from_row(fila)
+            tramos[tramo.id] = tramo
+            por_origen.setdefault(tramo.id_aeropuerto_origen, []).append(tramo)
+        
+        with self._lock:
+            self._salidas = {
+                origen: (tuple(lista), tuple(t.hora_salida for t in lista))
+                for origen, lista in por_origen.items()
+            }
+            self._tramos = tramos
+            self._sello = sello
+            self._desde = desde
+            self._loaded_at = _time.monotonic()
+    
+    def _vencido(self) -> bool:
+        return self._loaded_at is None or _time.monotonic() - self._loaded_at > self.reload_seconds
+    
+    def refresh_if_stale(self) -> bool:
+        """
+        Recarga el grafo si no está cargado, si venció o si el sello de
+        Vuelos cambió (sincrónico, con su propia sesión). Retorna True si
+        recargó.
+        """
+        with self._carga_lock:
+            db = SessionLocal()
+            try:
+                if not self._vencido() and self._sello_bd(db) == self._sello:
+                    return False
+                self.load(db)
+                return True
+            finally:
+                db.close()
+    
+    def ensure_loaded(self):
+        """
+        Carga el grafo si todavía no existe (o si venció y no hay tarea de
+        refresco). Las búsquedas simultáneas esperan a una única carga.
+        """
+        if not self._vencido() or (self._loaded_at is not None and self._task is not None):
+            return
+        with self._carga_lock:
+            if not self._vencido():
+                return
+            db = SessionLocal()
+            try:
+                self.load(db)
+            finally:
+                db.close()
+    
+    def invalidate(self):
+        """Fuerza una recarga completa en la próxima búsqueda."""
+        self._loaded_at = None
+    
+    def refresh_flight(self, db: Session, flight_id: int):
+        """
+        Actualiza un único vuelo en el grafo tras crearlo, modificarlo o
+        eliminarlo. No hace nada si el grafo todavía no fue cargado.
+        """
+        if self._loaded_at is None:
+            return
+        
+        fila = db.query(*_VUELO_COLUMNS).filter(Vuelo.id == flight_id).first()
+        nuevo = _tramo_from_row(fila) if fila else None
+        # Mismo criterio que load(): sin cancelados ni vuelos fuera de la ventana
+        if nuevo and (nuevo.estado == EstadoVueloEnum.Cancelado.value or nuevo.hora_salida < self._desde):
+            nuevo = None
+        
+        with self._lock:
+            anterior = self._tramos.pop(flight_id, None)
+            if anterior:
+                self._replace_origen(anterior.id_aeropuerto_origen, [t for t in self._salidas[anterior.id_aeropuerto_origen][0] if t.id != flight_id])
+            if nuevo:
+                self._tramos[flight_id] = nuevo
+                actuales = list(self._salidas.get(nuevo.id_aeropuerto_origen, ((), ()))[0])
+                posicion = bisect_right([t.hora_salida for t in actuales], nuevo.hora_salida)
+                actuales.insert(posicion, nuevo)
+                self._replace_origen(nuevo.id_aeropuerto_origen, actuales)
+    
+    def _replace_origen(self, origen: int, tramos: List[Tramo]):
+        """Reemplaza la lista de salidas de un aeropuerto (con el lock tomado)."""
+        if tramos:
+            self._salidas[origen] = (tuple(tramos), tuple(t.hora_salida for t in tramos))
+        else:
+            self._salidas.pop(origen, None)
+    
+    # --- REFRESCO EN SEGUNDO PLANO ---
+    
+    async def _run(self):
+        while True:
+            try:
+                # La sesión es sincrónica: la comprobación (y la recarga) corre en un hilo
+                await asyncio.to_thread(self.refresh_if_stale)
+            except Exception as e:
+                print(f"⚠️  Error al refrescar el grafo de rutas: {e}")
+            await asyncio.sleep(self.check_seconds)
+    
+    def start(self):
+        """Inicia la tarea de refresco (evento startup de la app); la primera vuelta carga el grafo."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    # --- SERIALIZACIÓN ---
+    
+    def tramo_as_dict(self, db: Session, tramo: Tramo) -> dict:
+        """
+        Convierte un tramo al formato de FlightResult
+        (aeropuertos y aerolínea desde reference_cache).
+        """
+        return reference_cache.flight_as_dict(db, tramo)
+    
+    def itinerario_as_dict(self, db: Session, itinerario: Itinerario) -> dict:
+        """Convierte un itinerario al formato de ItinerarioResult."""
+        return {
+            "escalas": itinerario.escalas,
+            "hora_salida": itinerario.hora_salida,
+            "hora_llegada": itinerario.hora_llegada,
+            "duracion_minutos": int(itinerario.duracion.total_seconds() // 60),
+            "tarifa_total": itinerario.tarifa_total,
+            "vuelos": [self.tramo_as_dict(db, t) for t in itinerario.tramos]
+        }
+    
+    # --- BÚSQUEDA ---
+    
+    def _salidas_entre(self, origen: int, desde: datetime, hasta: datetime) -> Tuple[Tramo, ...]:
+        """Vuelos que salen de un aeropuerto en el rango [desde, hasta]."""
+        tramos, horas = self._salidas.get(origen, ((), ()))
+        return tramos[bisect_left(horas, desde):bisect_right(horas, hasta)]
+    
+    def find_itineraries(
+        self,
+        origen_id: int,
+        destino_id: int,
+        fecha: date,
+        max_escalas: int = 2,
+        min_conexion: timedelta = timedelta(minutes=45),
+        max_conexion: timedelta = timedelta(hours=24),
+        ordenar_por: str = "duracion",
+        limit: int = 20
+    ) -> List[Itinerario]:
+        """
+        Busca itinerarios (directos y con hasta max_escalas escalas) cuyo
+        primer vuelo sale el día indicado. Cada conexión debe respetar el
+        tiempo mínimo y máximo de espera y no se repiten aeropuertos.
+        
+        ordenar_por: 'duracion' (tiempo total de viaje) o 'precio' (suma de tarifas).
+        """
+        inicio = datetime.combine(fecha, time.min)
+        primeros = self._salidas_entre(origen_id, inicio, inicio + timedelta(days=1) - timedelta(microseconds=1))
+        resultados: List[Itinerario] = []
+        
+        def explorar(camino: List[Tramo], visitados: set):
+            ultimo = camino[-1]
+            if ultimo.id_aeropuerto_destino == destino_id:
+                resultados.append(Itinerario(tuple(camino)))
+                return
+            if len(camino) > max_escalas:
+                return
+            siguientes = self._salidas_entre(
+                ultimo.id_aeropuerto_destino,
+                ultimo.hora_llegada + min_conexion,
+                ultimo.hora_llegada + max_conexion
+            )
+            for tramo in siguientes:
+                if tramo.id_aeropuerto_destino in visitados:
+                    continue
+                camino.append(tramo)
+                visitados.add(tramo.id_aeropuerto_destino)
+                explorar(camino, visitados)
+                visitados.discard(tramo.id_aeropuerto_destino)
+                camino.pop()
+        
+        for tramo in primeros:
+            if tramo.id_aeropuerto_destino == origen_id:
+                continue
+            explorar([tramo], {origen_id, tramo.id_aeropuerto_destino})
+        
+        if ordenar_por == "precio":
+            clave = lambda it: (it.tarifa_total, it.duracion, it.hora_salida)
+        else:
+            clave = lambda it: (it.duracion, it.tarifa_total, it.hora_salida)
+        return heapq.nsmallest(limit, resultados, key=clave)
+
+# Única instancia compartida por la aplicación
+route_graph = RouteGraph(
+    reload_seconds=settings.ROUTE_GRAPH_RELOAD_SECONDS,
+    check_seconds=settings.ROUTE_GRAPH_CHECK_SECONDS
+)
@@ -0,0 +1,131 @@
+"""
+Representación compacta (grilla) del mapa de asientos de un vuelo.
+
+El número de asiento se interpreta como fila numérica + columna en letras
+("10A", también "A10"), de modo que "2A" se ordena antes que "10A" y cada
+asiento ocupa una celda de una grilla filas × columnas.
+
+Cada celda es UN byte: (índice de tarifa << 2) | código de estado, donde
+el código de estado es 0 = sin asiento (pasillo/hueco), 1 = Disponible,
+2 = Reservado, 3 = Ocupado, y la tarifa indexa la tabla (categoría,
+precio_adicional) del vuelo. Los bytes se envían en base64 en orden de
+filas, junto con los ids de los asientos en ese mismo orden.
+"""
+import base64
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Código de estado de cada celda (2 bits bajos del byte)
+CELDA_VACIA = 0
+CODIGOS_ESTADO = {"Disponible": 1, "Reservado": 2, "Ocupado": 3}
+
+# Con 6 bits para la tarifa caben 64 combinaciones (categoría, precio)
+MAX_TARIFAS = 64
+
+_FILA_COLUMNA = re.compile(r"^(\d+)([A-Z]+)$")
+_COLUMNA_FILA = re.compile(r"^([A-Z]+)(\d+)$")
+
+def parse_numero_asiento(numero_asiento: str) -> Optional[Tuple[int, str]]:
+    """
+    Separa un número de asiento en (fila, columna).
+    Acepta "10A" y "A10". Devuelve None si no tiene ese formato.
+    """
+    texto = numero_asiento.strip().upper()
+
+    match = _FILA_COLUMNA.match(texto)
+    if match:
+        return int(match.group(1)), match.group(2)
+
+    match = _COLUMNA_FILA.match(texto)
+    if match:
+        return int(match.group(2)), match.group(1)
+
+    return None
+
+def _columna_key(columna: str) -> Tuple[int, str]:
+    """Orden de columnas: A..Z y luego AA.. (por longitud y alfabético)."""
+    return len(columna), columna
+
+def seat_sort_key(numero_asiento: str) -> tuple:
+    """
+    Clave de orden natural para números de asiento (fila numérica, columna).
+    Los que no tienen formato fila/columna van al final, por texto.
+    """
+    posicion = parse_numero_asiento(numero_asiento)
+    if posicion is None:
+        return (1, 0, (0, ""), numero_asiento)
+
+    fila, columna = posicion
+    return (0, fila, _columna_key(columna), "")
+
+def build_seat_grid(asientos: List[dict]) -> dict:
+    """
+    Construye la grilla compacta a partir de asientos con el formato de
+    AsientoResponse (id, numero_asiento, categoria, precio_adicional, estado).
+
+    Los asientos cuyo número no se puede interpretar (o que repiten una
+    celda) se devuelven aparte en "sin_posicion", en formato de lista.
+    """
+    ubicados: Dict[Tuple[int, str], dict] = {}
+    sin_posicion: List[dict] = []
+
+    for asiento in asientos:
+        posicion = parse_numero_asiento(asiento["numero_asiento"])
+        if posicion is None or posicion in ubicados:
+            sin_posicion.append(asiento)
+            continue
+        ubicados[posicion] = asiento
+
+    if not ubicados:
+        return {
+            "fila_inicial": 0,
+            "filas": 0,
+            "columnas": [],
+            "tarifas": [],
+            "celdas": "",
+            "ids": [],
+            "sin_posicion": sin_posicion
+        }
+
+    numeros_fila = [fila for fila, _ in ubicados]
+    fila_inicial = min(numeros_fila)
+    total_filas = max(numeros_fila) - fila_inicial + 1
+    columnas = sorted({columna for _, columna in ubicados}, key=_columna_key)
+    indice_columna = {columna: i for i, columna in enumerate(columnas)}
+
+    # Tabla de tarifas: una entrada por (categoría, precio_adicional) en orden de aparición
+    tarifas: List[dict] = []
+    indice_tarifa: Dict[tuple, int] = {}
+
+    celdas = bytearray(total_filas * len(columnas))
+    ids: List[int] = []
+
+    # Recorrer en orden de grilla para que ids quede alineado con las celdas
+    for (fila, columna) in sorted(ubicados, key=lambda p: (p[0], indice_columna[p[1]])):
+        asiento = ubicados[(fila, columna)]
+
+        clave_tarifa = (asiento["categoria"], asiento["precio_adicional"])
+        tarifa = indice_tarifa.get(clave_tarifa)
+        if tarifa is None:
+            tarifa = len(tarifas)
+            if tarifa >= MAX_TARIFAS:
+                raise ValueError(f"El mapa de asientos admite hasta {MAX_TARIFAS} tarifas distintas")
+            indice_tarifa[clave_tarifa] = tarifa
+            tarifas.append({
+                "categoria": asiento["categoria"],
+                "precio_adicional": asiento["precio_adicional"]
+            })
+
+        posicion = (fila - fila_inicial) * len(columnas) + indice_columna[columna]
+        celdas[posicion] = (tarifa << 2) | CODIGOS_ESTADO[asiento["estado"]]
+        ids.append(asiento["id"])
+
+    return {
+        "fila_inicial": fila_inicial,
+        "filas": total_filas,
+        "columnas": columnas,
+        "tarifas": tarifas,
+        "celdas": base64.b64encode(bytes(celdas)).decode("ascii"),
+        "ids": ids,
+        "sin_posicion": sin_posicion
+    }
@@ -0,0 +1,129 @@
+"""
+Cuenta las sentencias SQL de una compra de billete (POST /billetes/purchase)
+con 1 y con 6 pasajeros: la compra bloquea la reserva, inserta el billete y
+confirma la reserva y sus asientos con un número FIJO de sentencias, sin
+importar cuántos pasajeros tenga la reserva. El repositorio no tiene suite
+de pruebas: este script hace de prueba y termina con código 1 si el número
+de sentencias cambia con los pasajeros o supera MAX_SENTENCIAS.
+
+Usa los datos de la base configurada en .env (ejecutar después de
+seed_data.py). Todo corre dentro de una transacción que se revierte al
+final: la base queda como estaba (salvo el bloque de la secuencia de
+códigos de confirmación que se haya tomado). Por eso el COMMIT de la compra
+aparece como SAVEPOINT/RELEASE; es igual para cualquier tamaño.
+
+Ejecutar:
+    python benchmark_compra.py
+    python benchmark_compra.py --pasajeros 1 6 12
+"""
+import argparse
+import sys
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app.api.endpoints.billetes import _purchase_ticket
+from app.crud import crud_reserva, crud_tarjeta
+from app.database import Asiento, Usuario, Vuelo, EstadoAsientoEnum, EstadoVueloEnum
+from app.database.database import engine
+from app.schemas.billete import BilleteCreate
+from app.services.principal_cache import Principal
+
+# Sentencias de una compra (incluye el SAVEPOINT/RELEASE de su commit)
+MAX_SENTENCIAS = 10
+
+def _vuelo_con_asientos(db: Session, minimo: int) -> int:
+    """ID de un vuelo reservable con al menos `minimo` asientos disponibles."""
+    fila = db.query(Asiento.id_vuelo)\
+        .join(Vuelo, Vuelo.id == Asiento.id_vuelo)\
+        .filter(Asiento.estado == EstadoAsientoEnum.Disponible)\
+        .filter(Vuelo.estado != EstadoVueloEnum.Cancelado)\
+        .group_by(Asiento.id_vuelo)\
+        .having(func.count(Asiento.id) >= minimo)\
+        .first()
+    if fila is None:
+        raise SystemExit(f"❌ No hay vuelos con {minimo} asientos disponibles (ejecuta seed_data.py)")
+    return fila.id_vuelo
+
+def _nueva_reserva(db: Session, user_id: int, vuelo_id: int, pasajeros: int) -> int:
+    """Crea una reserva pendiente con `pasajeros` asientos del vuelo."""
+    asientos = db.query(Asiento.id)\
+        .filter(Asiento.id_vuelo == vuelo_id)\
+        .filter(Asiento.estado == EstadoAsientoEnum.Disponible)\
+        .order_by(Asiento.id)\
+        .limit(pasajeros)\
+        .all()
+    reserva = crud_reserva.create_reserva(
+        db,
+        user_id=user_id,
+        monto_total=0,
+        pasajeros_data=[
+            {"nombre_completo": f"Pasajero {i + 1}", "id_asiento": a.id}
+            for i, a in enumerate(asientos)
+        ]
+    )
+    return reserva.id
+
+def main():
+    parser = argparse.ArgumentParser(description="Cuenta las sentencias SQL de una compra de billete")
+    parser.add_argument("--pasajeros", type=int, nargs="+", default=[1, 6], help="Tamaños de reserva a comprar")
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("🎫 SENTENCIAS SQL POR COMPRA")
+    print("="*60)
+
+    sentencias = []
+    contando = [False]
+
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        if contando[0]:
+            sentencias.append(statement.split(None, 1)[0].upper())
+
+    conexion = engine.connect()
+    transaccion = conexion.begin()
+    # Los commit de la compra se convierten en SAVEPOINT dentro de la transacción externa
+    db = Session(bind=conexion, join_transaction_mode="create_savepoint")
+    event.listen(engine, "before_cursor_execute", _contar)
+
+    conteos = {}
+    try:
+        usuario = db.query(Usuario).order_by(Usuario.id).first()
+        if usuario is None:
+            raise SystemExit("❌ No hay usuarios (ejecuta seed_data.py)")
+        principal = Principal.from_usuario(usuario)
+        tarjeta_id = crud_tarjeta.create_tarjeta(db, usuario.id, "4532015112830366", "12/30", usuario.nombre_completo).id
+        vuelo_id = _vuelo_con_asientos(db, 1 + sum(args.pasajeros))
+
+        # Compra de calentamiento: toma el bloque de códigos de confirmación (no se cuenta)
+        reserva_id = _nueva_reserva(db, usuario.id, vuelo_id, 1)
+        _purchase_ticket(BilleteCreate(id_reserva=reserva_id, id_tarjeta=tarjeta_id), principal, db)
+
+        for pasajeros in args.pasajeros:
+            compra = BilleteCreate(id_reserva=_nueva_reserva(db, usuario.id, vuelo_id, pasajeros), id_tarjeta=tarjeta_id)
+            db.expire_all()
+
+            sentencias.clear()
+            contando[0] = True
+            _purchase_ticket(compra, principal, db)
+            contando[0] = False
+
+            conteos[pasajeros] = len(sentencias)
+            print(f"\n{pasajeros} pasajero(s): {len(sentencias)} sentencias")
+            print(f"   {' → '.join(sentencias)}")
+    finally:
+        contando[0] = False
+        event.remove(engine, "before_cursor_execute", _contar)
+        db.close()
+        transaccion.rollback()
+        conexion.close()
+
+    fijo = len(set(conteos.values())) == 1
+    acotado = max(conteos.values()) <= MAX_SENTENCIAS
+    print(f"\n{'✅ Mismo número de sentencias' if fijo else '❌ El número de sentencias depende de los pasajeros'}")
+    print(f"{'✅' if acotado else '❌'} Máximo {max(conteos.values())} sentencias (límite {MAX_SENTENCIAS})")
+    print("="*60 + "\n")
+    sys.exit(0 if fijo and acotado else 1)
+
+if __name__ == "__main__":
+    main()
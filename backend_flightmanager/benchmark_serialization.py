@@ -0,0 +1,166 @@
+"""
+Compara la serialización por defecto de FastAPI (response_model + JSONResponse)
+con la serialización rápida (app/core/fast_json.py) en las respuestas de tipo
+lista. Verifica que ambas generen exactamente los mismos bytes y mide el
+tiempo de cada una (consulta + armado + serialización).
+
+Usa los datos de la base configurada en .env (ejecutar después de seed_data.py).
+
+Ejecutar:
+    python benchmark_serialization.py
+    python benchmark_serialization.py --repeticiones 200 --limit 100
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from sqlalchemy import func
+
+from main import app
+from app.core import fast_json
+from app.crud import crud_asiento, crud_billete, crud_flight, crud_reserva
+from app.database import Billete, Reserva
+from app.database.database import SessionLocal
+from app.schemas import asiento as asiento_schema
+from app.schemas import billete as billete_schema
+from app.schemas import flight as flight_schema
+from app.schemas import reserva as reserva_schema
+from app.services.reference_cache import reference_cache
+
+def _response_field(path: str):
+    """response_field de la ruta GET registrada en la app."""
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path == path and "GET" in route.methods:
+            return route.response_field
+    raise ValueError(f"Ruta no encontrada: {path}")
+
+def _default_bytes(field, contenido) -> bytes:
+    """Camino actual de FastAPI: validar/serializar con el response_model y JSONResponse."""
+    serializado = asyncio.run(serialize_response(field=field, response_content=contenido))
+    return JSONResponse(content=serializado).body
+
+def _medir(funcion, repeticiones: int) -> float:
+    """Milisegundos promedio por llamada."""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) * 1000 / repeticiones
+
+def _casos(db, limit: int):
+    """Arma los casos (nombre, ruta, camino actual, camino rápido) con datos reales."""
+    casos = []
+    vuelos = fast_json.ListSerializer(flight_schema.FlightResult)
+
+    # Listado de vuelos (GET /flights/)
+    casos.append((
+        f"GET /flights/?limit={limit}",
+        "/flights/",
+        lambda: reference_cache.flights_as_dicts(db, crud_flight.get_all_flights_filtered(db, limit=limit)),
+        lambda: vuelos.dump_json(reference_cache.flights_as_dicts(db, crud_flight.get_all_flights_filtered(db, limit=limit)))
+    ))
+
+    # Búsqueda con precio efectivo (GET /flights/search/by-price) sobre la ruta del primer vuelo
+    primero = crud_flight.get_all_flights_filtered(db, limit=1)
+    if primero:
+        v = primero[0]
+        origen = reference_cache.get(db).aeropuertos[v.id_aeropuerto_origen].codigo_iata
+        destino = reference_cache.get(db).aeropuertos[v.id_aeropuerto_destino].codigo_iata
+        buscar = lambda: crud_flight.search_flights(db, origen, destino, v.hora_salida.date(), ordenar_por="precio")
+        casos.append((
+            f"GET /flights/search/by-price ({origen}-{destino})",
+            "/flights/search/by-price",
+            lambda: reference_cache.flights_as_dicts(db, buscar()),
+            lambda: vuelos.dump_json(reference_cache.flights_as_dicts(db, buscar()))
+        ))
+
+        # Asientos disponibles (GET /flights/{id}/seats)
+        asientos = fast_json.ListSerializer(asiento_schema.AsientoResponse)
+        disponibles = lambda: [a for a in crud_asiento.get_seat_map(db, v.id)[1] if a["estado"] == "Disponible"]
+        casos.append((
+            f"GET /flights/{v.id}/seats",
+            "/flights/{flight_id}/seats",
+            disponibles,
+            lambda: asientos.dump_json(disponibles())
+        ))
+
+    # Reservas del usuario con más reservas (GET /reservas/me)
+    fila = db.query(Reserva.id_usuario, func.count(Reserva.id))\
+        .group_by(Reserva.id_usuario)\
+        .order_by(func.count(Reserva.id).desc())\
+        .first()
+    if fila:
+        user_id = fila[0]
+        reservas = fast_json.ListSerializer(reserva_schema.ReservaDetail)
+        casos.append((
+            f"GET /reservas/me (usuario {user_id})",
+            "/reservas/me",
+            lambda: crud_reserva.get_reservas_by_user(db, user_id),
+            lambda: reservas.dump_json(crud_reserva.get_reservas_detail_rows(db, user_id))
+        ))
+
+    # Billetes del usuario con más billetes (GET /billetes/me)
+    fila = db.query(Reserva.id_usuario, func.count(Billete.id))\
+        .join(Billete, Billete.id_reserva == Reserva.id)\
+        .group_by(Reserva.id_usuario)\
+        .order_by(func.count(Billete.id).desc())\
+        .first()
+    if fila:
+        user_id = fila[0]
+        billetes = fast_json.ListSerializer(billete_schema.BilleteResponse)
+        casos.append((
+            f"GET /billetes/me (usuario {user_id})",
+            "/billetes/me",
+            lambda: crud_billete.get_billetes_by_user(db, user_id),
+            lambda: billetes.dump_json(crud_billete.get_billete_rows_by_user(db, user_id))
+        ))
+
+    return casos
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la serialización por defecto con la rápida")
+    parser.add_argument("--repeticiones", type=int, default=50, help="Repeticiones por caso")
+    parser.add_argument("--limit", type=int, default=100, help="Tamaño de página para /flights/")
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("⚡ BENCHMARK DE SERIALIZACIÓN")
+    print("="*60)
+
+    diferentes = 0
+    db = SessionLocal()
+    try:
+        for nombre, ruta, actual, rapido in _casos(db, args.limit):
+            field = _response_field(ruta)
+
+            bytes_actual = _default_bytes(field, actual())
+            bytes_rapido = rapido()
+            iguales = bytes_actual == bytes_rapido
+            if not iguales:
+                diferentes += 1
+
+            # Expirar la sesión para que ambos caminos lean de la BD en cada repetición
+            def camino_actual():
+                db.expire_all()
+                _default_bytes(field, actual())
+
+            def camino_rapido():
+                db.expire_all()
+                rapido()
+
+            ms_actual = _medir(camino_actual, args.repeticiones)
+            ms_rapido = _medir(camino_rapido, args.repeticiones)
+
+            print(f"\n{nombre}")
+            print(f"   bytes: {len(bytes_actual)}  idénticos: {'✅' if iguales else '❌'}")
+            print(f"   actual: {ms_actual:.2f} ms   rápido: {ms_rapido:.2f} ms   ({ms_actual / ms_rapido:.1f}x)")
+    finally:
+        db.close()
+
+    print("\n" + "="*60 + "\n")
+    sys.exit(1 if diferentes else 0)
+
+if __name__ == "__main__":
+    main()
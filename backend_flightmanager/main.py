@@ -1,15 +1,61 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import inspect
+from fastapi.responses import JSONResponse
+from sqlalchemy import inspect, text
 
-from app.api.endpoints import auth, flights, reservas, billetes, tarjetas, users
+from app.api.endpoints import auth, flights, reservas, billetes, tarjetas, users, admin
 from app.core.config import settings
-from app.database.database import Base, engine
+from app.core.password_hasher import PasswordHasherBusy, password_hasher
+from app.services.idempotency import IdempotencyInProgress, IdempotencyKeyMismatch
+from app.database.database import Base, engine, SessionLocal, async_engine
 from app.database.models import (
     Usuario, Vuelo, Aeropuerto, Aerolinea, 
-    TarjetaCredito, Asiento, Reserva, Pasajero, Billete
+    TarjetaCredito, Asiento, Reserva, Pasajero, Billete,
+    DisponibilidadAsiento, DisponibilidadDelta, ClaveIdempotencia
 )
 
+# Datos a completar cuando se agrega una columna a una tabla existente
+_BACKFILLS = {
+    # Los pasajeros de reservas ya canceladas no ocupan asiento
+    # (necesario antes de crear el índice único ux_pasajeros_asiento_activo)
+    ("Pasajeros", "activo"): """UPDATE "Pasajeros" SET activo = false WHERE id_reserva IN (SELECT id FROM "Reservas" WHERE estado = 'Cancelada')""",
+    # Las reservas pendientes anteriores a la retención vencen como las nuevas
+    # (el barrido libera sus asientos)
+    ("Reservas", "expira_en"): f"""UPDATE "Reservas" SET expira_en = COALESCE(fecha_reserva, CURRENT_TIMESTAMP) + interval '{settings.RESERVA_HOLD_MINUTES} minutes' WHERE estado = 'Pendiente'""",
+}
+
+def add_missing_columns():
+    """
+    Agrega a las tablas existentes las columnas nuevas del modelo que tienen
+    valor por defecto en el servidor o admiten NULL (create_all no modifica
+    tablas existentes).
+    """
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            if column.server_default is None and not column.nullable:
+                continue
+            
+            column_type = column.type.compile(dialect=engine.dialect)
+            default = f"DEFAULT {column.server_default.arg.text}" if column.server_default is not None else ""
+            null = "NOT NULL" if not column.nullable else ""
+            print(f"   + {table.name}.{column.name}")
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type} {default} {null}'
+                ))
+                backfill = _BACKFILLS.get((table.name, column.name))
+                if backfill:
+                    conn.execute(text(backfill))
+
 def create_tables():
     """
     Crea todas las tablas en la base de datos si no existen.
@@ -33,6 +79,15 @@ def create_tables():
         print("\n🛠️  Creando tablas faltantes...")
         Base.metadata.create_all(bind=engine)
         
+        print("🛠️  Verificando columnas nuevas...")
+        add_missing_columns()
+        
+        # create_all no agrega índices nuevos a tablas ya existentes
+        print("🛠️  Verificando índices...")
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        
         # Verificar tablas después de la creación
         inspector = inspect(engine)
         final_tables = inspector.get_table_names()
@@ -68,8 +123,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# bcrypt saturado (login, registro, cambio de contraseña): rechazar en lugar de encolar
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Demasiadas solicitudes de autenticación. Intenta de nuevo en unos segundos."},
+        headers={"Retry-After": "1"}
+    )
+
+# Idempotency-Key: la primera petición con la clave aún no terminó de guardarse
+@app.exception_handler(IdempotencyInProgress)
+async def idempotency_in_progress_handler(request: Request, exc: IdempotencyInProgress):
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "Hay otra petición con la misma Idempotency-Key en curso. Intenta de nuevo en unos segundos."},
+        headers={"Retry-After": "1"}
+    )
+
+# Idempotency-Key reusada con otro cuerpo de petición
+@app.exception_handler(IdempotencyKeyMismatch)
+async def idempotency_key_mismatch_handler(request: Request, exc: IdempotencyKeyMismatch):
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={"detail": "La Idempotency-Key ya se usó con otra petición distinta"}
+    )
+
 # Registrar routers
 app.include_router(
     auth.router,
@@ -107,6 +189,12 @@ app.include_router(
     tags=["Gestión de Usuario"]
 )
 
+app.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["Administración"]
+)
+
 # Endpoint raíz
 @app.get("/", tags=["Root"])
 def read_root():
@@ -159,6 +247,37 @@ async def startup_event():
     """
     Evento que se ejecuta al iniciar la aplicación.
     """
+    # Cargar la caché de aeropuertos y aerolíneas
+    from app.services.reference_cache import reference_cache
+    
+    db = SessionLocal()
+    try:
+        snapshot = reference_cache.reload(db)
+    finally:
+        db.close()
+    
+    # Grafo de rutas: se carga y se refresca en segundo plano
+    from app.services.route_graph import route_graph
+    route_graph.start()
+    
+    # Procesos de bcrypt (login y registro)
+    password_hasher.start()
+    
+    # Consolidación de las variaciones de disponibilidad (siempre: los contadores dependen de ella)
+    from app.services.disponibilidad_folder import disponibilidad_folder
+    disponibilidad_folder.start()
+    
+    # Barrido periódico de reservas pendientes con la retención vencida
+    if settings.HOLD_SWEEPER_ENABLED:
+        from app.services.hold_sweeper import hold_sweeper
+        hold_sweeper.start()
+    
+    # Precalentar los pools para que las primeras peticiones no abran conexiones
+    if settings.DB_POOL_WARMUP:
+        from app.database.pool import warm_up, warm_up_async
+        warm_up(engine, settings.DB_POOL_SIZE)
+        await warm_up_async(async_engine, settings.DB_POOL_SIZE)
+    
     print("\n" + "="*60)
     print("🚀 FLIGHT MANAGER API INICIADA")
     print("="*60)
@@ -166,6 +285,11 @@ async def startup_event():
     print("📘 Documentación ReDoc:   http://localhost:8000/redoc")
     print("🏥 Health Check:         http://localhost:8000/health")
     print("🔄 Servidor ejecutándose en: http://0.0.0.0:8000")
+    print(f"🗂️  Caché de referencia v{snapshot.version}: {len(snapshot.aeropuertos)} aeropuertos, {len(snapshot.aerolineas)} aerolíneas")
+    print(f"🔐 bcrypt: costo {settings.PASSWORD_BCRYPT_ROUNDS}, {settings.PASSWORD_HASH_WORKERS} proceso(s), máx. {settings.PASSWORD_HASH_MAX_PENDING} pendientes")
+    print(f"⏳ Retención de reservas: {settings.RESERVA_HOLD_MINUTES} min{f', barrido cada {settings.HOLD_SWEEP_INTERVAL_SECONDS} s' if settings.HOLD_SWEEPER_ENABLED else ' (barrido deshabilitado)'}")
+    print(f"💺 Consolidación de disponibilidad cada {settings.DISPONIBILIDAD_FOLD_INTERVAL_SECONDS} s (o al superar {settings.DISPONIBILIDAD_FOLD_THRESHOLD} variaciones por vuelo)")
+    print(f"🔌 Pool de conexiones: {settings.DB_POOL_SIZE} (+{settings.DB_MAX_OVERFLOW} overflow) por motor{', precalentado' if settings.DB_POOL_WARMUP else ''}")
     print("="*60 + "\n")
 
 # Manejador de cierre
@@ -174,6 +298,17 @@ async def shutdown_event():
     """
     Evento que se ejecuta al cerrar la aplicación.
     """
+    from app.services.hold_sweeper import hold_sweeper
+    from app.services.disponibilidad_folder import disponibilidad_folder
+    from app.services.route_graph import route_graph
+    await hold_sweeper.stop()
+    await disponibilidad_folder.stop()
+    await route_graph.stop()
+    
+    # Cerrar las conexiones del motor async
+    await async_engine.dispose()
+    password_hasher.shutdown()
+    
     print("\n" + "="*60)
     print("👋 CERRANDO FLIGHT MANAGER API")
     print("="*60 + "\n")
\ No newline at end of file
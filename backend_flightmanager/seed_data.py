@@ -11,6 +11,7 @@ from app.database.models import (
     EstadoVueloEnum
 )
 from app.core.security import get_password_hash
+from app.crud.crud_disponibilidad import rebuild_disponibilidad
 import random
 
 def clear_database(db: Session):
@@ -26,7 +27,7 @@ def clear_database(db: Session):
         
         # Truncar tablas con CASCADE para resetear secuencias
         # TRUNCATE elimina todos los datos Y resetea los autoincrementables
-        db.execute(text('TRUNCATE TABLE "Asientos", "Vuelos", "Aeropuertos", "Aerolineas", "Usuarios", "Reservas", "Pasajeros", "Billetes", "TarjetasCredito" RESTART IDENTITY CASCADE;'))
+        db.execute(text('TRUNCATE TABLE "DisponibilidadAsientos", "Asientos", "Vuelos", "Aeropuertos", "Aerolineas", "Usuarios", "Reservas", "Pasajeros", "Billetes", "TarjetasCredito" RESTART IDENTITY CASCADE;'))
         
         # Reactivar las foreign key constraints
         db.execute(text("SET session_replication_role = 'origin';"))
@@ -485,6 +486,10 @@ def seed_asientos(db: Session, vuelos: list):
     
     db.commit()
     
+    # Construir los contadores de disponibilidad por vuelo y categoría
+    rebuild_disponibilidad(db)
+    db.commit()
+    
     print(f"✅ {total_asientos} asientos creados")
     print(f"   Distribución por tipo de vuelo:")
     for tipo, cantidad in vuelos_por_tipo.items():
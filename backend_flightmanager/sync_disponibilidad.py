@@ -0,0 +1,79 @@
+"""
+Script para reconstruir o verificar los contadores de disponibilidad
+de asientos (tabla DisponibilidadAsientos) a partir de la tabla Asientos.
+
+Ejecutar:
+    python sync_disponibilidad.py              # Reconstruye todos los contadores
+    python sync_disponibilidad.py --verify     # Solo compara, no modifica
+    python sync_disponibilidad.py --fold       # Consolida las variaciones pendientes
+    python sync_disponibilidad.py --vuelo 12   # Limita a un vuelo
+"""
+import argparse
+import sys
+
+from app.core.config import settings
+from app.database.database import SessionLocal
+from app.crud import crud_disponibilidad
+
+def verificar(db, vuelo_id=None) -> int:
+    """Muestra las diferencias entre contadores y asientos. Retorna la cantidad."""
+    diferencias = crud_disponibilidad.verify_disponibilidad(db, vuelo_id)
+    
+    if not diferencias:
+        print("✅ Los contadores coinciden con la tabla Asientos")
+        return 0
+    
+    print(f"⚠️  {len(diferencias)} contador(es) no coinciden:")
+    for d in diferencias:
+        print(f"   - Vuelo {d['id_vuelo']} / {d['categoria']}: contador={d['contador']} real={d['real']}")
+    return len(diferencias)
+
+def consolidar(db, vuelo_id=None, lote=settings.DISPONIBILIDAD_FOLD_BATCH_SIZE):
+    """Suma a los contadores todas las variaciones pendientes y verifica."""
+    total = 0
+    while True:
+        consolidadas = crud_disponibilidad.fold_deltas(db, lote, vuelo_id)
+        total += consolidadas
+        if consolidadas < lote:
+            break
+    print(f"✅ {total} variaciones consolidadas")
+    return verificar(db, vuelo_id)
+
+def reconstruir(db, vuelo_id=None):
+    """Reconstruye los contadores y verifica el resultado."""
+    filas = crud_disponibilidad.rebuild_disponibilidad(db, vuelo_id)
+    db.commit()
+    print(f"✅ {filas} contadores reconstruidos")
+    return verificar(db, vuelo_id)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza los contadores de disponibilidad de asientos")
+    parser.add_argument("--verify", action="store_true", help="Solo verificar, sin modificar")
+    parser.add_argument("--fold", action="store_true", help="Consolidar las variaciones pendientes")
+    parser.add_argument("--vuelo", type=int, default=None, help="ID de un vuelo específico")
+    args = parser.parse_args()
+    
+    print("\n" + "="*60)
+    print("💺 CONTADORES DE DISPONIBILIDAD")
+    print("="*60)
+    
+    db = SessionLocal()
+    try:
+        if args.verify:
+            diferencias = verificar(db, args.vuelo)
+        elif args.fold:
+            diferencias = consolidar(db, args.vuelo)
+        else:
+            diferencias = reconstruir(db, args.vuelo)
+    except Exception as e:
+        print(f"\n❌ ERROR: {str(e)}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    
+    print("="*60 + "\n")
+    sys.exit(1 if diferencias else 0)
+
+if __name__ == "__main__":
+    main()
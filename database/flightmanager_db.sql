@@ -57,12 +57,19 @@ CREATE TABLE "Vuelos" (
     "hora_llegada" TIMESTAMP NOT NULL,
     "tarifa_base" DECIMAL(10, 2) NOT NULL, 
     "estado" "estado_vuelo" DEFAULT 'Programado',
+    "version" INT NOT NULL DEFAULT 0, -- Cambia con los datos del vuelo (ETag)
     FOREIGN KEY ("id_aerolinea") REFERENCES "Aerolineas" ("id"),
     FOREIGN KEY ("id_aeropuerto_origen") REFERENCES "Aeropuertos" ("id"),
     FOREIGN KEY ("id_aeropuerto_destino") REFERENCES "Aeropuertos" ("id"),
     UNIQUE ("numero_vuelo", "hora_salida") -- Clave única para un vuelo
 );
 
+-- Índice para búsquedas por ruta y fecha de salida.
+-- Parcial: los vuelos cancelados nunca aparecen en las búsquedas.
+CREATE INDEX "ix_vuelos_ruta_salida"
+    ON "Vuelos" ("id_aeropuerto_origen", "id_aeropuerto_destino", "hora_salida")
+    WHERE "estado" <> 'Cancelado';
+
 -- 6. Tabla de Asientos (Seats)
 -- Define la capacidad y tipos de asientos de un vuelo.
 CREATE TABLE "Asientos" (
@@ -72,10 +79,15 @@ CREATE TABLE "Asientos" (
     "categoria" "categoria_asiento" NOT NULL,
     "estado" "estado_asiento" DEFAULT 'Disponible',
     "precio_adicional" DECIMAL(10, 2) DEFAULT 0, -- Costo extra por este asiento
+    "version" INT NOT NULL DEFAULT 0, -- Se incrementa en cada UPDATE del asiento (ETag del mapa)
     FOREIGN KEY ("id_vuelo") REFERENCES "Vuelos" ("id") ON DELETE CASCADE,
     UNIQUE ("id_vuelo", "numero_asiento") -- Un asiento es único por vuelo
 );
 
+-- Índice para consultas de disponibilidad por vuelo y categoría.
+CREATE INDEX "ix_asientos_vuelo_categoria_estado"
+    ON "Asientos" ("id_vuelo", "categoria", "estado");
+
 -- 7. Tabla de Reservas (Reservations)
 -- Agrupa los asientos/pasajeros que un usuario desea comprar.
 CREATE TABLE "Reservas" (
@@ -84,9 +96,15 @@ CREATE TABLE "Reservas" (
     "fecha_reserva" TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     "estado" "estado_reserva" DEFAULT 'Pendiente',
     "monto_total" DECIMAL(10, 2) NOT NULL,
+    "expira_en" TIMESTAMP, -- Vencimiento de la retención de asientos (reservas pendientes)
     FOREIGN KEY ("id_usuario") REFERENCES "Usuarios" ("id")
 );
 
+-- Índice para que el barrido encuentre las retenciones vencidas.
+CREATE INDEX "ix_reservas_pendientes_expira_en"
+    ON "Reservas" ("expira_en")
+    WHERE "estado" = 'Pendiente';
+
 -- 8. Tabla de Pasajeros (Passengers)
 -- Tabla intermedia para asociar asientos y pasajeros a una reserva.
 -- Esto permite múltiples pasajeros y múltiples vuelos (itinerarios) en una reserva.
@@ -96,12 +114,17 @@ CREATE TABLE "Pasajeros" (
     "id_asiento" INT NOT NULL,
     "nombre_completo" VARCHAR(100) NOT NULL,
     "documento_identidad" VARCHAR(50), -- Ej. Pasaporte
+    "activo" BOOLEAN NOT NULL DEFAULT TRUE, -- FALSE si la reserva se canceló
     FOREIGN KEY ("id_reserva") REFERENCES "Reservas" ("id") ON DELETE CASCADE,
     FOREIGN KEY ("id_asiento") REFERENCES "Asientos" ("id")
-    -- Restricción para asegurar que el asiento no esté ya reservado.
-    -- Esto se manejará mejor en la lógica del backend (CRUD).
 );
 
+-- Restricción para asegurar que el asiento no esté ya reservado:
+-- un asiento pertenece como máximo a un pasajero activo.
+CREATE UNIQUE INDEX "ux_pasajeros_asiento_activo"
+    ON "Pasajeros" ("id_asiento")
+    WHERE "activo";
+
 -- 9. Tabla de Billetes (Tickets)
 -- El resultado final de una compra.
 CREATE TABLE "Billetes" (
@@ -112,4 +135,55 @@ CREATE TABLE "Billetes" (
     "codigo_confirmacion" VARCHAR(20) UNIQUE NOT NULL,
     FOREIGN KEY ("id_reserva") REFERENCES "Reservas" ("id"),
     FOREIGN KEY ("id_tarjeta_credito") REFERENCES "TarjetasCredito" ("id")
-);
\ No newline at end of file
+);
+
+-- Bloques de números para generar los códigos de confirmación sin
+-- consultar "Billetes" (backend_flightmanager/app/services/codigo_confirmacion.py)
+CREATE SEQUENCE "billetes_codigo_seq" MINVALUE 0 START WITH 0;
+
+-- 10. Contadores de disponibilidad (SeatAvailability)
+-- Asientos disponibles por vuelo y categoría, derivados de "Asientos".
+-- Los actualiza la consolidación periódica con las variaciones pendientes
+-- (tabla 11) y se reconstruyen con backend_flightmanager/sync_disponibilidad.py
+CREATE TABLE "DisponibilidadAsientos" (
+    "id_vuelo" INT NOT NULL,
+    "categoria" "categoria_asiento" NOT NULL,
+    "disponibles" INT NOT NULL DEFAULT 0,
+    PRIMARY KEY ("id_vuelo", "categoria"),
+    FOREIGN KEY ("id_vuelo") REFERENCES "Vuelos" ("id") ON DELETE CASCADE
+);
+
+-- 11. Variaciones de disponibilidad pendientes de consolidar
+-- Cada cambio de estado de asientos inserta aquí su variación en lugar de
+-- actualizar el contador (sin esperas por la fila del contador al reservar).
+-- Los contadores más estas filas dan la disponibilidad actual.
+CREATE TABLE "DisponibilidadDeltas" (
+    "id" SERIAL PRIMARY KEY,
+    "id_vuelo" INT NOT NULL,
+    "categoria" "categoria_asiento" NOT NULL,
+    "delta" INT NOT NULL,
+    FOREIGN KEY ("id_vuelo") REFERENCES "Vuelos" ("id") ON DELETE CASCADE
+);
+
+CREATE INDEX "ix_DisponibilidadDeltas_id_vuelo"
+    ON "DisponibilidadDeltas" ("id_vuelo");
+
+-- 12. Claves de idempotencia (header Idempotency-Key)
+-- Se insertan en la misma transacción que la reserva o el billete que crean;
+-- el barrido periódico borra las vencidas.
+CREATE TABLE "ClavesIdempotencia" (
+    "id" SERIAL PRIMARY KEY,
+    "id_usuario" INT NOT NULL,
+    "endpoint" VARCHAR(50) NOT NULL,
+    "clave" VARCHAR(255) NOT NULL,
+    "huella" VARCHAR(64) NOT NULL, -- SHA-256 del cuerpo de la petición
+    "id_recurso" INT NOT NULL, -- Reserva o billete creado
+    "expira_en" TIMESTAMP NOT NULL,
+    FOREIGN KEY ("id_usuario") REFERENCES "Usuarios" ("id") ON DELETE CASCADE
+);
+
+CREATE UNIQUE INDEX "ux_claves_idempotencia"
+    ON "ClavesIdempotencia" ("id_usuario", "endpoint", "clave");
+
+CREATE INDEX "ix_claves_idempotencia_expira_en"
+    ON "ClavesIdempotencia" ("expira_en");
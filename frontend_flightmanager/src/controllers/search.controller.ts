@@ -154,10 +154,7 @@ const handlePageChange = async (page: number) => {
 export const initFlightDetail = async (params: { id: string }, title: string) => {
     try {
         const flightId = Number(params.id);
-        const [flight, seats] = await Promise.all([
-            flightService.getFlightDetails(flightId),
-            flightService.getFlightSeats(flightId)
-        ]);
+        const { vuelo: flight, asientos: seats } = await flightService.getFlightSeatMap(flightId);
 
         LayoutView.renderPageContent(`${title}: ${flight.numero_vuelo}`, FlightDetailView.render(flight, seats));
 
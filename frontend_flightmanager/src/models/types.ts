@@ -55,6 +55,11 @@ export interface AsientoResponse {
     estado: 'Disponible' | 'Reservado' | 'Ocupado';
 }
 
+export interface SeatMapResponse {
+    vuelo: FlightResult;
+    asientos: AsientoResponse[];
+}
+
 // --- Reservas y Pasajeros ---
 export interface PasajeroCreate {
     id_asiento: number;
@@ -73,6 +78,7 @@ export interface ReservaResponse {
     fecha_reserva: string;
     estado: 'Pendiente' | 'Confirmada' | 'Cancelada';
     monto_total: number;
+    expira_en?: string | null; // Vencimiento de la retención mientras está Pendiente
 }
 
 export interface ReservaDetail extends ReservaResponse {
@@ -1,5 +1,5 @@
 import { api } from './api.service';
-import type { FlightResult, AsientoResponse } from '../models/types';
+import type { FlightResult, AsientoResponse, SeatMapResponse } from '../models/types';
 
 export const flightService = {
     /**
@@ -72,4 +72,11 @@ export const flightService = {
     getFlightSeats: (id: number): Promise<AsientoResponse[]> => {
         return api.get<AsientoResponse[]>(`/flights/${id}/seats`);
     },
+
+    /**
+     * Obtiene vuelo + todos sus asientos en una sola petición (selección de asientos)
+     */
+    getFlightSeatMap: (id: number): Promise<SeatMapResponse> => {
+        return api.get<SeatMapResponse>(`/flights/${id}/seatmap`);
+    },
 };
\ No newline at end of file